@@ -0,0 +1,180 @@
+'''
+Benchmark the browser hot paths against the bundled mock ChatGPT site\n
+Usage: python benchmarks/bench_hot_paths.py --messages 20 --output results.json
+'''
+import argparse
+import json
+import time
+
+from pyChatGPT import ChatGPT
+from pyChatGPT.Blocking import BlockingProfile, preset_patterns
+from pyChatGPT.Memory import process_tree_rss
+from pyChatGPT.Metrics import Histogram
+from pyChatGPT.Mock import MockServer
+
+
+class _CallCounter:
+    '''
+    Count the WebDriver commands sent by a driver
+    '''
+
+    def __init__(self, driver):
+        '''
+        Initialize the _CallCounter object, wrapping the driver's `execute`\n
+        :param driver: The WebDriver
+        '''
+        self.count = 0
+        self.__execute = driver.execute
+        driver.execute = self
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+        return self.__execute(*args, **kwargs)
+
+
+def _timed(func, runs: int) -> dict:
+    '''
+    Time a function\n
+    :param func: The function to call
+    :param runs: Number of calls
+    :return: Summary of the durations in seconds
+    '''
+    histogram = Histogram()
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        histogram.observe(time.perf_counter() - started)
+    return histogram.summary()
+
+
+def _bench_send(chat: ChatGPT, counter: _CallCounter, messages: int) -> dict:
+    '''
+    Benchmark `send_message`\n
+    :param chat: The ChatGPT session
+    :param counter: The WebDriver command counter
+    :param messages: Number of messages to send
+    :return: Throughput, latency, and WebDriver commands per message
+    '''
+    latency = Histogram()
+    failed = 0
+    calls = counter.count
+    started = time.perf_counter()
+    for i in range(messages):
+        sent = time.perf_counter()
+        try:
+            chat.send_message(f'Benchmark message {i}')
+        except ValueError:
+            failed += 1
+        latency.observe(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - started
+    return {
+        'messages_per_sec': messages / elapsed,
+        'failed': failed,
+        'latency': latency.summary(),
+        'webdriver_calls_per_message': (counter.count - calls) / messages,
+    }
+
+
+def _bench_stream(chat: ChatGPT, counter: _CallCounter, messages: int) -> dict:
+    '''
+    Benchmark `stream_message`\n
+    :param chat: The ChatGPT session
+    :param counter: The WebDriver command counter
+    :param messages: Number of messages to stream
+    :return: Time to first token, latency, and WebDriver commands per message
+    '''
+    ttft = Histogram()
+    latency = Histogram()
+    calls = counter.count
+    for i in range(messages):
+        sent = time.perf_counter()
+        first = None
+        try:
+            for _ in chat.stream_message(f'Benchmark stream {i}'):
+                if first is None:
+                    first = time.perf_counter()
+                    ttft.observe(first - sent)
+        except ValueError:
+            pass
+        latency.observe(time.perf_counter() - sent)
+    return {
+        'ttft': ttft.summary(),
+        'latency': latency.summary(),
+        'webdriver_calls_per_message': (counter.count - calls) / messages,
+    }
+
+
+def run(args) -> dict:
+    '''
+    Run every benchmark against a fresh mock site\n
+    :param args: The parsed command line arguments
+    :return: The results
+    '''
+    chrome_args = list(args.chrome_arg)
+    if not args.headed:
+        chrome_args.append('--headless=new')
+
+    with MockServer(
+        reply=' '.join(f'word{i}' for i in range(args.reply_words)),
+        token_rate=args.token_rate,
+        capacity_rate=args.capacity_rate,
+        error_rate=args.error_rate,
+        challenge_delay=args.challenge_delay,
+    ) as mock:
+        chat = ChatGPT(
+            session_token='mock-session-token',
+            base_url=mock.url,
+            chrome_args=chrome_args,
+            capture_network=args.capture_network,
+            transport=args.transport,
+            skip_intro=True,
+            blocking_profile=BlockingProfile(args.block) if args.block else None,
+            verbose=args.verbose,
+        )
+        try:
+            counter = _CallCounter(chat.driver)
+            results = {
+                'config': vars(args),
+                'startup': dict(chat.startup_timings),
+                'memory_after_startup': process_tree_rss(chat.driver.browser_pid),
+                'ensure_cf': _timed(chat._ChatGPT__ensure_cf, args.ensure_cf_runs),
+                'send_message': _bench_send(chat, counter, args.messages),
+                'stream_message': _bench_stream(chat, counter, args.messages),
+                'reset_conversation': _timed(chat.reset_conversation, args.messages),
+                'clear_conversations': _timed(chat.clear_conversations, 1),
+            }
+            results['memory_per_session'] = process_tree_rss(chat.driver.browser_pid)
+            results['memory'] = chat.memory_stats()
+            results['resources'] = chat.resource_stats()
+        finally:
+            chat.__del__()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--ensure-cf-runs', type=int, default=3)
+    parser.add_argument('--reply-words', type=int, default=50)
+    parser.add_argument('--token-rate', type=float, default=200)
+    parser.add_argument('--capacity-rate', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--challenge-delay', type=float, default=0)
+    parser.add_argument('--transport', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--capture-network', action='store_true')
+    parser.add_argument('--chrome-arg', action='append', default=[])
+    parser.add_argument('--block', nargs='*', choices=sorted(preset_patterns))
+    parser.add_argument('--headed', action='store_true')
+    parser.add_argument('--output', default='')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    results = json.dumps(run(args), indent=2)
+    print(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+Measure the import time of pyChatGPT with `python -X importtime` and check it against a budget\n
+Usage: python benchmarks/bench_import.py --budget-ms 50 --output import.json
+'''
+import subprocess
+import argparse
+import statistics
+import json
+import sys
+
+_statements = {
+    'package': 'import pyChatGPT',
+    'chatgpt': 'from pyChatGPT import ChatGPT',
+    'pool': 'from pyChatGPT import ChatGPTPool',
+}
+
+# Only needed once a browser is started or a response is converted
+_deferred = ['selenium', 'undetected_chromedriver', 'markdownify']
+
+
+def _import_time(statement: str) -> tuple:
+    '''
+    Import pyChatGPT in a fresh interpreter\n
+    :param statement: The import statement to run
+    :return: Tuple of the seconds spent importing pyChatGPT and its dependencies, and the names of the modules imported
+    '''
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:') :].split('|')
+        modules.append(name.strip())
+        # Top-level imports of the package include everything they imported
+        if name.startswith(' pyChatGPT'):
+            total += int(cumulative)
+    return total / 1e6, modules
+
+
+def run(args) -> dict:
+    '''
+    Run the benchmarks\n
+    :param args: The parsed command line arguments
+    :return: Dictionary with the import time of each statement and the budget violations
+    '''
+    results = {'config': vars(args), 'statements': {}, 'violations': []}
+    for key, statement in _statements.items():
+        times = []
+        for _ in range(args.runs):
+            seconds, modules = _import_time(statement)
+            times.append(seconds)
+        median = statistics.median(times)
+        deferred = sorted(
+            {
+                i
+                for i in modules
+                if i.split('.')[0] in _deferred and not i.startswith('_')
+            }
+        )
+        results['statements'][key] = {
+            'statement': statement,
+            'median': median,
+            'min': min(times),
+            'max': max(times),
+            'deferred_imported': deferred,
+        }
+        if median * 1000 > args.budget_ms:
+            results['violations'].append(
+                f'{statement}: {median * 1000:.1f}ms over the {args.budget_ms}ms budget'
+            )
+        if deferred:
+            results['violations'].append(f'{statement}: imported {", ".join(deferred)}')
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=50)
+    parser.add_argument('--output', default='')
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if results['violations']:
+        sys.exit('\n'.join(results['violations']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+from urllib.parse import urlsplit
+from functools import partial
+import asyncio
+import logging
+import json
+import ssl
+
+from .pyChatGPT import ChatGPT, parse_conversation_event
+from .Http import build_conversation_request, default_model
+from .Scheduler import http_error, response_error
+
+
+class AsyncHttpTransport:
+    '''
+    Send conversation requests over pooled keep-alive asyncio connections
+    '''
+
+    def __init__(
+        self,
+        base_url: str = 'https://chat.openai.com',
+        model: str = default_model,
+        pool_size: int = 4,
+    ):
+        '''
+        Initialize the AsyncHttpTransport object\n
+        :param base_url: The URL of the ChatGPT site to send requests to
+        :param model: The model to use for new messages
+        :param pool_size: Maximum number of idle connections to keep open
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        url = urlsplit(base_url)
+        if url.scheme not in ['http', 'https']:
+            raise ValueError('Invalid base URL')
+        self.__ssl = ssl.create_default_context() if url.scheme == 'https' else None
+        self.__host = url.hostname
+        self.__port = url.port or (443 if url.scheme == 'https' else 80)
+        self.__netloc = url.netloc
+        self.__base_path = url.path.rstrip('/')
+        self.__model = model
+        self.__pool_size = pool_size
+        self.__pool = []
+        self.headers = {}
+
+    async def __acquire(self, fresh: bool = False) -> tuple:
+        '''
+        Get an idle connection from the pool, opening one if there is none\n
+        :param fresh: Whether to skip the pool and always open a new connection
+        :return: Tuple of the stream reader and writer, and whether it was reused from the pool
+        '''
+        while self.__pool and not fresh:
+            reader, writer = self.__pool.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return (reader, writer), True
+            writer.close()
+        self.logger.debug(f'Opening connection to {self.__netloc}...')
+        connection = await asyncio.open_connection(
+            self.__host, self.__port, ssl=self.__ssl
+        )
+        return connection, False
+
+    def __release(self, connection: tuple) -> None:
+        '''
+        Return a connection to the pool, closing it if the pool is full\n
+        :param connection: Tuple of the stream reader and writer
+        '''
+        if len(self.__pool) < self.__pool_size and not connection[1].is_closing():
+            self.__pool.append(connection)
+        else:
+            connection[1].close()
+
+    async def __request(
+        self, method: str, path: str, body: dict = None, accept: str = ''
+    ) -> tuple:
+        '''
+        Send a request on a pooled connection\n
+        :param method: The HTTP method
+        :param path: The path relative to the base URL
+        :param body: The JSON body to send
+        :param accept: The `Accept` header to send
+        :return: Tuple of the connection, the status code and the response headers
+        '''
+        headers = {**self.headers, 'Host': self.__netloc, 'Connection': 'keep-alive'}
+        if accept:
+            headers['Accept'] = accept
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        headers['Content-Length'] = str(len(payload))
+        request = f'{method} {self.__base_path + path} HTTP/1.1\r\n'
+        request += ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+
+        for fresh in [False, True]:
+            (reader, writer), reused = await self.__acquire(fresh)
+            try:
+                writer.write(request.encode('utf-8') + payload)
+                await writer.drain()
+                status_line = await reader.readline()
+            except (BrokenPipeError, ConnectionResetError):
+                status_line = b''
+            except BaseException:
+                writer.close()
+                raise
+            if status_line:
+                break
+            writer.close()
+            # Only an idle keep-alive connection the server closed before
+            # answering is safe to retry on a new one
+            if not reused:
+                raise ValueError('Connection closed by server')
+
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            response_headers[key.strip().lower()] = value.strip()
+        return (reader, writer), status, response_headers
+
+    async def __iter_body(self, connection: tuple, headers: dict):
+        '''
+        Read a response body as it arrives\n
+        :param connection: Tuple of the stream reader and writer
+        :param headers: The response headers
+        :return: Async generator yielding chunks of the body
+        '''
+        reader = connection[0]
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    await reader.readline()
+                    break
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            yield await reader.readexactly(int(headers['content-length']))
+        else:
+            yield await reader.read()
+            connection[1].close()
+
+    async def __read(self, connection: tuple, headers: dict) -> bytes:
+        '''
+        Read a whole response body and release its connection\n
+        :param connection: Tuple of the stream reader and writer
+        :param headers: The response headers
+        :return: The body
+        '''
+        body = b''.join([i async for i in self.__iter_body(connection, headers)])
+        self.__release(connection)
+        return body
+
+    async def __raise_for_status(self, connection: tuple, status: int, headers: dict):
+        '''
+        Raise an exception if a request failed\n
+        :param connection: Tuple of the stream reader and writer
+        :param status: The status code
+        :param headers: The response headers
+        '''
+        if status == 200:
+            return
+        detail = (await self.__read(connection, headers)).decode('utf-8', 'replace')
+        try:
+            detail = json.loads(detail)['detail']
+        except (json.decoder.JSONDecodeError, KeyError, TypeError):
+            pass
+        raise http_error(status, detail, headers.get('retry-after'))
+
+    async def get_conversation(self, conversation_id: str) -> dict:
+        '''
+        Get a conversation\n
+        :param conversation_id: The conversation ID
+        :return: The conversation, including its `current_node`
+        '''
+        connection, status, headers = await self.__request(
+            'GET', f'/backend-api/conversation/{conversation_id}'
+        )
+        await self.__raise_for_status(connection, status, headers)
+        return json.loads(await self.__read(connection, headers))
+
+    async def stream_conversation(
+        self, message: str, conversation_id: str = None, parent_message_id: str = None
+    ):
+        '''
+        Send a message and yield the response as it streams\n
+        :param message: Message to send
+        :param conversation_id: The conversation to continue, or None to start a new one
+        :param parent_message_id: The message to reply to
+        :return: Async generator yielding the new text of the response, then the final response
+        '''
+        body = build_conversation_request(
+            message, conversation_id, parent_message_id, self.__model
+        )
+        self.logger.debug('Sending message over HTTP...')
+        connection, status, headers = await self.__request(
+            'POST', '/backend-api/conversation', body, 'text/event-stream'
+        )
+        await self.__raise_for_status(connection, status, headers)
+
+        event = None
+        content = ''
+        buffer = b''
+        try:
+            async for chunk in self.__iter_body(connection, headers):
+                *lines, buffer = (buffer + chunk).split(b'\n')
+                for line in lines:
+                    data = parse_conversation_event(line.decode('utf-8'))
+                    if not data:
+                        continue
+                    if data.get('error'):
+                        raise response_error(data['error'])
+                    event = data
+                    text = data['message']['content']['parts'][0]
+                    if text.startswith(content) and len(text) > len(content):
+                        yield text[len(content) :]
+                    content = text
+        except BaseException:
+            # Dropping the connection is the only way to abort the stream
+            connection[1].close()
+            raise
+        self.__release(connection)
+
+        if not event:
+            raise ValueError('Empty conversation response')
+        yield {
+            'message': content,
+            'conversation_id': event['conversation_id'],
+            'message_id': event['message']['id'],
+        }
+
+    async def close(self) -> None:
+        '''
+        Close every pooled connection
+        '''
+        while self.__pool:
+            self.__pool.pop()[1].close()
+
+
+class AsyncMessageStream:
+    '''
+    An async iterator over the text of a streamed ChatGPT response
+    '''
+
+    def __init__(self, generator):
+        '''
+        Initialize the AsyncMessageStream object\n
+        :param generator: Async generator yielding the new text, then the final response
+        '''
+        self.__generator = generator
+        self.__result = {'message': None, 'conversation_id': None}
+        self.message = None
+        self.conversation_id = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        item = await self.__generator.__anext__()
+        if isinstance(item, dict):
+            self.__result = item
+            self.message = item['message']
+            self.conversation_id = item['conversation_id']
+            await self.__generator.aclose()
+            raise StopAsyncIteration
+        return item
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    @property
+    def result(self) -> dict:
+        '''
+        The final response, available once the stream is exhausted\n
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        return self.__result
+
+    async def aclose(self) -> None:
+        '''
+        Stop reading the stream, aborting the generation if it is unfinished
+        '''
+        await self.__generator.aclose()
+
+
+class AsyncChatGPT:
+    '''
+    An asyncio client for ChatGPT, using the browser only for authentication
+    '''
+
+    def __init__(
+        self,
+        *args,
+        base_url: str = 'https://chat.openai.com',
+        pool_size: int = 4,
+        **kwargs,
+    ):
+        '''
+        Initialize the AsyncChatGPT object, call `start()` or use `async with` before sending\n
+        :param args: Arguments passed to `ChatGPT`
+        :param base_url: The URL of the ChatGPT site to send requests to
+        :param pool_size: Maximum number of idle connections to keep open
+        :param kwargs: Arguments passed to `ChatGPT`
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        kwargs['transport'] = 'http'
+        kwargs['base_url'] = base_url
+        self.__args = args
+        self.__kwargs = kwargs
+        self.__conversation_id = kwargs.get('conversation_id', '')
+        self.__parent_message_id = None
+        self.__http = AsyncHttpTransport(base_url, pool_size=pool_size)
+        self.__browser_lock = None
+        self.chat = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def __run_browser(self, func, *args):
+        '''
+        Run a blocking browser call in a thread, one at a time\n
+        :param func: The function to run
+        :param args: Arguments passed to the function
+        :return: The result of the function
+        '''
+        if not self.__browser_lock:
+            self.__browser_lock = asyncio.Lock()
+        async with self.__browser_lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, partial(func, *args))
+
+    async def start(self) -> 'AsyncChatGPT':
+        '''
+        Start the browser and authenticate\n
+        :return: The client itself
+        '''
+        self.chat = await self.__run_browser(
+            partial(ChatGPT, *self.__args, **self.__kwargs)
+        )
+        self.__http.headers = self.chat._ChatGPT__http.headers
+        return self
+
+    async def __ensure_session(self, force: bool = False) -> None:
+        '''
+        Revalidate the session in the browser if it expired\n
+        :param force: Whether to revalidate even if the session has not expired
+        '''
+        # A cached session is checked on the event loop, only a revalidation
+        # needs the browser
+        if not force and self.chat._ChatGPT__is_session_cached():
+            self.chat.session_cache_hits += 1
+            return
+        await self.__run_browser(self.__revalidate, force)
+        self.__http.headers = self.chat._ChatGPT__http.headers
+
+    def __revalidate(self, force: bool) -> None:
+        '''
+        Revalidate the session, holding the browser against the keep-alive and
+        health probes of the session\n
+        :param force: Whether to revalidate even if the session has not expired
+        '''
+        with self.chat._ChatGPT__in_window():
+            if force:
+                self.chat._ChatGPT__invalidate_session()
+            self.chat._ChatGPT__ensure_session()
+
+    async def __generate_message(self, message: str):
+        '''
+        Send a message and yield the response as it streams\n
+        :param message: Message to send
+        :return: Async generator yielding the new text of the response, then the final response
+        '''
+        if not self.chat:
+            raise ValueError('Please start the client before sending messages')
+        await self.__ensure_session()
+        if self.__conversation_id and not self.__parent_message_id:
+            self.logger.debug('Getting current node of conversation...')
+            conversation = await self.__http.get_conversation(self.__conversation_id)
+            self.__parent_message_id = conversation['current_node']
+
+        for retry in [True, False]:
+            generator = self.__http.stream_conversation(
+                message, self.__conversation_id, self.__parent_message_id
+            )
+            try:
+                first = await generator.__anext__()
+                break
+            except ValueError as e:
+                await generator.aclose()
+                if not retry or not str(e).startswith('Unauthorized'):
+                    raise e
+                self.logger.debug('Send failed with an auth symptom, revalidating...')
+                await self.__ensure_session(force=True)
+
+        try:
+            item = first
+            while not isinstance(item, dict):
+                yield item
+                item = await generator.__anext__()
+        finally:
+            await generator.aclose()
+        self.__conversation_id = item['conversation_id']
+        self.__parent_message_id = item['message_id']
+        yield item
+
+    def stream_message(self, message: str) -> AsyncMessageStream:
+        '''
+        Send a message to ChatGPT and stream the response\n
+        Closing the stream or cancelling the task aborts the generation\n
+        :param message: Message to send
+        :return: AsyncMessageStream yielding the new text of the response
+        '''
+        return AsyncMessageStream(self.__generate_message(message))
+
+    async def send_message(self, message: str) -> dict:
+        '''
+        Send a message to ChatGPT\n
+        :param message: Message to send
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        async with self.stream_message(message) as response:
+            async for _ in response:
+                pass
+        return response.result
+
+    async def reset_conversation(self) -> None:
+        '''
+        Reset the conversation
+        '''
+        self.__conversation_id = ''
+        self.__parent_message_id = None
+
+    async def close(self) -> None:
+        '''
+        Close the connections and the browser
+        '''
+        await self.__http.close()
+        if self.chat:
+            await self.__run_browser(self.chat.__del__)
+            self.chat = None
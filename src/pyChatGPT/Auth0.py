@@ -1,9 +1,13 @@
+from concurrent.futures import Future
+from threading import Thread
+import time
+
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common import exceptions as SeleniumExceptions
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 
-import time
+from .pyChatGPT import _timed
+from .Wait import WaitPolicy
 
 google_oauth_btn = (By.XPATH, '//button[@data-provider="google"]')
 microsoft_oauth_btn = (By.XPATH, '//button[@data-provider="windowslive"]')
@@ -27,6 +31,9 @@ openai_captcha_sitekey = (
     '//div[@data-recaptcha-provider="recaptcha_enterprise"]',
 )
 
+# Seconds between two polls of the captchas sent to 2captcha, as its API recommends
+_twocaptcha_poll_interval = 5
+
 
 def login(self) -> None:
     '''
@@ -44,80 +51,100 @@ def __google_login(self) -> None:
     '''
     Login to ChatGPT using Google
     '''
+    timings = self.login_timings
     self.logger.debug('Clicking Google button...')
     self.driver.find_element(*google_oauth_btn).click()
 
     google_email_entry = (By.XPATH, f'//div[@data-identifier="{self._ChatGPT__email}"]')
+    with _timed(timings, 'credentials'):
+        __google_credentials(self, google_email_entry)
+
+    with _timed(timings, 'verification'):
+        __google_verification(self)
+
+
+def __google_credentials(self, google_email_entry: tuple) -> None:
+    '''
+    Pick the remembered Google account, or enter the email and password\n
+    :param google_email_entry: Locator of the remembered account
+    '''
     try:
         self.logger.debug('Checking if Google remembers emai...')
 
-        WebDriverWait(self.driver, 3).until(
-            EC.element_to_be_clickable(google_email_entry)
+        self._ChatGPT__wait(
+            'login_probe', EC.element_to_be_clickable(google_email_entry)
         ).click()
         self.logger.debug('Google remembers email')
 
     except SeleniumExceptions.TimeoutException:
         self.logger.debug('Google does not remember email')
         self.logger.debug('Entering email...')
-        WebDriverWait(self.driver, 5).until(
-            EC.element_to_be_clickable(google_email_input)
+        self._ChatGPT__wait(
+            'login', EC.element_to_be_clickable(google_email_input)
         ).send_keys(self._ChatGPT__email)
 
         self.logger.debug('Clicking Next...')
         self.driver.find_element(*google_next_btn).click()
 
         self.logger.debug('Entering password...')
-        WebDriverWait(self.driver, 5).until(
-            EC.element_to_be_clickable(google_pwd_input)
+        self._ChatGPT__wait(
+            'login', EC.element_to_be_clickable(google_pwd_input)
         ).send_keys(self._ChatGPT__password)
 
         self.logger.debug('Clicking Next...')
         self.driver.find_element(*google_pwd_next_btn).click()
 
+
+def __google_verification(self) -> None:
+    '''
+    Show the Google verification code, if any, until it is used
+    '''
     try:
         self.logger.debug('Checking if verification code is required...')
-        WebDriverWait(self.driver, 5).until(
-            EC.presence_of_element_located(google_code_samp)
-        )
+        self._ChatGPT__wait('login', EC.presence_of_element_located(google_code_samp))
         self.logger.debug('Code is required')
-        prev_code = self.driver.find_elements(By.TAG_NAME, 'samp')[0].text
-        print('Verification code:', prev_code)
-        while True:
-            code = self.driver.find_elements(*google_code_samp)
-            if not code:
-                break
-            if code[0].text != prev_code:
+        prev_code = [self.driver.find_elements(By.TAG_NAME, 'samp')[0].text]
+        print('Verification code:', prev_code[0])
+
+        def code_used(driver) -> bool:
+            code = driver.find_elements(*google_code_samp)
+            if code and code[0].text != prev_code[0]:
                 print('Verification code:', code[0].text)
-                prev_code = code[0].text
-            time.sleep(1)
+                prev_code[0] = code[0].text
+            return not code
+
+        self._ChatGPT__wait('verification_code', code_used)
     except SeleniumExceptions.TimeoutException:
         self.logger.debug('Code is not required')
 
 
 def __microsoft_login(self) -> None:
+    timings = self.login_timings
     self.logger.debug('Clicking Microsoft button...')
     self.driver.find_element(*microsoft_oauth_btn).click()
 
-    self.logger.debug('Entering email...')
-    WebDriverWait(self.driver, 5).until(
-        EC.element_to_be_clickable(microsoft_email_input)
-    ).send_keys(self._ChatGPT__email)
+    with _timed(timings, 'credentials'):
+        self.logger.debug('Entering email...')
+        self._ChatGPT__wait(
+            'login', EC.element_to_be_clickable(microsoft_email_input)
+        ).send_keys(self._ChatGPT__email)
 
-    self.logger.debug('Clicking Next...')
-    self.driver.find_element(*microsoft_next_btn).click()
+        self.logger.debug('Clicking Next...')
+        self.driver.find_element(*microsoft_next_btn).click()
 
-    self.logger.debug('Entering password...')
-    WebDriverWait(self.driver, 5).until(
-        EC.element_to_be_clickable(microsoft_pwd_input)
-    ).send_keys(self._ChatGPT__password)
+        self.logger.debug('Entering password...')
+        self._ChatGPT__wait(
+            'login', EC.element_to_be_clickable(microsoft_pwd_input)
+        ).send_keys(self._ChatGPT__password)
 
-    self.logger.debug('Clicking Next...')
-    self.driver.find_element(*microsoft_next_btn).click()
+        self.logger.debug('Clicking Next...')
+        self.driver.find_element(*microsoft_next_btn).click()
 
-    self.logger.debug('Clicking allow...')
-    WebDriverWait(self.driver, 5).until(
-        EC.element_to_be_clickable(microsoft_next_btn)
-    ).click()
+    with _timed(timings, 'consent'):
+        self.logger.debug('Clicking allow...')
+        self._ChatGPT__wait(
+            'login', EC.element_to_be_clickable(microsoft_next_btn)
+        ).click()
 
 
 def __have_recaptcha_value(self) -> bool:
@@ -151,42 +178,163 @@ def __pypasser_solve(self, retry: int) -> None:
         self.logger.debug(f'pypasser solver error: {str(e)}')
 
 
-def __twocaptcha_solve(self, retry: int) -> None:
+def __start_twocaptcha(self, retry: int, deadline: float) -> Future:
     '''
-    Solve the recaptcha using 2captcha
-    :param retry: Number of times to retry solving the recaptcha
+    Start solving the recaptcha with 2captcha in the background, as soon as its
+    sitekey is on the page, so the solve overlaps the rest of the login\n
+    :param retry: Number of 2captcha requests to make at most
+    :param deadline: Time after which the solve is abandoned
+    :return: Future resolving to the recaptcha token, or None if the sitekey is not on the page yet
+    '''
+    sitekeys = self.driver.find_elements(*openai_captcha_sitekey)
+    if not sitekeys:
+        return None
+    sitekey = sitekeys[0].get_attribute('data-recaptcha-sitekey')
+    self.logger.debug('Captcha sitekey found, solving in the background...')
+    future = Future()
+    Thread(
+        target=__twocaptcha_solve,
+        args=(self, sitekey, self.driver.current_url, retry, deadline, future),
+        daemon=True,
+    ).start()
+    return future
+
+
+def __twocaptcha_solve(
+    self, sitekey: str, url: str, retry: int, deadline: float, future: Future
+) -> None:
+    '''
+    Solve the recaptcha using 2captcha, with `solver_redundancy` captchas in
+    flight and the first answer winning. The captchas are polled here rather
+    than by the 2captcha client, so a cancelled solve stops polling right away;
+    2captcha still charges for every captcha it solves\n
+    :param sitekey: The sitekey of the recaptcha
+    :param url: The URL of the page with the recaptcha
+    :param retry: Number of captchas to send to 2captcha at most
+    :param deadline: Time after which the solve is abandoned
+    :param future: Future set to the recaptcha token, cancelling it abandons the solve
     '''
     try:
-        from twocaptcha import TwoCaptcha
+        from twocaptcha import TwoCaptcha, NetworkException
     except ModuleNotFoundError:
-        raise ModuleNotFoundError(
-            'Please install twocaptcha by running `pip install 2captcha-python`'
+        return future.set_exception(
+            ModuleNotFoundError(
+                'Please install twocaptcha by running `pip install 2captcha-python`'
+            )
         )
 
-    self.logger.debug(f'Trying 2captcha solver, max retry = {retry}')
-    solver = TwoCaptcha(self._ChatGPT__solver_apikey, pollingInterval=5)
-    sitekey = self.driver.find_element(*openai_captcha_sitekey).get_attribute(
-        'data-recaptcha-sitekey'
+    redundancy = self._ChatGPT__solver_redundancy
+    attempts = max(retry, redundancy)
+    self.logger.debug(
+        f'Trying 2captcha solver, {redundancy} in parallel, max attempts = {attempts}'
     )
-    result = None
-    for _ in range(retry):
-        try:
-            result = solver.recaptcha(
-                sitekey=sitekey,
-                url=self.driver.current_url,
-                invisible=1,
-                enterprise=1,
-            )
-            if result:
-                captcha_input = self.driver.find_element(*openai_captcha_input)
-                self.driver.execute_script(
-                    'arguments[0].setAttribute("value", arguments[1])',
-                    captcha_input,
-                    result['code'],
-                )
-                break
-        except Exception as e:
-            self.logger.debug(f'2captcha solver error: {str(e)}')
+    solver = TwoCaptcha(self._ChatGPT__solver_apikey)
+    pending = []
+    errors = []
+    polled_at = time.time()
+    try:
+        while not future.cancelled():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise ValueError('2captcha did not solve the captcha in time')
+            while len(pending) < redundancy and attempts > 0:
+                attempts -= 1
+                try:
+                    pending.append(
+                        solver.send(
+                            method='userrecaptcha',
+                            googlekey=sitekey,
+                            url=url,
+                            invisible=1,
+                            enterprise=1,
+                        )
+                    )
+                except Exception as e:
+                    self.logger.debug(f'2captcha solver error: {str(e)}')
+                    errors.append(str(e))
+            if not pending:
+                raise ValueError(f'2captcha failed to solve the captcha: {errors}')
+
+            # Sleep in short steps to notice a cancelled solve
+            time.sleep(min(remaining, 1))
+            if time.time() - polled_at < _twocaptcha_poll_interval:
+                continue
+            polled_at = time.time()
+            for captcha_id in list(pending):
+                if future.cancelled():
+                    break
+                try:
+                    code = solver.get_result(captcha_id)
+                except NetworkException:
+                    # Not solved yet, or the poll itself failed
+                    continue
+                except Exception as e:
+                    self.logger.debug(f'2captcha solver error: {str(e)}')
+                    errors.append(str(e))
+                    pending.remove(captcha_id)
+                    continue
+                if code:
+                    return __resolve(future, result=code)
+    except Exception as e:
+        __resolve(future, error=e)
+
+
+def __resolve(future: Future, result=None, error: Exception = None) -> None:
+    '''
+    Resolve the Future of a solve unless it was cancelled\n
+    :param future: Future of the solve
+    :param result: The recaptcha token
+    :param error: The exception the solve failed with, if any
+    '''
+    try:
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except Exception:
+        # Cancelled meanwhile, nobody is waiting for the solve anymore
+        pass
+
+
+def __apply_twocaptcha(self, future: Future, deadline: float) -> None:
+    '''
+    Wait for the background 2captcha solve and fill in its token\n
+    :param future: Future of the solve
+    :param deadline: Time after which the solve is abandoned
+    '''
+    try:
+        code = future.result(timeout=max(0, deadline - time.time()))
+    except Exception as e:
+        return self.logger.debug(f'2captcha solver error: {str(e) or type(e).__name__}')
+    captcha_input = self.driver.find_element(*openai_captcha_input)
+    self.driver.execute_script(
+        'arguments[0].setAttribute("value", arguments[1])', captcha_input, code
+    )
+
+
+def __wait_manual_captcha(self, deadline: float) -> None:
+    '''
+    Wait for the recaptcha to be solved by hand, until the deadline when a solver
+    was meant to solve it\n
+    :param deadline: Time after which the login gives up
+    '''
+    policy = self._ChatGPT__wait_policies['manual_captcha']
+    if self._ChatGPT__captcha_solver:
+        remaining = max(0, deadline - time.time())
+        policy = WaitPolicy(
+            remaining if policy.timeout is None else min(policy.timeout, remaining),
+            policy.interval,
+            policy.max_interval,
+            policy.backoff,
+        )
+    try:
+        policy.until(
+            self.driver, lambda driver: __have_recaptcha_value(self), 'manual_captcha'
+        )
+    except SeleniumExceptions.TimeoutException:
+        raise ValueError(
+            f'Captcha not solved within {self._ChatGPT__solver_timeout} seconds'
+        )
 
 
 def __openai_login(self, retry: int = 3) -> None:
@@ -194,16 +342,49 @@ def __openai_login(self, retry: int = 3) -> None:
     Login to ChatGPT using OpenAI
     :param retry: Number of times to retry solving the recaptcha
     '''
-    self.logger.debug('Entering email...')
-    self.driver.find_element(*openai_email_input).send_keys(self._ChatGPT__email)
-    self.driver.find_element(*openai_continue_btn).click()
+    timings = self.login_timings
+    deadline = time.time() + self._ChatGPT__solver_timeout
+    solving = None
+    if self._ChatGPT__captcha_solver == '2captcha':
+        solving = __start_twocaptcha(self, retry, deadline)
+
+    try:
+        with _timed(timings, 'email'):
+            self.logger.debug('Entering email...')
+            self.driver.find_element(*openai_email_input).send_keys(
+                self._ChatGPT__email
+            )
+            self.driver.find_element(*openai_continue_btn).click()
+
+        with _timed(timings, 'captcha'):
+            if self._ChatGPT__captcha_solver == '2captcha' and not solving:
+                solving = __start_twocaptcha(self, retry, deadline)
+            __openai_captcha(self, retry, deadline, solving)
+    finally:
+        if solving:
+            # Stop the redundant requests once the captcha is out of the way
+            solving.cancel()
+
+    with _timed(timings, 'password'):
+        self.logger.debug('Entering password...')
+        self.driver.find_element(*openai_pwd_input).send_keys(self._ChatGPT__password)
+        self.driver.find_element(*openai_continue_btn).click()
+
 
+def __openai_captcha(self, retry: int, deadline: float, solving: Future) -> None:
+    '''
+    Get past the recaptcha of the OpenAI login, if there is one\n
+    :param retry: Number of times to retry solving the recaptcha
+    :param deadline: Time after which the login gives up
+    :param solving: Future of the background 2captcha solve, if any
+    '''
     have_recaptcha = False
     try:
-        WebDriverWait(self.driver, 3).until(
+        self._ChatGPT__wait(
+            'login_probe',
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, 'iframe[title="reCAPTCHA"]')
-            )
+            ),
         )
         have_recaptcha = True
         self.logger.debug('Captcha detected')
@@ -211,16 +392,18 @@ def __openai_login(self, retry: int = 3) -> None:
         self.logger.debug('No captcha detected')
 
     try:
-        WebDriverWait(self.driver, 3).until(
+        self._ChatGPT__wait(
+            'login_probe',
             EC.text_to_be_present_in_element_attribute(
                 openai_captcha_input, 'value', '_'
-            )
+            ),
         )
     except SeleniumExceptions.TimeoutException:
         if self._ChatGPT__captcha_solver == 'pypasser':
+            # Drives the browser itself, so it cannot run alongside the login
             __pypasser_solve(self, retry)
-        elif self._ChatGPT__captcha_solver == '2captcha':
-            __twocaptcha_solve(self, retry)
+        elif solving:
+            __apply_twocaptcha(self, solving, deadline)
 
     if have_recaptcha:
         if __have_recaptcha_value(self):
@@ -228,12 +411,7 @@ def __openai_login(self, retry: int = 3) -> None:
         else:
             self.logger.debug('Oops! you need to solve reCAPTCHA manually')
             self.driver.get(self.driver.current_url)
-            while not __have_recaptcha_value(self):
-                time.sleep(1)
+            __wait_manual_captcha(self, deadline)
 
         self.logger.debug('Clicking Continue...')
         self.driver.find_element(*openai_continue_btn).click()
-
-    self.logger.debug('Entering password...')
-    self.driver.find_element(*openai_pwd_input).send_keys(self._ChatGPT__password)
-    self.driver.find_element(*openai_continue_btn).click()
@@ -0,0 +1,252 @@
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from collections import deque
+from threading import Timer
+import logging
+import json
+import time
+import os
+
+from .Scheduler import backoff
+
+
+def read_prompts(path: str):
+    '''
+    Read prompts from a JSONL file\n
+    :param path: The path to the file, each line being a string or an object with a `prompt` key
+    :return: Generator yielding the prompts
+    '''
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def submit_now(chat, message: str, reset: bool = False) -> Future:
+    '''
+    Send a message on a single session, wrapping the result in a Future\n
+    :param chat: The ChatGPT session
+    :param message: Message to send
+    :param reset: Whether to reset the conversation first
+    :return: Future resolved with the `send_message` result
+    '''
+    future = Future()
+    try:
+        if reset:
+            chat.reset_conversation()
+        future.set_result(chat.send_message(message))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _chain(source: Future, target: Future) -> None:
+    '''
+    Resolve a Future with the outcome of another once it is done\n
+    :param source: The Future to follow
+    :param target: The Future to resolve
+    '''
+
+    def done(future: Future) -> None:
+        if future.cancelled():
+            target.set_exception(ValueError('Prompt was cancelled'))
+        elif future.exception():
+            target.set_exception(future.exception())
+        else:
+            target.set_result(future.result())
+
+    source.add_done_callback(done)
+
+
+class Batch:
+    '''
+    An iterator over the results of a batch of prompts
+    '''
+
+    def __init__(
+        self,
+        submit,
+        prompts,
+        concurrency: int = 1,
+        new_conversation_per_prompt: bool = True,
+        ordered: bool = True,
+        checkpoint_path: str = '',
+        retries: int = 2,
+        retry_delay: float = 5,
+    ):
+        '''
+        Initialize the Batch object\n
+        :param submit: Function taking a message and whether to reset the conversation, returning a Future
+        :param prompts: Iterable of prompts, each being a string or a dict with a `prompt` key
+        :param concurrency: Maximum number of prompts in flight
+        :param new_conversation_per_prompt: Whether to reset the conversation before each prompt
+        :param ordered: Whether to yield results in input order instead of as they complete
+        :param checkpoint_path: The path to a JSONL file recording finished prompts, skipped when resuming
+        :param retries: Number of times to retry a failed prompt (0 when `submit` retries on its own, like `ChatGPTPool.submit`)
+        :param retry_delay: Seconds to wait before the first retry of a failed prompt, doubling with jitter after each one
+        '''
+        if concurrency < 1:
+            raise ValueError('Concurrency must be at least 1')
+        self.logger = logging.getLogger('pyChatGPT')
+        self.__submit = submit
+        self.__prompts = prompts
+        self.__concurrency = concurrency
+        self.__reset = new_conversation_per_prompt
+        self.__ordered = ordered
+        self.__checkpoint_path = checkpoint_path
+        self.__retries = retries
+        self.__retry_delay = retry_delay
+
+        self.__started = None
+        self.__completed = 0
+        self.__failed = 0
+        self.__skipped = 0
+        self.__retried = 0
+        self.__generator = self.__run()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> dict:
+        return next(self.__generator)
+
+    def __submit_later(self, prompt: str, delay: float) -> Future:
+        '''
+        Submit a prompt once a delay has passed, without holding up the prompts in flight\n
+        :param prompt: The prompt
+        :param delay: Seconds to wait before submitting
+        :return: Future resolving to the `send_message` result
+        '''
+        future = Future()
+
+        def submit() -> None:
+            try:
+                _chain(self.__submit(prompt, self.__reset), future)
+            except Exception as e:
+                future.set_exception(e)
+
+        timer = Timer(delay, submit)
+        timer.daemon = True
+        timer.start()
+        return future
+
+    def __load_checkpoint(self) -> set:
+        '''
+        Load the indexes of the prompts answered by a previous run, failed prompts are retried\n
+        :return: Set of finished prompt indexes
+        '''
+        if not self.__checkpoint_path or not os.path.exists(self.__checkpoint_path):
+            return set()
+        finished = set()
+        with open(self.__checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                    if not result['error']:
+                        finished.add(result['index'])
+                except (json.decoder.JSONDecodeError, KeyError):
+                    # A crash can leave a partially written last line
+                    continue
+        self.logger.debug(f'Resuming batch, {len(finished)} prompts already finished')
+        return finished
+
+    def __run(self):
+        '''
+        Send the prompts and yield their results\n
+        :return: Generator yielding dictionaries with keys `index`, `prompt`, `message`, `conversation_id` and `error`
+        '''
+        finished = self.__load_checkpoint()
+        checkpoint = (
+            open(self.__checkpoint_path, 'a', encoding='utf-8')
+            if self.__checkpoint_path
+            else None
+        )
+        prompts = iter(enumerate(self.__prompts))
+        in_flight = {}
+        order = deque()
+        results = {}
+        exhausted = False
+        self.__started = time.time()
+
+        try:
+            while True:
+                while not exhausted and len(in_flight) < self.__concurrency:
+                    try:
+                        index, item = next(prompts)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if index in finished:
+                        self.__skipped += 1
+                        continue
+                    prompt = item['prompt'] if isinstance(item, dict) else item
+                    future = self.__submit(prompt, self.__reset)
+                    in_flight[future] = (index, item, prompt, 1)
+                    if self.__ordered:
+                        order.append(index)
+                if not in_flight:
+                    break
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item, prompt, attempts = in_flight.pop(future)
+                    result = {'index': index, 'prompt': prompt, 'attempts': attempts}
+                    if isinstance(item, dict) and 'id' in item:
+                        result['id'] = item['id']
+                    try:
+                        response = future.result()
+                        result.update(
+                            {
+                                'message': response['message'],
+                                'conversation_id': response['conversation_id'],
+                                'error': None,
+                            }
+                        )
+                        self.__completed += 1
+                    except Exception as e:
+                        if attempts <= self.__retries:
+                            self.logger.debug(
+                                f'Prompt {index} failed, retrying: {str(e)}'
+                            )
+                            self.__retried += 1
+                            future = self.__submit_later(
+                                prompt,
+                                getattr(e, 'retry_after', None)
+                                or backoff(attempts - 1, self.__retry_delay),
+                            )
+                            in_flight[future] = (index, item, prompt, attempts + 1)
+                            continue
+                        result.update(
+                            {'message': None, 'conversation_id': None, 'error': str(e)}
+                        )
+                        self.__failed += 1
+
+                    if checkpoint:
+                        checkpoint.write(json.dumps(result) + '\n')
+                        checkpoint.flush()
+                    if self.__ordered:
+                        results[index] = result
+                    else:
+                        yield result
+
+                while order and order[0] in results:
+                    yield results.pop(order.popleft())
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
+    def stats(self) -> dict:
+        '''
+        Get the progress and throughput of the batch\n
+        :return: Dictionary with prompt counts, retries, and throughput in prompts per minute
+        '''
+        elapsed = time.time() - self.__started if self.__started else 0.0
+        return {
+            'completed': self.__completed,
+            'failed': self.__failed,
+            'skipped': self.__skipped,
+            'retries': self.__retried,
+            'elapsed': elapsed,
+            'prompts_per_min': (
+                (self.__completed + self.__failed) / elapsed * 60 if elapsed else 0.0
+            ),
+        }
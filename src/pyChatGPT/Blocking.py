@@ -0,0 +1,98 @@
+import re
+
+
+def _extensions(*extensions: str) -> list:
+    return [j for i in extensions for j in [f'*.{i}', f'*.{i}?*']]
+
+
+# URL patterns for `Network.setBlockedURLs`, `*` matching any characters
+preset_patterns = {
+    # Avatars, logos and illustrations, never read by the wrapper
+    'images': _extensions('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'ico')
+    + ['*gravatar.com/*', '*.googleusercontent.com/*'],
+    'media': _extensions('mp4', 'webm', 'mp3', 'wav', 'ogg'),
+    'fonts': _extensions('woff', 'woff2', 'ttf', 'otf', 'eot')
+    + ['*fonts.googleapis.com/*', '*fonts.gstatic.com/*'],
+    'analytics': [
+        '*google-analytics.com/*',
+        '*googletagmanager.com/*',
+        '*doubleclick.net/*',
+        '*segment.com/*',
+        '*segment.io/*',
+        '*intercom.io/*',
+        '*intercomcdn.com/*',
+        '*hotjar.com/*',
+        '*/ces/v1/*',
+    ],
+    'telemetry': [
+        '*sentry.io/*',
+        '*sentry-cdn.com/*',
+        '*datadoghq.com/*',
+        '*/cdn-cgi/rum*',
+    ],
+}
+
+# Blocking these never changes what the wrapper reads from the page or how it logs in
+safe_presets = ['fonts', 'analytics', 'telemetry']
+
+# Paths and URLs a session cannot work without: the chat page and its scripts,
+# the session and conversation APIs, the Cloudflare challenge and the logins
+_required_paths = [
+    '/chat',
+    '/api/auth/session',
+    '/backend-api/conversation',
+    '/_next/static/chunks/main.js',
+    '/cdn-cgi/challenge-platform/h/b/orchestrate/jsch/v1',
+]
+_required_urls = [
+    'https://challenges.cloudflare.com/turnstile/v0/api.js',
+    'https://auth0.openai.com/u/login/identifier',
+    'https://accounts.google.com/signin/v2/identifier',
+    'https://login.live.com/login.srf',
+]
+
+
+def pattern_regex(pattern: str) -> re.Pattern:
+    '''
+    Compile a URL pattern the way Chrome matches blocked URLs\n
+    :param pattern: The URL pattern, `*` matching any characters
+    :return: The compiled regular expression, to be used with `fullmatch`
+    '''
+    return re.compile('.*'.join(re.escape(i) for i in pattern.split('*')))
+
+
+class BlockingProfile:
+    '''
+    Which requests the browser blocks, so page loads and reloads skip the
+    images, fonts, analytics and telemetry the wrapper never reads
+    '''
+
+    def __init__(
+        self, presets: list = safe_presets, patterns: list = [], allow: list = []
+    ):
+        '''
+        Initialize the BlockingProfile object\n
+        :param presets: Names of the presets to block (`images`, `media`, `fonts`, `analytics`, `telemetry`)
+        :param patterns: More URL patterns to block, `*` matching any characters
+        :param allow: Patterns of the presets not to block
+        '''
+        for name in presets:
+            if name not in preset_patterns:
+                raise ValueError(f'Invalid blocking preset: {name}')
+        self.patterns = []
+        selected = [j for i in presets for j in preset_patterns[i]]
+        for pattern in selected + list(patterns):
+            if pattern not in allow and pattern not in self.patterns:
+                self.patterns.append(pattern)
+
+    def check(self, base_url: str) -> None:
+        '''
+        Make sure no pattern blocks a request the session cannot work without\n
+        :param base_url: The URL of the ChatGPT site
+        '''
+        required = [base_url.rstrip('/') + i for i in _required_paths] + _required_urls
+        for pattern in self.patterns:
+            regex = pattern_regex(pattern)
+            for url in required:
+                if regex.fullmatch(url):
+                    raise ValueError(f'Blocked URL pattern {pattern} would block {url}')
@@ -0,0 +1,235 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock, local
+import hashlib
+import logging
+import sqlite3
+import json
+import time
+import re
+
+
+def normalize_prompt(message: str) -> str:
+    '''
+    Normalize a prompt so trivially different copies share a cache entry\n
+    :param message: The prompt
+    :return: The prompt with surrounding whitespace stripped and inner whitespace collapsed
+    '''
+    return re.sub(r'\s+', ' ', message.strip())
+
+
+def cache_key(message: str, conversation_id: str = '', turn: int = 0) -> str:
+    '''
+    Build the cache key of a prompt sent in a conversation\n
+    :param message: The prompt
+    :param conversation_id: The conversation the prompt is sent into, or an empty string for a new one
+    :param turn: The number of messages already sent in the conversation
+    :return: The cache key
+    '''
+    payload = json.dumps([normalize_prompt(message), conversation_id or '', turn])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _MemoryStore:
+    '''
+    An LRU of cached responses
+    '''
+
+    def __init__(self, max_size: int):
+        self.__max_size = max_size
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, key: str):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if not entry:
+                return None
+            if entry[0] < time.time():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: dict, expires: float) -> None:
+        with self.__lock:
+            self.__entries[key] = (expires, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+class _SqliteStore:
+    '''
+    Cached responses in a SQLite database, shared by every process using it
+    '''
+
+    def __init__(self, path: str, max_size: int):
+        self.__path = path
+        self.__max_size = max_size
+        self.__local = local()
+        with self.__connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS responses_used ON responses (used)'
+            )
+
+    def __connection(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared between threads
+        connection = getattr(self.__local, 'connection', None)
+        if not connection:
+            connection = sqlite3.connect(self.__path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.__local.connection = connection
+        return connection
+
+    def get(self, key: str):
+        now = time.time()
+        with self.__connection() as connection:
+            row = connection.execute(
+                'SELECT value FROM responses WHERE key = ? AND expires >= ?',
+                (key, now),
+            ).fetchone()
+            if not row:
+                return None
+            connection.execute(
+                'UPDATE responses SET used = ? WHERE key = ?', (now, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict, expires: float) -> None:
+        now = time.time()
+        with self.__connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), expires, now),
+            )
+            connection.execute('DELETE FROM responses WHERE expires < ?', (now,))
+            connection.execute(
+                'DELETE FROM responses WHERE key NOT IN '
+                '(SELECT key FROM responses ORDER BY used DESC LIMIT ?)',
+                (self.__max_size,),
+            )
+
+    def clear(self) -> None:
+        with self.__connection() as connection:
+            connection.execute('DELETE FROM responses')
+
+    def __len__(self) -> int:
+        row = self.__connection().execute('SELECT COUNT(*) FROM responses').fetchone()
+        return row[0]
+
+
+class ResponseCache:
+    '''
+    A cache of responses keyed on the prompt and its conversation, coalescing
+    identical requests that are in flight at the same time
+    '''
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, path: str = ''):
+        '''
+        Initialize the ResponseCache object\n
+        :param max_size: Maximum number of responses kept
+        :param ttl: Seconds a response stays cached
+        :param path: The path to a SQLite database shared across processes (in memory only if empty)
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        self.__ttl = ttl
+        self.__memory = _MemoryStore(max_size)
+        self.__disk = _SqliteStore(path, max_size) if path else None
+        self.__in_flight = {}
+        self.__lock = Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__coalesced = 0
+
+    def get(self, key: str):
+        '''
+        Get a cached response\n
+        :param key: The cache key (see `cache_key()`)
+        :return: The response, or None if it is not cached
+        '''
+        value = self.__memory.get(key)
+        if value is None and self.__disk is not None:
+            value = self.__disk.get(key)
+            if value is not None:
+                self.__memory.set(key, value, time.time() + self.__ttl)
+        return dict(value) if value is not None else None
+
+    def set(self, key: str, value: dict) -> None:
+        '''
+        Cache a response\n
+        :param key: The cache key (see `cache_key()`)
+        :param value: The response
+        '''
+        expires = time.time() + self.__ttl
+        self.__memory.set(key, dict(value), expires)
+        if self.__disk is not None:
+            self.__disk.set(key, value, expires)
+
+    def fetch(self, key: str, func):
+        '''
+        Get a cached response, or compute it once however many callers ask for it at the same time\n
+        :param key: The cache key (see `cache_key()`)
+        :param func: Function computing the response on a miss
+        :return: Tuple of the response and where it came from (`hit`, `coalesced` or `miss`)
+        '''
+        value = self.get(key)
+        if value is not None:
+            with self.__lock:
+                self.__hits += 1
+            return value, 'hit'
+
+        with self.__lock:
+            future = self.__in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.__in_flight[key] = Future()
+                self.__misses += 1
+            else:
+                self.__coalesced += 1
+        if not owner:
+            self.logger.debug('Waiting for identical request in flight...')
+            return dict(future.result()), 'coalesced'
+
+        try:
+            value = func()
+            self.set(key, value)
+            future.set_result(value)
+            return value, 'miss'
+        except BaseException as e:
+            future.set_exception(e)
+            raise e
+        finally:
+            with self.__lock:
+                del self.__in_flight[key]
+
+    def clear(self) -> None:
+        '''
+        Drop every cached response
+        '''
+        self.__memory.clear()
+        if self.__disk is not None:
+            self.__disk.clear()
+
+    def stats(self) -> dict:
+        '''
+        Get the cache counters\n
+        :return: Dictionary with keys `hits`, `misses`, `coalesced` and `size`
+        '''
+        return {
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'coalesced': self.__coalesced,
+            'size': len(self.__disk) if self.__disk is not None else len(self.__memory),
+        }
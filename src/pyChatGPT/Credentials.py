@@ -0,0 +1,309 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from threading import local
+import tempfile
+import hashlib
+import sqlite3
+import json
+import time
+import uuid
+import os
+
+try:
+    import fcntl
+except ModuleNotFoundError:
+    fcntl = None
+    import msvcrt
+
+session_token_cookie = '__Secure-next-auth.session-token'
+cf_clearance_cookie = 'cf_clearance'
+
+
+def is_fresh(credentials: dict, margin: float = 60) -> bool:
+    '''
+    Check if stored credentials can be used without revalidating them\n
+    :param credentials: The credentials (see `CredentialStore`)
+    :param margin: Seconds before the expiry they are considered stale
+    :return: Boolean indicating if the access token and the Cloudflare clearance are both unexpired
+    '''
+    deadline = time.time() + margin
+    if not credentials.get('access_token') or credentials.get('expires', 0) < deadline:
+        return False
+    cf_clearance_expires = credentials.get('cf_clearance_expires')
+    return cf_clearance_expires is None or cf_clearance_expires >= deadline
+
+
+def to_cdp_cookie(cookie: dict) -> dict:
+    '''
+    Convert a cookie returned by `driver.get_cookies()` to `Network.setCookie` parameters\n
+    :param cookie: The cookie
+    :return: The parameters
+    '''
+    params = {
+        i: cookie[i]
+        for i in ['name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite']
+        if i in cookie
+    }
+    if 'expiry' in cookie:
+        params['expires'] = cookie['expiry']
+    return params
+
+
+class CredentialStore(ABC):
+    '''
+    Where sessions keep their credentials, so workers on other processes or hosts
+    can reuse them instead of logging in again\n
+    Credentials are dicts with keys `cookies` (the full cookie jar),
+    `access_token`, `expires` (access token expiry), `cf_clearance_expires`,
+    `user_agent` (the Cloudflare clearance is bound to it) and `updated`.
+    Subclasses implement `get()`, `set()`, `delete()` and `lock()`
+    '''
+
+    @abstractmethod
+    def get(self, key: str) -> dict:
+        '''
+        Get stored credentials\n
+        :param key: The credential key (e.g. the account email)
+        :return: The credentials, or None if there are none
+        '''
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, credentials: dict) -> None:
+        '''
+        Store credentials\n
+        :param key: The credential key
+        :param credentials: The credentials
+        '''
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        '''
+        Drop stored credentials\n
+        :param key: The credential key
+        '''
+        raise NotImplementedError
+
+    @abstractmethod
+    def lock(self, key: str, timeout: float = 600):
+        '''
+        Hold the refresh lock of a key, shared by every worker using the store\n
+        :param key: The credential key
+        :param timeout: Seconds to wait for the lock, and the longest it may be held
+        :return: A context manager holding the lock, raising ValueError if it times out
+        '''
+        raise NotImplementedError
+
+    def refresh(self, key: str, func, stale: dict = None, timeout: float = 600):
+        '''
+        Refresh credentials once however many workers find them stale at the same
+        time, the others waiting for the refresh and reusing its result\n
+        :param key: The credential key
+        :param func: Function logging in and returning the new credentials
+        :param stale: The credentials found stale, None if there were none
+        :param timeout: Seconds to wait for another worker's refresh
+        :return: Tuple of the credentials and whether this worker refreshed them
+        '''
+        with self.lock(key, timeout):
+            current = self.get(key)
+            if current and (
+                not stale or current.get('updated') != stale.get('updated')
+            ):
+                return current, False
+            credentials = dict(func(), updated=time.time())
+            self.set(key, credentials)
+            return credentials, True
+
+
+@contextmanager
+def _file_lock(path: str, timeout: float):
+    '''
+    Hold an exclusive lock on a file, released when the process exits\n
+    :param path: The path to the lock file
+    :param timeout: Seconds to wait for the lock
+    '''
+    deadline = time.time() + timeout
+    with open(path, 'a+') as f:
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.time() >= deadline:
+                    raise ValueError(f'Timed out waiting for lock: {path}')
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileCredentialStore(CredentialStore):
+    '''
+    Credentials in a JSON file, replaced atomically and guarded by lock files
+    '''
+
+    def __init__(self, path: str):
+        '''
+        Initialize the FileCredentialStore object\n
+        :param path: The path to the JSON file, lock files are created next to it
+        '''
+        self.__path = path
+
+    def __read(self) -> dict:
+        try:
+            with open(self.__path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def __write(self, credentials: dict) -> None:
+        # Readers never see a partial file
+        fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.__path)))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(credentials, f)
+        os.replace(path, self.__path)
+
+    def get(self, key: str) -> dict:
+        return self.__read().get(key)
+
+    def set(self, key: str, credentials: dict) -> None:
+        with _file_lock(f'{self.__path}.lock', 30):
+            stored = self.__read()
+            stored[key] = credentials
+            self.__write(stored)
+
+    def delete(self, key: str) -> None:
+        with _file_lock(f'{self.__path}.lock', 30):
+            stored = self.__read()
+            if stored.pop(key, None) is not None:
+                self.__write(stored)
+
+    def lock(self, key: str, timeout: float = 600):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return _file_lock(f'{self.__path}.{digest}.lock', timeout)
+
+
+class SqliteCredentialStore(CredentialStore):
+    '''
+    Credentials in a SQLite database, with refresh locks leased in the database
+    so a crashed worker cannot hold one forever
+    '''
+
+    def __init__(self, path: str):
+        '''
+        Initialize the SqliteCredentialStore object\n
+        :param path: The path to the SQLite database
+        '''
+        self.__path = path
+        self.__local = local()
+        with self.__connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS credentials '
+                '(key TEXT PRIMARY KEY, value TEXT, updated REAL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS locks '
+                '(key TEXT PRIMARY KEY, owner TEXT, expires REAL)'
+            )
+
+    def __connection(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared between threads
+        connection = getattr(self.__local, 'connection', None)
+        if not connection:
+            connection = sqlite3.connect(self.__path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.__local.connection = connection
+        return connection
+
+    def get(self, key: str) -> dict:
+        row = (
+            self.__connection()
+            .execute('SELECT value FROM credentials WHERE key = ?', (key,))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, credentials: dict) -> None:
+        with self.__connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO credentials VALUES (?, ?, ?)',
+                (key, json.dumps(credentials), time.time()),
+            )
+
+    def delete(self, key: str) -> None:
+        with self.__connection() as connection:
+            connection.execute('DELETE FROM credentials WHERE key = ?', (key,))
+
+    @contextmanager
+    def lock(self, key: str, timeout: float = 600):
+        owner = uuid.uuid4().hex
+        deadline = time.time() + timeout
+        while True:
+            with self.__connection() as connection:
+                now = time.time()
+                connection.execute(
+                    'DELETE FROM locks WHERE key = ? AND expires < ?', (key, now)
+                )
+                acquired = connection.execute(
+                    'INSERT OR IGNORE INTO locks VALUES (?, ?, ?)',
+                    (key, owner, now + timeout),
+                ).rowcount
+            if acquired:
+                break
+            if time.time() >= deadline:
+                raise ValueError(f'Timed out waiting for credential refresh: {key}')
+            time.sleep(0.1)
+        try:
+            yield
+        finally:
+            with self.__connection() as connection:
+                connection.execute(
+                    'DELETE FROM locks WHERE key = ? AND owner = ?', (key, owner)
+                )
+
+
+class RedisCredentialStore(CredentialStore):
+    '''
+    Credentials in Redis, shared across hosts
+    '''
+
+    def __init__(self, client, prefix: str = 'pyChatGPT:credentials:'):
+        '''
+        Initialize the RedisCredentialStore object\n
+        :param client: A client with redis-py's `get`, `set`, `delete` and `lock` (e.g. `redis.Redis`, `fakeredis.FakeRedis`)
+        :param prefix: The prefix of every key
+        '''
+        self.__client = client
+        self.__prefix = prefix
+
+    def get(self, key: str) -> dict:
+        value = self.__client.get(self.__prefix + key)
+        return json.loads(value) if value else None
+
+    def set(self, key: str, credentials: dict) -> None:
+        self.__client.set(self.__prefix + key, json.dumps(credentials))
+
+    def delete(self, key: str) -> None:
+        self.__client.delete(self.__prefix + key)
+
+    @contextmanager
+    def lock(self, key: str, timeout: float = 600):
+        lock = self.__client.lock(
+            f'{self.__prefix}{key}:lock', timeout=timeout, blocking_timeout=timeout
+        )
+        if not lock.acquire():
+            raise ValueError(f'Timed out waiting for credential refresh: {key}')
+        try:
+            yield
+        finally:
+            lock.release()
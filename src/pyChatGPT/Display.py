@@ -0,0 +1,61 @@
+from threading import Lock
+import logging
+
+logger = logging.getLogger('pyChatGPT')
+
+_lock = Lock()
+_display = None
+_users = 0
+
+
+def acquire():
+    '''
+    Get the virtual display shared by every session, starting it if needed\n
+    :return: The shared `pyvirtualdisplay.Display`
+    '''
+    global _display, _users
+    with _lock:
+        if not _display:
+            logger.debug('Starting virtual display...')
+            try:
+                from pyvirtualdisplay import Display
+
+                display = Display()
+            except ModuleNotFoundError:
+                raise ValueError(
+                    'Please install PyVirtualDisplay to start a virtual display by running `pip install PyVirtualDisplay`'
+                )
+            except FileNotFoundError as e:
+                if 'No such file or directory: \'Xvfb\'' in str(e):
+                    raise ValueError(
+                        'Please install Xvfb to start a virtual display by running `sudo apt install xvfb`'
+                    )
+                raise e
+            display.start()
+            _display = display
+        _users += 1
+        return _display
+
+
+def release() -> None:
+    '''
+    Stop using the shared virtual display, stopping it once no session uses it
+    '''
+    global _display, _users
+    with _lock:
+        if not _display:
+            return
+        _users -= 1
+        if _users <= 0:
+            logger.debug('Closing display...')
+            _display.stop()
+            _display = None
+            _users = 0
+
+
+def is_active() -> bool:
+    '''
+    Check if the shared virtual display is running\n
+    :return: Boolean indicating if the display is running
+    '''
+    return _display is not None
@@ -0,0 +1,242 @@
+from urllib.parse import urlsplit
+from threading import Lock
+import http.client
+import logging
+import queue
+import uuid
+import json
+
+from .pyChatGPT import parse_conversation_event
+from .Scheduler import http_error, response_error
+
+default_model = 'text-davinci-002-render-sha'
+
+
+def build_conversation_request(
+    message: str,
+    conversation_id: str = None,
+    parent_message_id: str = None,
+    model: str = default_model,
+) -> dict:
+    '''
+    Build the body of a `/backend-api/conversation` request\n
+    :param message: Message to send
+    :param conversation_id: The conversation to continue, or None to start a new one
+    :param parent_message_id: The message to reply to
+    :param model: The model to use
+    :return: The request body
+    '''
+    body = {
+        'action': 'next',
+        'messages': [
+            {
+                'id': str(uuid.uuid4()),
+                'role': 'user',
+                'content': {'content_type': 'text', 'parts': [message]},
+            }
+        ],
+        'parent_message_id': parent_message_id or str(uuid.uuid4()),
+        'model': model,
+    }
+    if conversation_id:
+        body['conversation_id'] = conversation_id
+    return body
+
+
+class HttpTransport:
+    '''
+    Send conversation requests over pooled keep-alive HTTP connections
+    '''
+
+    def __init__(
+        self,
+        base_url: str = 'https://chat.openai.com',
+        model: str = default_model,
+        pool_size: int = 4,
+        timeout: int = 120,
+    ):
+        '''
+        Initialize the HttpTransport object\n
+        :param base_url: The URL of the ChatGPT site to send requests to
+        :param model: The model to use for new messages
+        :param pool_size: Maximum number of idle connections to keep open
+        :param timeout: Seconds to wait for the server before giving up
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        url = urlsplit(base_url)
+        if url.scheme not in ['http', 'https']:
+            raise ValueError('Invalid base URL')
+        self.__connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        self.__host = url.netloc
+        self.__base_path = url.path.rstrip('/')
+        self.__model = model
+        self.__timeout = timeout
+        self.__pool = queue.LifoQueue(maxsize=pool_size)
+        self.__lock = Lock()
+        self.__headers = {}
+
+    def set_credentials(
+        self, access_token: str, cookies: list = [], user_agent: str = ''
+    ) -> None:
+        '''
+        Set the credentials obtained by the browser\n
+        :param access_token: The access token from `/api/auth/session`
+        :param cookies: The browser cookies (as returned by `driver.get_cookies()`)
+        :param user_agent: The user agent of the browser the cookies belong to
+        '''
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json',
+        }
+        if cookies:
+            headers['Cookie'] = '; '.join(f'{i["name"]}={i["value"]}' for i in cookies)
+        if user_agent:
+            headers['User-Agent'] = user_agent
+        with self.__lock:
+            self.__headers = headers
+
+    @property
+    def headers(self) -> dict:
+        '''
+        The headers carrying the credentials sent with every request
+        '''
+        with self.__lock:
+            return dict(self.__headers)
+
+    def __acquire(self) -> tuple:
+        '''
+        Get an idle connection from the pool, opening one if there is none\n
+        :return: Tuple of the connection and whether it was reused from the pool
+        '''
+        try:
+            return self.__pool.get_nowait(), True
+        except queue.Empty:
+            self.logger.debug(f'Opening connection to {self.__host}...')
+            return self.__connection_class(self.__host, timeout=self.__timeout), False
+
+    def __release(self, connection: http.client.HTTPConnection) -> None:
+        '''
+        Return a connection to the pool, closing it if the pool is full\n
+        :param connection: The connection
+        '''
+        try:
+            self.__pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def __request(self, method: str, path: str, body: dict = None, accept: str = ''):
+        '''
+        Send a request on a pooled connection\n
+        :param method: The HTTP method
+        :param path: The path relative to the base URL
+        :param body: The JSON body to send
+        :param accept: The `Accept` header to send
+        :return: Tuple of the connection and the response
+        '''
+        headers = self.headers
+        if accept:
+            headers['Accept'] = accept
+        payload = json.dumps(body) if body is not None else None
+
+        connection, reused = self.__acquire()
+        try:
+            try:
+                connection.request(method, self.__base_path + path, payload, headers)
+                response = connection.getresponse()
+            except (
+                http.client.RemoteDisconnected,
+                BrokenPipeError,
+                ConnectionResetError,
+            ) as e:
+                # Only an idle keep-alive connection the server closed before
+                # answering is safe to retry: anything else, a timeout above
+                # all, may have reached the server and would send twice
+                if not reused:
+                    raise
+                self.logger.debug(f'Pooled connection was closed: {str(e)}')
+                connection.close()
+                connection.request(method, self.__base_path + path, payload, headers)
+                response = connection.getresponse()
+        except BaseException:
+            connection.close()
+            raise
+
+        if response.status != 200:
+            detail = response.read().decode('utf-8', 'replace')
+            self.__release(connection)
+            try:
+                detail = json.loads(detail)['detail']
+            except (json.decoder.JSONDecodeError, KeyError, TypeError):
+                pass
+            raise http_error(response.status, detail, response.getheader('Retry-After'))
+        return connection, response
+
+    def get_conversation(self, conversation_id: str) -> dict:
+        '''
+        Get a conversation\n
+        :param conversation_id: The conversation ID
+        :return: The conversation, including its `current_node`
+        '''
+        connection, response = self.__request(
+            'GET', f'/backend-api/conversation/{conversation_id}'
+        )
+        try:
+            return json.loads(response.read())
+        finally:
+            self.__release(connection)
+
+    def stream_conversation(
+        self, message: str, conversation_id: str = None, parent_message_id: str = None
+    ):
+        '''
+        Send a message and yield the response as it streams\n
+        :param message: Message to send
+        :param conversation_id: The conversation to continue, or None to start a new one
+        :param parent_message_id: The message to reply to
+        :return: Generator yielding the new text of the response, returning the final response
+        '''
+        body = build_conversation_request(
+            message, conversation_id, parent_message_id, self.__model
+        )
+        self.logger.debug('Sending message over HTTP...')
+        connection, response = self.__request(
+            'POST', '/backend-api/conversation', body, 'text/event-stream'
+        )
+        event = None
+        content = ''
+        try:
+            for line in response:
+                data = parse_conversation_event(line.decode('utf-8'))
+                if not data:
+                    continue
+                if data.get('error'):
+                    raise response_error(data['error'])
+                event = data
+                text = data['message']['content']['parts'][0]
+                if text.startswith(content) and len(text) > len(content):
+                    yield text[len(content) :]
+                content = text
+        except BaseException:
+            # Dropping the connection is the only way to abort the stream
+            connection.close()
+            raise
+        self.__release(connection)
+
+        if not event:
+            raise ValueError('Empty conversation response')
+        return {
+            'message': content,
+            'conversation_id': event['conversation_id'],
+            'message_id': event['message']['id'],
+        }
+
+    def close(self) -> None:
+        '''
+        Close every pooled connection
+        '''
+        while not self.__pool.empty():
+            self.__pool.get_nowait().close()
@@ -0,0 +1,120 @@
+from threading import Condition, Thread
+import itertools
+import logging
+import weakref
+import heapq
+import time
+
+# Spacing sessions by the golden ratio keeps them evenly spread for any count
+_golden_ratio = 0.6180339887
+
+
+class KeepAliveScheduler:
+    '''
+    Schedule the keep-alive of every session from a single thread, staggering
+    them, and run each call on its own thread so a hung session delays no other
+    '''
+
+    def __init__(self):
+        '''
+        Initialize the KeepAliveScheduler object
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        self.__condition = Condition()
+        self.__queue = []
+        self.__tasks = {}
+        self.__last_success = {}
+        self.__running = set()
+        self.__registered = 0
+        self.__sequence = itertools.count()
+        self.__thread = None
+
+    def register(self, key, callback, interval: float = 60) -> None:
+        '''
+        Run a callback periodically until it is unregistered\n
+        :param key: The key identifying the session
+        :param callback: Bound method to call, held weakly so the session can be collected, returning False when it skipped its turn
+        :param interval: Seconds between calls
+        '''
+        with self.__condition:
+            offset = (self.__registered * _golden_ratio) % 1 * interval
+            self.__registered += 1
+            task = (weakref.WeakMethod(callback), interval)
+            self.__tasks[key] = task
+            self.__schedule(time.time() + offset, key, task)
+            if not self.__thread:
+                self.__thread = Thread(target=self.__run, daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+
+    def unregister(self, key) -> None:
+        '''
+        Stop calling the callback of a session\n
+        :param key: The key identifying the session
+        '''
+        with self.__condition:
+            self.__tasks.pop(key, None)
+            self.__last_success.pop(key, None)
+            self.__running.discard(key)
+
+    def __schedule(self, due: float, key, task: tuple) -> None:
+        '''
+        Queue the next call of a task, must be called with the condition held\n
+        :param due: The timestamp to call the task at
+        :param key: The key identifying the session
+        :param task: The task, compared on pop to drop calls of replaced tasks
+        '''
+        heapq.heappush(self.__queue, (due, next(self.__sequence), key, task))
+
+    def last_success(self, key) -> float:
+        '''
+        Get when the callback of a session last succeeded\n
+        :param key: The key identifying the session
+        :return: The timestamp of the last success, or None if it never succeeded
+        '''
+        return self.__last_success.get(key)
+
+    def __call(self, key, callback) -> None:
+        '''
+        Call a callback, recording when it succeeded\n
+        :param key: The key identifying the session
+        :param callback: The callback to call
+        '''
+        try:
+            if callback() is not False:
+                self.__last_success[key] = time.time()
+        except Exception as e:
+            self.logger.debug(f'Keep-alive failed: {str(e)}')
+        finally:
+            with self.__condition:
+                self.__running.discard(key)
+
+    def __run(self) -> None:
+        '''
+        Start the callbacks as they come due
+        '''
+        while True:
+            with self.__condition:
+                while not self.__queue or self.__queue[0][0] > time.time():
+                    timeout = self.__queue[0][0] - time.time() if self.__queue else None
+                    self.__condition.wait(timeout)
+                _, _, key, task = heapq.heappop(self.__queue)
+                if self.__tasks.get(key) is not task:
+                    continue
+
+                callback, interval = task
+                callback = callback()
+                if not callback:
+                    self.__tasks.pop(key, None)
+                    self.__last_success.pop(key, None)
+                    continue
+                self.__schedule(time.time() + interval, key, task)
+                # A session whose last call still hangs skips its turn
+                if key in self.__running:
+                    self.logger.debug('Keep-alive still running, skipping')
+                    continue
+                self.__running.add(key)
+            Thread(target=self.__call, args=(key, callback), daemon=True).start()
+
+
+scheduler = KeepAliveScheduler()
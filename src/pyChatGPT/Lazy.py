@@ -0,0 +1,24 @@
+import importlib
+
+
+class LazyModule:
+    '''
+    A module imported on first attribute access, so `import pyChatGPT` does not
+    pay for selenium, undetected_chromedriver or markdownify until they are used
+    '''
+
+    def __init__(self, name: str):
+        '''
+        Initialize the LazyModule object\n
+        :param name: The absolute name of the module
+        '''
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr: str):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return getattr(self.__module, attr)
+
+    def __repr__(self) -> str:
+        return f'<lazy module {self.__name!r}>'
@@ -0,0 +1,96 @@
+import logging
+import os
+
+
+def convert_block(html: str) -> str:
+    '''
+    Convert a block of a response to markdown\n
+    :param html: The HTML of the block (a top-level element of the response)
+    :return: The markdown, without the blank lines around it
+    '''
+    from markdownify import markdownify
+
+    # Older markdownify versions pad every block with newlines, newer ones strip them
+    return markdownify(html).replace('Copy code`', '`').strip()
+
+
+def convert_blocks(blocks: list) -> str:
+    '''
+    Convert a whole response to markdown\n
+    :param blocks: The HTML of every block of the response
+    :return: The markdown
+    '''
+    converter = IncrementalMarkdown()
+    converter.update(blocks, done=True)
+    return converter.text
+
+
+class IncrementalMarkdown:
+    '''
+    Convert a streaming response to markdown block by block, only reconverting
+    the trailing block while it is still being written
+    '''
+
+    def __init__(self):
+        '''
+        Initialize the IncrementalMarkdown object
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        self.__blocks = []
+        self.__trailing = ''
+        self.__emitted = ''
+
+    @property
+    def finalized(self) -> int:
+        '''
+        The number of blocks converted for good, later updates start after them
+        '''
+        return len(self.__blocks)
+
+    @property
+    def text(self) -> str:
+        '''
+        The markdown of the finalized blocks
+        '''
+        return ''.join(self.__blocks)
+
+    def __convert(self, html: str) -> str:
+        '''
+        Convert the next block, separated from the blocks before it by a blank line\n
+        :param html: The HTML of the block
+        :return: The markdown, including the separator
+        '''
+        markdown = convert_block(html)
+        if markdown and any(self.__blocks):
+            return '\n\n' + markdown
+        return markdown
+
+    def update(self, blocks: list, done: bool = False) -> str:
+        '''
+        Convert the blocks that changed since the last update\n
+        :param blocks: The HTML of the blocks, starting from the first block not finalized
+        :param done: Whether the response has finished, finalizing the trailing block
+        :return: The new markdown, concatenating to the final markdown across updates
+        '''
+        delta = ''
+        for html in blocks if done else blocks[:-1]:
+            markdown = self.__convert(html)
+            if markdown.startswith(self.__emitted):
+                delta += markdown[len(self.__emitted) :]
+            else:
+                self.logger.debug('Streamed block was re-rendered, deltas diverged')
+                common = os.path.commonprefix([markdown, self.__emitted])
+                delta += markdown[len(common) :]
+            self.__blocks.append(markdown)
+            self.__trailing = self.__emitted = ''
+
+        if blocks and not done:
+            # Only emit what two renders agree on, the end of a block being written
+            # moves (closing code fences, emphasis markers, partial words)
+            markdown = self.__convert(blocks[-1])
+            stable = os.path.commonprefix([self.__trailing, markdown])
+            if len(stable) > len(self.__emitted) and stable.startswith(self.__emitted):
+                delta += stable[len(self.__emitted) :]
+                self.__emitted = stable
+            self.__trailing = markdown
+        return delta
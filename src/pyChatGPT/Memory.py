@@ -0,0 +1,83 @@
+import os
+
+
+class MemoryPolicy:
+    '''
+    How a long-running session bounds its memory: reloading the conversation
+    once it has grown by too many responses, dropping what the page accumulated
+    while streaming them, and restarting the browser once it is too old or too
+    big. A reload renders the whole conversation again, only `trim` or starting
+    a new conversation bounds the responses kept in the page
+    '''
+
+    def __init__(
+        self,
+        max_responses: int = 20,
+        max_messages: int = None,
+        max_rss: int = None,
+        check_interval: int = 10,
+        trim: bool = False,
+    ):
+        '''
+        Initialize the MemoryPolicy object\n
+        :param max_responses: Number of responses added since the page was last loaded above which the conversation is reloaded (None to never reload)
+        :param max_messages: Number of messages after which the browser is restarted (None to never restart)
+        :param max_rss: Resident memory in bytes of the browser above which it is restarted (None for no limit)
+        :param check_interval: Number of messages between two memory checks
+        :param trim: Whether to empty all but the last `max_responses` responses in place instead of reloading, faster but React still owns the emptied nodes, so the page may break if it re-renders them
+        '''
+        if (
+            (max_responses is not None and max_responses < 1)
+            or (max_messages is not None and max_messages < 1)
+            or check_interval < 1
+        ):
+            raise ValueError('Invalid memory policy')
+        self.max_responses = max_responses
+        self.max_messages = max_messages
+        self.max_rss = max_rss
+        self.check_interval = check_interval
+        self.trim = trim
+
+
+def process_tree_rss(pid: int) -> int:
+    '''
+    Get the resident memory of a process and all of its descendants\n
+    :param pid: The process ID
+    :return: The resident memory in bytes
+    '''
+    try:
+        import psutil
+
+        process = psutil.Process(pid)
+        return sum(
+            i.memory_info().rss for i in [process] + process.children(recursive=True)
+        )
+    except ModuleNotFoundError:
+        pass
+
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree = {pid}
+    while True:
+        children = {i for i, ppid in parents.items() if ppid in tree} - tree
+        if not children:
+            break
+        tree |= children
+
+    rss = 0
+    for i in tree:
+        try:
+            with open(f'/proc/{i}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return rss
@@ -0,0 +1,177 @@
+from contextlib import contextmanager
+from collections import deque
+from threading import Lock
+import logging
+import time
+
+
+class Histogram:
+    '''
+    A histogram of the most recent observations of a value
+    '''
+
+    def __init__(self, max_samples: int = 1000):
+        '''
+        Initialize the Histogram object\n
+        :param max_samples: Number of recent observations kept for percentiles
+        '''
+        self.__samples = deque(maxlen=max_samples)
+        self.__lock = Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        '''
+        Record an observation\n
+        :param value: The observed value
+        '''
+        with self.__lock:
+            self.__samples.append(value)
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, percent: float) -> float:
+        '''
+        Get a percentile of the recent observations\n
+        :param percent: The percentile to get (0-100)
+        :return: The percentile, or 0 if nothing was observed
+        '''
+        with self.__lock:
+            samples = sorted(self.__samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def summary(self) -> dict:
+        '''
+        Get a summary of the observations\n
+        :return: Dictionary with keys `count`, `sum`, `p50`, `p95` and `p99`
+        '''
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class Metrics:
+    '''
+    Collect timing spans into histograms and forward them to hooks
+    '''
+
+    def __init__(self, max_samples: int = 1000):
+        '''
+        Initialize the Metrics object, disabled until `enable()` or `add_hook()` is called\n
+        :param max_samples: Number of recent observations kept per histogram
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        self.enabled = False
+        self.__max_samples = max_samples
+        self.__histograms = {}
+        self.__hooks = []
+        self.__lock = Lock()
+
+    def enable(self) -> None:
+        '''
+        Start recording observations
+        '''
+        self.enabled = True
+
+    def disable(self) -> None:
+        '''
+        Stop recording observations
+        '''
+        self.enabled = False
+
+    def add_hook(self, hook) -> None:
+        '''
+        Forward every observation to a hook, enabling recording\n
+        :param hook: Callable taking the name, the value, and a dict of attributes (e.g. a Prometheus or OpenTelemetry exporter)
+        '''
+        self.__hooks.append(hook)
+        self.enabled = True
+
+    def remove_hook(self, hook) -> None:
+        '''
+        Stop forwarding observations to a hook\n
+        :param hook: The hook passed to `add_hook()`
+        '''
+        self.__hooks.remove(hook)
+
+    def observe(self, name: str, value: float, **attributes) -> None:
+        '''
+        Record an observation\n
+        :param name: The name of the histogram
+        :param value: The observed value
+        :param attributes: Attributes passed to the hooks
+        '''
+        if not self.enabled:
+            return
+        histogram = self.__histograms.get(name)
+        if not histogram:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(
+                    name, Histogram(self.__max_samples)
+                )
+        histogram.observe(value)
+        for hook in self.__hooks:
+            try:
+                hook(name, value, attributes)
+            except Exception as e:
+                self.logger.debug(f'Metrics hook failed: {str(e)}')
+
+    @contextmanager
+    def __span(self, name: str, attributes: dict):
+        '''
+        Time a block of code\n
+        :param name: The name of the histogram
+        :param attributes: Attributes passed to the hooks
+        '''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **attributes)
+
+    def span(self, name: str, **attributes):
+        '''
+        Time a block of code, doing nothing while disabled\n
+        :param name: The name of the histogram
+        :param attributes: Attributes passed to the hooks
+        :return: Context manager timing the block
+        '''
+        if not self.enabled:
+            return _disabled_span
+        return self.__span(name, attributes)
+
+    def histograms(self) -> dict:
+        '''
+        Get a summary of every histogram\n
+        :return: Dictionary mapping names to their `count`, `sum`, `p50`, `p95` and `p99`
+        '''
+        with self.__lock:
+            histograms = dict(self.__histograms)
+        return {name: histogram.summary() for name, histogram in histograms.items()}
+
+    def reset(self) -> None:
+        '''
+        Drop every recorded observation
+        '''
+        with self.__lock:
+            self.__histograms = {}
+
+
+class _DisabledSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_disabled_span = _DisabledSpan()
+
+metrics = Metrics()
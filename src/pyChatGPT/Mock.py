@@ -0,0 +1,423 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta, timezone
+from threading import Thread
+from html import escape
+import random
+import uuid
+import json
+import time
+
+# The chat page, with the DOM contract the browser transport relies on: a
+# textarea, a `result-streaming` response while generating, `markdown prose`
+# responses inside the `flex-1 overflow-hidden` thread, red errors, and the
+# New chat / Clear conversations links
+_chat_page = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>ChatGPT</title></head>
+<body>
+<nav>
+<a href="/chat" id="new-chat">New chat</a>
+<div class="flex flex-col gap-2 text-sm" id="chats">__CHATS__</div>
+<a href="#" id="clear">Clear conversations</a>
+</nav>
+<main>
+<div class="flex-1 overflow-hidden"><div id="thread"></div></div>
+<button id="stop" hidden>Stop generating</button>
+<textarea rows="1" placeholder="Send a message..."></textarea>
+</main>
+<script>
+const config = __CONFIG__;
+const thread = document.getElementById('thread');
+const textarea = document.querySelector('textarea');
+const stop = document.getElementById('stop');
+let controller = null;
+
+const escapeHtml = (text) => text.replace(/[&<>"]/g, (c) => (
+    { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;' }[c]
+));
+const render = (text) => text.split('```').map((part, i) => {
+    if (i % 2) return `<pre><code>${escapeHtml(part.replace(/^\\w*\\n/, ''))}</code></pre>`;
+    return part.split(/\\n\\n+/).filter((p) => p.trim())
+        .map((p) => `<p>${escapeHtml(p.trim())}</p>`).join('');
+}).join('');
+
+const append = (className, html) => {
+    const div = document.createElement('div');
+    div.className = className;
+    div.innerHTML = html;
+    thread.appendChild(div);
+    return div;
+};
+
+async function send(message) {
+    append('user', escapeHtml(message));
+    const response = append('markdown prose w-full break-words dark:prose-invert light result-streaming', '');
+    controller = new AbortController();
+    stop.hidden = false;
+    let event = null;
+    try {
+        const reply = await window.fetch('/backend-api/conversation', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${config.accessToken}`,
+            },
+            body: JSON.stringify({
+                action: 'next',
+                messages: [{
+                    id: crypto.randomUUID(),
+                    role: 'user',
+                    content: { content_type: 'text', parts: [message] },
+                }],
+                conversation_id: config.conversationId || undefined,
+                parent_message_id: config.parentMessageId || crypto.randomUUID(),
+            }),
+            signal: controller.signal,
+        });
+        if (!reply.ok) throw new Error((await reply.json()).detail);
+        const reader = reply.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (!line.startsWith('data: {')) continue;
+                event = JSON.parse(line.slice(6));
+                response.innerHTML = render(event.message.content.parts[0]);
+            }
+        }
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            response.remove();
+            append('mb-4 text-red-500', `<p>${escapeHtml(error.message)}</p>`);
+        }
+    }
+    response.classList.remove('result-streaming');
+    stop.hidden = true;
+    controller = null;
+    if (event) {
+        if (!config.conversationId) {
+            history.pushState({}, '', `/chat/${event.conversation_id}`);
+            const link = document.createElement('a');
+            link.href = `/chat/${event.conversation_id}`;
+            link.textContent = message.slice(0, 30);
+            document.getElementById('chats').prepend(link);
+        }
+        config.conversationId = event.conversation_id;
+        config.parentMessageId = event.message.id;
+    }
+}
+
+textarea.addEventListener('keydown', (e) => {
+    if (e.key !== 'Enter' || e.shiftKey) return;
+    e.preventDefault();
+    if (controller || !textarea.value.trim()) return;
+    const message = textarea.value;
+    textarea.value = '';
+    send(message);
+});
+stop.addEventListener('click', () => controller && controller.abort());
+
+document.getElementById('new-chat').addEventListener('click', (e) => {
+    e.preventDefault();
+    if (controller) controller.abort();
+    thread.innerHTML = '';
+    config.conversationId = config.parentMessageId = null;
+    history.pushState({}, '', '/chat');
+});
+
+const clear = document.getElementById('clear');
+clear.addEventListener('click', async (e) => {
+    e.preventDefault();
+    if (clear.textContent === 'Clear conversations') {
+        clear.textContent = 'Confirm clear conversations';
+        return;
+    }
+    await window.fetch('/backend-api/conversations', {
+        method: 'PATCH',
+        headers: { 'Authorization': `Bearer ${config.accessToken}` },
+    });
+    document.getElementById('chats').innerHTML = '';
+    clear.textContent = 'Clear conversations';
+});
+</script>
+</body>
+</html>
+'''
+
+_capacity_page = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>ChatGPT</title></head>
+<body><div>ChatGPT is at capacity right now</div></body>
+</html>
+'''
+
+# Stands in for the Cloudflare interstitial: the challenge form is replaced
+# with the session JSON once the challenge "passes"
+_challenge_page = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Just a moment...</title></head>
+<body>
+<form id="challenge-form"></form>
+<script>
+setTimeout(() => {
+    const pre = document.createElement('pre');
+    pre.textContent = __SESSION__;
+    document.body.innerHTML = '';
+    document.body.appendChild(pre);
+}, __DELAY__);
+</script>
+</body>
+</html>
+'''
+
+
+class MockServer:
+    '''
+    A local stand-in for the ChatGPT site, serving a chat page with the same DOM
+    and a backend speaking the same event stream format
+    '''
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        access_token: str = 'mock-access-token',
+        reply: str = 'Hello! How can I help you today?',
+        token_rate: float = 50,
+        capacity_rate: float = 0,
+        error_rate: float = 0,
+        challenge_delay: float = 0,
+    ):
+        '''
+        Initialize the MockServer object\n
+        :param host: The host to listen on
+        :param port: The port to listen on (0 to pick a free port)
+        :param access_token: The access token handed out and expected by the server
+        :param reply: The reply streamed back to every message
+        :param token_rate: Words streamed per second (0 to stream instantly)
+        :param capacity_rate: Probability of the chat page being at capacity
+        :param error_rate: Probability of a message failing with a rate limit error
+        :param challenge_delay: Seconds the Cloudflare challenge takes to pass (0 to skip it)
+        '''
+        self.access_token = access_token
+        self.reply = reply
+        self.token_rate = token_rate
+        self.capacity_rate = capacity_rate
+        self.error_rate = error_rate
+        self.challenge_delay = challenge_delay
+        self.conversations = {}
+        self.titles = {}
+        self.requests = 0
+        self.__server = _MockHTTPServer((host, port), _MockHandler)
+        self.__server.mock = self
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        '''
+        The base URL of the server
+        '''
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockServer':
+        '''
+        Start serving in a background thread\n
+        :return: The server itself
+        '''
+        self.__thread = Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        '''
+        Stop serving
+        '''
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def session(self) -> dict:
+        '''
+        Get the `/api/auth/session` response\n
+        :return: The session, expiring in a day
+        '''
+        expires = datetime.now(timezone.utc) + timedelta(days=1)
+        return {
+            'user': {'id': 'user-mock', 'name': 'Mock', 'email': 'mock@example.com'},
+            'expires': expires.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+            'accessToken': self.access_token,
+        }
+
+    def chunks(self, message: str) -> list:
+        '''
+        Split the reply to a message into the words it is streamed in\n
+        :param message: The message being replied to
+        :return: List of words, including their trailing whitespace
+        '''
+        words = self.reply.split(' ')
+        return [i + ' ' for i in words[:-1]] + words[-1:]
+
+    def chat_page(self, conversation_id: str = '') -> str:
+        '''
+        Render the chat page\n
+        :param conversation_id: The conversation to continue, or an empty string to start a new one
+        :return: The HTML of the page
+        '''
+        if random.random() < self.capacity_rate:
+            return _capacity_page
+        if conversation_id not in self.conversations:
+            conversation_id = ''
+        config = {
+            'accessToken': self.access_token,
+            'conversationId': conversation_id or None,
+            'parentMessageId': self.conversations.get(conversation_id),
+        }
+        chats = ''.join(
+            f'<a href="/chat/{i}">{escape(title)}</a>'
+            for i, title in reversed(list(self.titles.items()))
+        )
+        return _chat_page.replace('__CONFIG__', json.dumps(config)).replace(
+            '__CHATS__', chats
+        )
+
+    def challenge_page(self) -> str:
+        '''
+        Render the Cloudflare challenge in front of `/api/auth/session`\n
+        :return: The HTML of the page
+        '''
+        return _challenge_page.replace(
+            '__SESSION__', json.dumps(json.dumps(self.session()))
+        ).replace('__DELAY__', str(int(self.challenge_delay * 1000)))
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many sessions connect at once, the default backlog of 5 drops their SYNs
+    request_queue_size = 128
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    @property
+    def mock(self) -> MockServer:
+        return self.server.mock
+
+    def __send_json(self, status: int, body: dict) -> None:
+        self.__send(status, json.dumps(body), 'application/json')
+
+    def __send(self, status: int, body: str, content_type: str) -> None:
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def __is_authorized(self) -> bool:
+        if self.headers.get('Authorization') == f'Bearer {self.mock.access_token}':
+            return True
+        self.__send_json(401, {'detail': 'Your session has expired'})
+        return False
+
+    def do_GET(self) -> None:
+        self.mock.requests += 1
+        path = self.path.split('?', 1)[0]
+        if path == '/api/auth/session':
+            if self.mock.challenge_delay:
+                return self.__send(403, self.mock.challenge_page(), 'text/html')
+            return self.__send_json(200, self.mock.session())
+        if path in ['/', '/chat'] or path.startswith('/chat/'):
+            conversation_id = path[len('/chat/') :] if path.startswith('/chat/') else ''
+            return self.__send(200, self.mock.chat_page(conversation_id), 'text/html')
+        if self.path.startswith('/backend-api/conversation/'):
+            if not self.__is_authorized():
+                return
+            conversation_id = self.path.rsplit('/', 1)[-1]
+            if conversation_id not in self.mock.conversations:
+                return self.__send_json(404, {'detail': 'Conversation not found'})
+            return self.__send_json(
+                200,
+                {
+                    'conversation_id': conversation_id,
+                    'current_node': self.mock.conversations[conversation_id],
+                },
+            )
+        self.__send_json(404, {'detail': 'Not found'})
+
+    def do_PATCH(self) -> None:
+        self.mock.requests += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/backend-api/conversations':
+            return self.__send_json(404, {'detail': 'Not found'})
+        if not self.__is_authorized():
+            return
+        self.mock.conversations.clear()
+        self.mock.titles.clear()
+        self.__send_json(200, {'success': True})
+
+    def do_POST(self) -> None:
+        self.mock.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        if self.path != '/backend-api/conversation':
+            return self.__send_json(404, {'detail': 'Not found'})
+        if not self.__is_authorized():
+            return
+        if random.random() < self.mock.error_rate:
+            return self.__send_json(
+                429, {'detail': 'Too many requests in 1 hour. Try again later.'}
+            )
+
+        message = body['messages'][0]['content']['parts'][0]
+        conversation_id = body.get('conversation_id') or str(uuid.uuid4())
+        message_id = str(uuid.uuid4())
+        self.mock.conversations[conversation_id] = message_id
+        self.mock.titles.setdefault(conversation_id, message[:30])
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        text = ''
+        try:
+            for chunk in self.mock.chunks(message):
+                text += chunk
+                self.__send_event(
+                    {
+                        'message': {
+                            'id': message_id,
+                            'role': 'assistant',
+                            'content': {'content_type': 'text', 'parts': [text]},
+                        },
+                        'conversation_id': conversation_id,
+                        'error': None,
+                    }
+                )
+                if self.mock.token_rate:
+                    time.sleep(1 / self.mock.token_rate)
+            self.__send_event('[DONE]')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client aborted the generation
+            self.close_connection = True
+
+    def __send_event(self, data) -> None:
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        payload = f'data: {data}\n\n'.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(payload), payload))
+        self.wfile.flush()
@@ -0,0 +1,437 @@
+from concurrent.futures import Future
+from collections import deque
+from threading import Lock, Thread, Timer
+import logging
+import queue
+import json
+import time
+import os
+
+from .pyChatGPT import ChatGPT, SeleniumExceptions
+from .Credentials import session_token_cookie
+from .Batch import Batch
+from .Scheduler import RetryBudget, SessionLimiter, backoff, classify_error
+
+
+def _read_session_token(path: str) -> str:
+    '''
+    Read the session token from a cookies file saved by `login_cookies_path`\n
+    :param path: The path to the cookies file
+    :return: The session token, or an empty string if none was found
+    '''
+    with open(path, 'r', encoding='utf-8') as f:
+        cookies = json.load(f)
+    for cookie in cookies:
+        if cookie['name'] == session_token_cookie:
+            return cookie['value']
+    return ''
+
+
+def _percentile(values: list, percent: float) -> float:
+    '''
+    Get the percentile of a list of values\n
+    :param values: The values to look at
+    :param percent: The percentile to get (0-100)
+    :return: The percentile, or 0 if there are no values
+    '''
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class ChatGPTPool:
+    '''
+    A pool of ChatGPT browser sessions serving `send_message` calls concurrently
+    '''
+
+    def __init__(
+        self,
+        sessions: list,
+        health_check_interval: int = 60,
+        max_latency_samples: int = 1000,
+        max_retries: int = 3,
+        retry_budget: float = 0.2,
+        **kwargs,
+    ):
+        '''
+        Initialize the ChatGPTPool object\n
+        :param sessions: The sessions to start, each being a session token, a path to a cookies file, or a dict of `ChatGPT` arguments
+        :param health_check_interval: Seconds an idle session waits before it is health checked
+        :param max_latency_samples: Number of recent calls kept for latency stats
+        :param max_retries: Number of times a message failing with a capacity, rate limit or network error is moved to another session or delayed
+        :param retry_budget: Retries earned per successful message once the initial retries are spent
+        :param kwargs: Arguments passed to every `ChatGPT` session (e.g. `proxy`, `moderation`, `verbose`)
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        if not sessions:
+            raise ValueError('Please provide at least one session')
+
+        self.__session_kwargs = [self.__parse_session(i, kwargs) for i in sessions]
+        self.__health_check_interval = health_check_interval
+        self.__max_retries = max_retries
+        self.__retry_budget = RetryBudget(retry_budget)
+        self.__sessions = [None] * len(self.__session_kwargs)
+        self.__limiters = [SessionLimiter() for _ in self.__session_kwargs]
+        self.__jobs = queue.Queue()
+        self.__lock = Lock()
+        # undetected_chromedriver patches a shared chromedriver binary on start
+        self.__create_lock = Lock()
+
+        self.__busy = 0
+        self.__completed = 0
+        self.__failed = 0
+        self.__replaced = 0
+        self.__retried = 0
+        self.__failure_kinds = {}
+        self.__wait_times = deque(maxlen=max_latency_samples)
+        self.__latencies = deque(maxlen=max_latency_samples)
+
+        errors = []
+        threads = [
+            Thread(target=self.__start_session, args=(i, errors), daemon=True)
+            for i in range(len(self.__sessions))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not any(self.__sessions):
+            raise ValueError(f'Failed to start any session: {errors}')
+
+        self.__is_active = True
+        self.__workers = [
+            Thread(target=self.__worker, args=(i,), daemon=True)
+            for i in range(len(self.__sessions))
+        ]
+        for worker in self.__workers:
+            worker.start()
+
+    def __parse_session(self, session, kwargs: dict) -> dict:
+        '''
+        Turn a session entry into `ChatGPT` arguments\n
+        :param session: A session token, a path to a cookies file, or a dict of `ChatGPT` arguments
+        :param kwargs: Arguments shared by every session
+        :return: The arguments to create the session with
+        '''
+        if isinstance(session, dict):
+            return {**kwargs, **session}
+        if os.path.isfile(session):
+            return {
+                **kwargs,
+                'session_token': _read_session_token(session),
+                'login_cookies_path': session,
+            }
+        return {**kwargs, 'session_token': session}
+
+    def __start_session(self, index: int, errors: list) -> None:
+        '''
+        Start a session, recording the error if it fails\n
+        :param index: Index of the session in the pool
+        :param errors: List to append the error to
+        '''
+        try:
+            self.__sessions[index] = self.__create_session(index)
+        except Exception as e:
+            self.logger.debug(f'Failed to start session {index}: {str(e)}')
+            errors.append(e)
+
+    def __create_session(self, index: int) -> ChatGPT:
+        '''
+        Create the browser session at an index\n
+        :param index: Index of the session in the pool
+        :return: The new session
+        '''
+        self.logger.debug(f'Starting session {index}...')
+        with self.__create_lock:
+            return ChatGPT(**self.__session_kwargs[index])
+
+    def __replace_session(self, index: int) -> ChatGPT:
+        '''
+        Close the session at an index and start a new one in its place\n
+        :param index: Index of the session in the pool
+        :return: The new session, or None if it failed to start
+        '''
+        self.logger.debug(f'Replacing session {index}...')
+        session = self.__sessions[index]
+        self.__sessions[index] = None
+        if session:
+            try:
+                session.__del__()
+            except Exception as e:
+                self.logger.debug(f'Failed to close session {index}: {str(e)}')
+        with self.__lock:
+            self.__replaced += 1
+        try:
+            self.__sessions[index] = self.__create_session(index)
+        except Exception as e:
+            self.logger.debug(f'Failed to start session {index}: {str(e)}')
+        return self.__sessions[index]
+
+    def __is_healthy(self, session: ChatGPT) -> bool:
+        '''
+        Check if the browser of a session still responds\n
+        :param session: The session to check
+        :return: Boolean indicating if the session is healthy
+        '''
+        return session.health()['live']
+
+    def __worker(self, index: int) -> None:
+        '''
+        Serve jobs from the queue with the session at an index\n
+        :param index: Index of the session in the pool
+        '''
+        limiter = self.__limiters[index]
+        while self.__is_active:
+            session = self.__sessions[index]
+            if not session:
+                session = self.__replace_session(index)
+                if not session:
+                    time.sleep(self.__health_check_interval)
+                    continue
+
+            delay = limiter.delay()
+            if delay:
+                # Leave the queue to the other sessions until this one may send again
+                time.sleep(min(delay, self.__health_check_interval))
+                continue
+
+            try:
+                job = self.__jobs.get(timeout=self.__health_check_interval)
+            except queue.Empty:
+                if not self.__is_healthy(session):
+                    self.logger.debug(f'Session {index} is unhealthy')
+                    self.__replace_session(index)
+                continue
+            if job is None:
+                break
+
+            message, reset, future, queued_at, attempts, on_delta = job
+            if not attempts and not future.set_running_or_notify_cancel():
+                continue
+            streamed = []
+
+            started_at = time.time()
+            with self.__lock:
+                self.__busy += 1
+                self.__wait_times.append(started_at - queued_at)
+            try:
+                try:
+                    if reset:
+                        session.reset_conversation()
+                    result = self.__send(session, message, on_delta, streamed)
+                except SeleniumExceptions.WebDriverException as e:
+                    self.logger.debug(f'Session {index} crashed: {str(e)}')
+                    session = self.__replace_session(index)
+                    if not session or streamed:
+                        raise e
+                    result = self.__send(session, message, on_delta, streamed)
+            except Exception as e:
+                # Part of the response already reached the caller, a retry would repeat it
+                if streamed or not self.__retry(index, job, e):
+                    with self.__lock:
+                        self.__failed += 1
+                    future.set_exception(e)
+            else:
+                limiter.record_send()
+                self.__retry_budget.record_success()
+                with self.__lock:
+                    self.__completed += 1
+                future.set_result(result)
+            finally:
+                with self.__lock:
+                    self.__busy -= 1
+                    self.__latencies.append(time.time() - started_at)
+
+    def __send(self, session: ChatGPT, message: str, on_delta, streamed: list) -> dict:
+        '''
+        Send a message with a session, streaming the response if there is a callback\n
+        :param session: The session to send with
+        :param message: Message to send
+        :param on_delta: Function called with the new text of the response as it streams, None to not stream
+        :param streamed: List a value is appended to once the callback was called
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        if not on_delta:
+            return session.send_message(message)
+        with session.stream_message(message) as stream:
+            for delta in stream:
+                streamed.append(True)
+                on_delta(delta)
+        return stream.result
+
+    def __retry(self, index: int, job: tuple, error: Exception) -> bool:
+        '''
+        Hold back the session a message failed on, and queue the message again if
+        the failure is transient and the retry budget allows it\n
+        :param index: Index of the session the message failed on
+        :param job: The failed job
+        :param error: The exception raised while sending
+        :return: Boolean indicating if the message was queued again
+        '''
+        message, reset, future, queued_at, attempts, on_delta = job
+        kind = classify_error(error)
+        held = self.__limiters[index].record_failure(kind, error)
+        with self.__lock:
+            self.__failure_kinds[kind] = self.__failure_kinds.get(kind, 0) + 1
+        self.logger.debug(
+            f'Session {index} failed with a {kind} error, held back for {held:.1f}s'
+        )
+        if (
+            kind not in ['capacity', 'rate_limit', 'network']
+            or attempts >= self.__max_retries
+            or not self.__is_active
+            or not self.__retry_budget.try_retry()
+        ):
+            return False
+
+        with self.__lock:
+            self.__retried += 1
+        job = (message, reset, future, queued_at, attempts + 1, on_delta)
+        if kind == 'rate_limit':
+            # Only this account is limited, another session can take it right away
+            self.__jobs.put(job)
+        else:
+            timer = Timer(backoff(attempts), self.__requeue, args=(job,))
+            timer.daemon = True
+            timer.start()
+        return True
+
+    def __requeue(self, job: tuple) -> None:
+        '''
+        Queue a delayed retry, failing it if the pool was closed meanwhile\n
+        :param job: The job to queue
+        '''
+        if self.__is_active:
+            self.__jobs.put(job)
+        else:
+            job[2].set_exception(ValueError('Pool is closed'))
+
+    def submit(
+        self, message: str, reset_conversation: bool = False, on_delta=None
+    ) -> Future:
+        '''
+        Queue a message for the next idle session\n
+        :param message: Message to send
+        :param reset_conversation: Whether the session should reset its conversation first
+        :param on_delta: Function called from the worker with the new text of the response as it streams, a failure after the first call is not retried
+        :return: Future resolving to the `send_message` result
+        '''
+        if not self.__is_active:
+            raise ValueError('Pool is closed')
+        future = Future()
+        self.__jobs.put((message, reset_conversation, future, time.time(), 0, on_delta))
+        return future
+
+    def open_conversation(self, conversation_id: str = '', index: int = None) -> tuple:
+        '''
+        Open a conversation in a new tab of a session, bypassing the queue\n
+        :param conversation_id: The ID of the conversation to open (a new conversation if empty)
+        :param index: Index of the session to open it in, a conversation only exists in the account that created it (the session with the fewest tabs if None)
+        :return: Tuple of the index of the session and the `Conversation`
+        '''
+        if not self.__is_active:
+            raise ValueError('Pool is closed')
+        if index is None:
+            alive = [i for i, session in enumerate(self.__sessions) if session]
+            if not alive:
+                raise ValueError('No session is alive')
+            index = min(alive, key=lambda i: self.__sessions[i].open_conversations)
+        session = self.__sessions[index]
+        if not session:
+            raise ValueError(f'Session {index} is not alive')
+        return index, session.open_conversation(conversation_id)
+
+    def send_message(self, message: str, timeout: float = None) -> dict:
+        '''
+        Send a message using the next idle session\n
+        :param message: Message to send
+        :param timeout: Seconds to wait for the response (including time spent queued)
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        return self.submit(message).result(timeout)
+
+    def send_batch(
+        self,
+        prompts,
+        concurrency: int = None,
+        new_conversation_per_prompt: bool = True,
+        ordered: bool = True,
+        checkpoint_path: str = '',
+    ) -> Batch:
+        '''
+        Send a batch of prompts across the sessions, failed prompts being retried
+        by the pool (see `max_retries` and `retry_budget`)\n
+        :param prompts: Iterable of prompts, each being a string or a dict with a `prompt` key
+        :param concurrency: Maximum number of prompts in flight (defaults to the number of sessions)
+        :param new_conversation_per_prompt: Whether to reset the conversation before each prompt
+        :param ordered: Whether to yield results in input order instead of as they complete
+        :param checkpoint_path: The path to a JSONL file recording finished prompts, skipped when resuming
+        :return: Batch yielding the result of each prompt
+        '''
+        return Batch(
+            self.submit,
+            prompts,
+            concurrency or len(self.__sessions),
+            new_conversation_per_prompt,
+            ordered,
+            checkpoint_path,
+            retries=0,
+        )
+
+    def health(self) -> list:
+        '''
+        Check every session without sending anything, see `ChatGPT.health()`\n
+        :return: List of the health of each session, None for a session that is not alive
+        '''
+        return [session.health() if session else None for session in self.__sessions]
+
+    def stats(self) -> dict:
+        '''
+        Get the pool-wide queue depth and latency stats\n
+        :return: Dictionary with session counts, queue depth, failures per kind, and latency percentiles in seconds
+        '''
+        with self.__lock:
+            wait_times = list(self.__wait_times)
+            latencies = list(self.__latencies)
+            busy = self.__busy
+            completed = self.__completed
+            failed = self.__failed
+            replaced = self.__replaced
+            retried = self.__retried
+            failure_kinds = dict(self.__failure_kinds)
+        return {
+            'sessions': len(self.__sessions),
+            'alive': sum(1 for i in self.__sessions if i),
+            'busy': busy,
+            'queue_depth': self.__jobs.qsize(),
+            'completed': completed,
+            'failed': failed,
+            'replaced': replaced,
+            'retried': retried,
+            'failures': failure_kinds,
+            'held_back': sum(1 for i in self.__limiters if i.delay()),
+            'wait_p50': _percentile(wait_times, 50),
+            'wait_p95': _percentile(wait_times, 95),
+            'latency_p50': _percentile(latencies, 50),
+            'latency_p95': _percentile(latencies, 95),
+        }
+
+    def close(self) -> None:
+        '''
+        Stop the workers and close every session
+        '''
+        self.__is_active = False
+        for _ in self.__workers:
+            self.__jobs.put(None)
+        for worker in self.__workers:
+            worker.join()
+        while not self.__jobs.empty():
+            job = self.__jobs.get_nowait()
+            # Retried jobs are already running and can no longer be cancelled
+            if job and not job[2].cancel():
+                job[2].set_exception(ValueError('Pool is closed'))
+        for session in self.__sessions:
+            if session:
+                session.__del__()
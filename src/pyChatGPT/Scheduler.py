@@ -0,0 +1,268 @@
+from collections import deque
+from threading import Lock
+import random
+import time
+import re
+
+from .Lazy import LazyModule
+
+SeleniumExceptions = LazyModule('selenium.common.exceptions')
+
+chatgpt_rate_limit_error = re.compile(r'too many requests|rate limit', re.IGNORECASE)
+chatgpt_capacity_error = re.compile(r'at capacity|overloaded', re.IGNORECASE)
+chatgpt_network_error = re.compile(r'net::|network error', re.IGNORECASE)
+
+
+class CapacityError(ValueError):
+    '''
+    ChatGPT is at capacity
+    '''
+
+
+class RateLimitError(ValueError):
+    '''
+    The account hit its message limit (e.g. "Too many requests in 1 hour")
+    '''
+
+    def __init__(self, message: str, retry_after: float = None):
+        '''
+        Initialize the RateLimitError object\n
+        :param message: The error shown by ChatGPT
+        :param retry_after: Seconds to wait before retrying, if ChatGPT said so
+        '''
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def response_error(message: str) -> ValueError:
+    '''
+    Build the exception for an error response shown or returned by ChatGPT\n
+    :param message: The error message
+    :return: RateLimitError, CapacityError, or ValueError for any other error
+    '''
+    if chatgpt_rate_limit_error.search(message):
+        return RateLimitError(message)
+    if chatgpt_capacity_error.search(message):
+        return CapacityError(message)
+    return ValueError(message)
+
+
+def http_error(status: int, detail: str, retry_after: str = None) -> ValueError:
+    '''
+    Build the exception for a failed HTTP request\n
+    :param status: The status code
+    :param detail: The error detail returned by the server
+    :param retry_after: The `Retry-After` header, if any
+    :return: RateLimitError, CapacityError, or ValueError for any other error
+    '''
+    if status in [401, 403]:
+        return ValueError(f'Unauthorized ({status}): {detail}')
+    if status == 429:
+        try:
+            retry_after = float(retry_after)
+        except (TypeError, ValueError):
+            retry_after = None
+        return RateLimitError(detail or 'Too many requests', retry_after)
+    return response_error(detail or f'HTTP {status}')
+
+
+def classify_error(error: Exception) -> str:
+    '''
+    Classify why a send failed\n
+    :param error: The exception raised while sending
+    :return: `capacity`, `rate_limit`, `network`, `auth`, or `other`
+    '''
+    from .pyChatGPT import chatgpt_auth_error
+    import http.client
+
+    if isinstance(error, CapacityError):
+        return 'capacity'
+    if isinstance(error, RateLimitError):
+        return 'rate_limit'
+    if isinstance(
+        error,
+        (SeleniumExceptions.WebDriverException, http.client.HTTPException, OSError),
+    ):
+        return 'network'
+    if isinstance(error, ValueError) and chatgpt_auth_error.search(str(error)):
+        return 'auth'
+    if isinstance(error, ValueError) and chatgpt_network_error.search(str(error)):
+        return 'network'
+    return 'other'
+
+
+def backoff(attempt: int, base: float = 1, cap: float = 60) -> float:
+    '''
+    Get a jittered exponential backoff delay\n
+    :param attempt: Number of attempts that already failed, starting at 0
+    :param base: Seconds to wait after the first failure, on average
+    :param cap: Maximum average seconds to wait
+    :return: Seconds to wait
+    '''
+    return min(cap, base * 2**attempt) * random.uniform(0.5, 1.5)
+
+
+class TokenBucket:
+    '''
+    A token bucket refilling at a constant rate
+    '''
+
+    def __init__(self, capacity: float, rate: float, tokens: float = None):
+        '''
+        Initialize the TokenBucket object\n
+        :param capacity: Maximum number of tokens
+        :param rate: Tokens added per second
+        :param tokens: Tokens available at first (full if None)
+        '''
+        self.capacity = capacity
+        self.rate = rate
+        self.__tokens = capacity if tokens is None else tokens
+        self.__updated = time.time()
+
+    def __refill(self) -> None:
+        now = time.time()
+        self.__tokens = min(
+            self.capacity, self.__tokens + (now - self.__updated) * self.rate
+        )
+        self.__updated = now
+
+    def time_until_available(self, tokens: float = 1) -> float:
+        '''
+        Get the time until enough tokens are available\n
+        :param tokens: Number of tokens needed
+        :return: Seconds to wait, 0 if they are available now
+        '''
+        self.__refill()
+        if self.__tokens >= tokens:
+            return 0.0
+        return (tokens - self.__tokens) / self.rate
+
+    def consume(self, tokens: float = 1) -> None:
+        '''
+        Take tokens from the bucket\n
+        :param tokens: Number of tokens to take
+        '''
+        self.__refill()
+        self.__tokens = max(0.0, self.__tokens - tokens)
+
+
+class SessionLimiter:
+    '''
+    Hold a session back after capacity, rate limit or network failures, learning
+    its hourly message limit from the rate limits it hits
+    '''
+
+    def __init__(self, window: float = 3600, capacity_backoff: float = 10):
+        '''
+        Initialize the SessionLimiter object\n
+        :param window: Seconds the message limit applies to
+        :param capacity_backoff: Seconds to hold the session back after a first capacity or network failure
+        '''
+        self.__window = window
+        self.__capacity_backoff = capacity_backoff
+        self.__sent = deque()
+        self.__bucket = None
+        self.__blocked_until = 0.0
+        self.__failures = 0
+        self.__lock = Lock()
+
+    @property
+    def limit(self) -> int:
+        '''
+        The learned number of messages allowed per window, or None if no limit was hit yet
+        '''
+        return int(self.__bucket.capacity) if self.__bucket else None
+
+    def __trim(self, now: float) -> None:
+        while self.__sent and self.__sent[0] < now - self.__window:
+            self.__sent.popleft()
+
+    def delay(self) -> float:
+        '''
+        Get the time until the session may send again\n
+        :return: Seconds to wait, 0 if it may send now
+        '''
+        with self.__lock:
+            delay = max(0.0, self.__blocked_until - time.time())
+            if self.__bucket:
+                delay = max(delay, self.__bucket.time_until_available())
+            return delay
+
+    def record_send(self) -> None:
+        '''
+        Record a message answered by the session
+        '''
+        with self.__lock:
+            now = time.time()
+            self.__sent.append(now)
+            self.__trim(now)
+            self.__failures = 0
+            if self.__bucket:
+                self.__bucket.consume()
+
+    def record_failure(self, kind: str, error: Exception = None) -> float:
+        '''
+        Record a failed send, holding the session back\n
+        :param kind: The failure kind returned by `classify_error()`
+        :param error: The exception raised while sending
+        :return: Seconds the session is held back
+        '''
+        with self.__lock:
+            now = time.time()
+            if kind == 'rate_limit':
+                self.__trim(now)
+                limit = max(1, len(self.__sent))
+                retry_after = getattr(error, 'retry_after', None)
+                if not retry_after:
+                    # The oldest message in the window is the next to expire
+                    retry_after = (
+                        self.__sent[0] + self.__window - now
+                        if self.__sent
+                        else self.__window
+                    )
+                self.__blocked_until = now + retry_after
+                # The first send after the block goes ahead, the limit paces the next ones
+                rate = limit / self.__window
+                self.__bucket = TokenBucket(limit, rate, max(0, 1 - retry_after * rate))
+            elif kind in ['capacity', 'network']:
+                self.__blocked_until = now + backoff(
+                    self.__failures, self.__capacity_backoff, self.__window / 4
+                )
+                self.__failures += 1
+            return max(0.0, self.__blocked_until - now)
+
+
+class RetryBudget:
+    '''
+    Cap retries to a fraction of successful sends, so a widespread outage does
+    not multiply the load
+    '''
+
+    def __init__(self, ratio: float = 0.2, minimum: int = 10):
+        '''
+        Initialize the RetryBudget object\n
+        :param ratio: Retries earned per successful send
+        :param minimum: Retries allowed at first, and the most that can be saved up
+        '''
+        self.__ratio = ratio
+        self.__minimum = minimum
+        self.__tokens = float(minimum)
+        self.__lock = Lock()
+
+    def record_success(self) -> None:
+        '''
+        Record a successful send, earning a fraction of a retry
+        '''
+        with self.__lock:
+            self.__tokens = min(self.__tokens + self.__ratio, self.__minimum)
+
+    def try_retry(self) -> bool:
+        '''
+        Spend a retry if the budget allows it\n
+        :return: Boolean indicating if the retry may go ahead
+        '''
+        with self.__lock:
+            if self.__tokens < 1:
+                return False
+            self.__tokens -= 1
+            return True
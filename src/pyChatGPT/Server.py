@@ -0,0 +1,641 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict
+from threading import Lock, Thread
+import queue
+import argparse
+import logging
+import glob
+import json
+import time
+import uuid
+import re
+
+from .Blocking import BlockingProfile, preset_patterns, safe_presets
+from .Scheduler import CapacityError, RateLimitError
+from .pyChatGPT import MessageStream
+from .Metrics import metrics
+
+
+class InvalidRequestError(ValueError):
+    '''
+    A chat completions request the server cannot answer
+    '''
+
+
+def message_text(message: dict) -> str:
+    '''
+    Get the text of a chat completions message\n
+    :param message: The message, its content being a string or a list of parts
+    :return: The text of the message
+    '''
+    content = message.get('content') or ''
+    if isinstance(content, list):
+        return '\n'.join(
+            i.get('text', '') for i in content if i.get('type', 'text') == 'text'
+        )
+    return str(content)
+
+
+def validate_messages(messages) -> list:
+    '''
+    Check the messages of a chat completions request\n
+    :param messages: The messages, each with a string `role` and a string or list of parts `content`
+    :return: The messages, raising InvalidRequestError if they are malformed
+    '''
+    if not isinstance(messages, list) or not messages:
+        raise InvalidRequestError('Please provide at least one message')
+    for i, message in enumerate(messages):
+        if not isinstance(message, dict):
+            raise InvalidRequestError(f'Message {i} must be an object')
+        if not isinstance(message.get('role'), str):
+            raise InvalidRequestError(f'Message {i} must have a string role')
+        content = message.get('content')
+        if not isinstance(content, str) and not (
+            isinstance(content, list) and all(isinstance(j, dict) for j in content)
+        ):
+            raise InvalidRequestError(
+                f'Message {i} content must be a string or a list of parts'
+            )
+    return messages
+
+
+def render_prompt(messages: list) -> str:
+    '''
+    Render chat completions messages into one prompt, ChatGPT keeps the history
+    of a conversation itself so this is only sent when a conversation starts\n
+    :param messages: The messages, each with keys `role` and `content`
+    :return: The prompt
+    '''
+    if len(messages) == 1 and messages[0].get('role', 'user') == 'user':
+        return message_text(messages[0])
+    instructions = [message_text(i) for i in messages if i.get('role') == 'system']
+    turns = [
+        f'{i.get("role", "user").capitalize()}: {message_text(i)}'
+        for i in messages
+        if i.get('role') != 'system'
+    ]
+    return '\n\n'.join(instructions + turns)
+
+
+def last_user_message(messages: list) -> str:
+    '''
+    Get the text of the last user message\n
+    :param messages: The messages, each with keys `role` and `content`
+    :return: The text, raising ValueError if there is no user message
+    '''
+    for message in reversed(messages):
+        if message.get('role', 'user') == 'user':
+            return message_text(message)
+    raise InvalidRequestError('Please provide at least one user message')
+
+
+def _metric_name(name: str) -> str:
+    return 'pychatgpt_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+class _Route:
+    '''
+    Where a client conversation lives: the session holding the ChatGPT
+    conversation, and the tab it is open in while it is in use
+    '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.index = None
+        self.conversation = None
+        self.conversation_id = ''
+
+
+class ChatServer:
+    '''
+    An HTTP server in front of a `ChatGPTPool`, with an OpenAI-style chat
+    completions endpoint. Requests without a conversation ID are answered by the
+    next idle session of the pool. Requests with a conversation ID stick to the
+    session holding the conversation, each in its own tab, so they do not queue
+    behind one another
+    '''
+
+    def __init__(
+        self,
+        pool,
+        host: str = '127.0.0.1',
+        port: int = 8000,
+        max_tabs: int = 32,
+        max_conversations: int = 10000,
+        model: str = 'chatgpt',
+    ):
+        '''
+        Initialize the ChatServer object\n
+        :param pool: The `ChatGPTPool` serving the requests
+        :param host: The host to listen on
+        :param port: The port to listen on (0 to pick a free port)
+        :param max_tabs: Number of conversation tabs kept open across the pool, the least recently used are closed and reopened when needed
+        :param max_conversations: Number of client conversations whose session is remembered
+        :param model: The model name reported to clients
+        '''
+        self.logger = logging.getLogger('pyChatGPT')
+        self.pool = pool
+        self.model = model
+        self.__max_tabs = max_tabs
+        self.__max_conversations = max_conversations
+        self.__routes = OrderedDict()
+        self.__lock = Lock()
+        self.__requests = {}
+        self.__server = _ChatHTTPServer((host, port), _ChatHandler)
+        self.__server.chat = self
+        self.__thread = None
+        # The pool's spans feed the summaries on /metrics
+        metrics.enable()
+
+    @property
+    def url(self) -> str:
+        '''
+        The base URL of the server
+        '''
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'ChatServer':
+        '''
+        Start serving in a background thread\n
+        :return: The server itself
+        '''
+        self.__thread = Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        '''
+        Serve in the current thread until `stop()` is called
+        '''
+        self.__server.serve_forever()
+
+    def stop(self) -> None:
+        '''
+        Stop serving and close the open tabs, the pool is left open
+        '''
+        self.__server.shutdown()
+        self.__server.server_close()
+        with self.__lock:
+            routes = list(self.__routes.values())
+            self.__routes.clear()
+        for route in routes:
+            with route.lock:
+                self.__close_tab(route)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def record_request(self, path: str, status: int) -> None:
+        '''
+        Count a served request\n
+        :param path: The path of the request
+        :param status: The status code of the response
+        '''
+        with self.__lock:
+            key = (path, status)
+            self.__requests[key] = self.__requests.get(key, 0) + 1
+
+    def complete(self, messages: list, conversation_id: str = None) -> dict:
+        '''
+        Answer chat completions messages without streaming\n
+        :param messages: The messages, each with keys `role` and `content`
+        :param conversation_id: The client conversation ID, None to answer from a fresh conversation
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        if conversation_id is None:
+            return self.pool.submit(
+                render_prompt(messages), reset_conversation=True
+            ).result()
+        stream = self.stream(messages, conversation_id)
+        for _ in stream:
+            pass
+        return stream.result
+
+    def stream(self, messages: list, conversation_id: str = None) -> MessageStream:
+        '''
+        Answer chat completions messages, streaming the response\n
+        :param messages: The messages, each with keys `role` and `content`
+        :param conversation_id: The client conversation ID, None to answer from a fresh conversation
+        :return: MessageStream yielding the new text of the response
+        '''
+        if conversation_id is None:
+            return MessageStream(self.__generate_pooled(messages))
+        return MessageStream(self.__generate(messages, conversation_id))
+
+    def __route(self, conversation_id: str) -> _Route:
+        '''
+        Get the route of a client conversation, forgetting the least recently used ones\n
+        :param conversation_id: The client conversation ID
+        :return: The route
+        '''
+        evicted = []
+        with self.__lock:
+            route = self.__routes.pop(conversation_id, None) or _Route()
+            self.__routes[conversation_id] = route
+            while len(self.__routes) > self.__max_conversations:
+                evicted.append(self.__routes.popitem(last=False)[1])
+        for i in evicted:
+            with i.lock:
+                self.__close_tab(i)
+        return route
+
+    def __open_tab(self, route: _Route, messages: list) -> str:
+        '''
+        Open the tab of a route\n
+        :param route: The route, its lock held
+        :param messages: The messages of the request
+        :return: The prompt to send, the whole history unless the conversation is reopened
+        '''
+        if route.conversation_id:
+            try:
+                route.index, route.conversation = self.pool.open_conversation(
+                    route.conversation_id, route.index
+                )
+                return last_user_message(messages)
+            except ValueError as e:
+                # The session holding the conversation is gone
+                self.logger.debug(f'Failed to reopen conversation: {str(e)}')
+                route.conversation_id = ''
+        route.index, route.conversation = self.pool.open_conversation()
+        return render_prompt(messages)
+
+    def __close_tab(self, route: _Route) -> None:
+        '''
+        Close the tab of a route, keeping its session and conversation ID\n
+        :param route: The route, its lock held
+        '''
+        if not route.conversation:
+            return
+        try:
+            route.conversation.close()
+        except Exception as e:
+            self.logger.debug(f'Failed to close tab: {str(e)}')
+        route.conversation = None
+
+    def __limit_tabs(self, current: _Route) -> None:
+        '''
+        Close the tabs of the least recently used routes above `max_tabs`\n
+        :param current: The route in use, never closed
+        '''
+        with self.__lock:
+            routes = [i for i in self.__routes.values() if i.conversation]
+        for route in routes[: max(0, len(routes) - self.__max_tabs)]:
+            # A busy route is about to become the most recently used one
+            if route is current or not route.lock.acquire(blocking=False):
+                continue
+            try:
+                self.__close_tab(route)
+            finally:
+                route.lock.release()
+
+    def __generate_pooled(self, messages: list):
+        '''
+        Send the messages from a fresh conversation of the next idle session and yield
+        the response as it streams\n
+        :param messages: The messages of the request
+        :return: Generator yielding the new text of the response, returning the final response
+        '''
+        start_time = time.time()
+        deltas = queue.Queue()
+        closed = []
+
+        def on_delta(delta: str) -> None:
+            if closed:
+                raise ValueError('Stream closed by the client')
+            deltas.put(delta)
+
+        future = self.pool.submit(
+            render_prompt(messages), reset_conversation=True, on_delta=on_delta
+        )
+        future.add_done_callback(lambda _: deltas.put(None))
+        try:
+            for delta in iter(deltas.get, None):
+                yield delta
+        except GeneratorExit:
+            closed.append(True)
+            future.cancel()
+            raise
+        result = future.result()
+        metrics.observe('server.completion', time.time() - start_time)
+        return result
+
+    def __generate(self, messages: list, conversation_id: str):
+        '''
+        Send the messages in the tab of their route and yield the response as it streams\n
+        :param messages: The messages of the request
+        :param conversation_id: The client conversation ID
+        :return: Generator yielding the new text of the response, returning the final response
+        '''
+        route = self.__route(conversation_id)
+        with route.lock:
+            start_time = time.time()
+            if route.conversation:
+                prompt = last_user_message(messages)
+            else:
+                prompt = self.__open_tab(route, messages)
+                self.__limit_tabs(route)
+            try:
+                with route.conversation.stream_message(prompt) as stream:
+                    for delta in stream:
+                        yield delta
+            except Exception:
+                # The tab may be left mid-generation, reopen it next time
+                self.__close_tab(route)
+                raise
+            route.conversation_id = stream.conversation_id or route.conversation_id
+            metrics.observe('server.completion', time.time() - start_time)
+            return stream.result
+
+    def prometheus(self) -> str:
+        '''
+        Render the pool stats, the request counts and the latency summaries in the
+        Prometheus text format\n
+        :return: The metrics
+        '''
+        lines = []
+        stats = self.pool.stats()
+        for key, value in stats.items():
+            name = _metric_name(f'pool_{key}')
+            if isinstance(value, dict):
+                lines.append(f'# TYPE {name}_total counter')
+                lines += [f'{name}_total{{kind="{k}"}} {v}' for k, v in value.items()]
+            elif key in ['completed', 'failed', 'replaced', 'retried']:
+                lines += [f'# TYPE {name}_total counter', f'{name}_total {value}']
+            else:
+                lines += [f'# TYPE {name} gauge', f'{name} {value}']
+
+        with self.__lock:
+            requests = dict(self.__requests)
+            routes = list(self.__routes.values())
+        name = _metric_name('server_requests_total')
+        lines.append(f'# TYPE {name} counter')
+        lines += [
+            f'{name}{{path="{path}",status="{status}"}} {count}'
+            for (path, status), count in sorted(requests.items())
+        ]
+        lines += [
+            '# TYPE pychatgpt_server_conversations gauge',
+            f'pychatgpt_server_conversations {len(routes)}',
+            '# TYPE pychatgpt_server_tabs gauge',
+            f'pychatgpt_server_tabs {sum(1 for i in routes if i.conversation)}',
+        ]
+
+        for key, summary in sorted(metrics.histograms().items()):
+            name = _metric_name(key)
+            lines.append(f'# TYPE {name} summary')
+            lines += [
+                f'{name}{{quantile="{quantile}"}} {summary[f"p{percent}"]}'
+                for quantile, percent in [('0.5', 50), ('0.95', 95), ('0.99', 99)]
+            ]
+            lines += [
+                f'{name}_sum {summary["sum"]}',
+                f'{name}_count {summary["count"]}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+class _ChatHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args) -> None:
+        self.chat.logger.debug(f'{self.address_string()} {format % args}')
+
+    @property
+    def chat(self) -> ChatServer:
+        return self.server.chat
+
+    def __send_json(self, status: int, body: dict) -> None:
+        self.__send(status, json.dumps(body), 'application/json')
+
+    def __send(self, status: int, body: str, content_type: str) -> None:
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.chat.record_request(self.path.split('?', 1)[0], status)
+
+    def __send_error(self, e: Exception) -> None:
+        if isinstance(e, RateLimitError):
+            status, kind = 429, 'rate_limit_error'
+        elif isinstance(e, CapacityError):
+            status, kind = 503, 'capacity_error'
+        elif isinstance(e, InvalidRequestError):
+            status, kind = 400, 'invalid_request_error'
+        elif isinstance(e, ValueError):
+            status, kind = 502, 'upstream_error'
+        else:
+            status, kind = 500, 'server_error'
+        self.__send_json(status, {'error': {'message': str(e), 'type': kind}})
+
+    def __send_event(self, data) -> None:
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        payload = f'data: {data}\n\n'.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(payload), payload))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        path = self.path.split('?', 1)[0]
+        if path == '/healthz':
+            stats = self.chat.pool.stats()
+            # One cheap script per session, a session busy sending is not waited for
+            health = self.chat.pool.health()
+            live = sum(1 for i in health if i and i['live'])
+            return self.__send_json(
+                200 if live else 503,
+                {
+                    'status': 'ok' if live else 'unavailable',
+                    'sessions': stats['sessions'],
+                    'live': live,
+                    'ready': sum(1 for i in health if i and i['ready']),
+                    'busy': stats['busy'],
+                    'queue_depth': stats['queue_depth'],
+                    'checks': [i['checks'] if i else None for i in health],
+                },
+            )
+        if path == '/metrics':
+            return self.__send(200, self.chat.prometheus(), 'text/plain; version=0.0.4')
+        if path == '/v1/models':
+            return self.__send_json(
+                200,
+                {
+                    'object': 'list',
+                    'data': [
+                        {'id': self.chat.model, 'object': 'model', 'owned_by': 'openai'}
+                    ],
+                },
+            )
+        self.__send_json(404, {'error': {'message': 'Not found', 'type': 'not_found'}})
+
+    def do_POST(self) -> None:
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.split('?', 1)[0] != '/v1/chat/completions':
+            return self.__send_json(
+                404, {'error': {'message': 'Not found', 'type': 'not_found'}}
+            )
+        try:
+            body = json.loads(raw)
+            if not isinstance(body, dict):
+                raise InvalidRequestError('The request body must be an object')
+            messages = validate_messages(body.get('messages'))
+            conversation_id = body.get('conversation_id') or self.headers.get(
+                'X-Conversation-Id'
+            )
+            if conversation_id is not None and not isinstance(conversation_id, str):
+                raise InvalidRequestError('The conversation ID must be a string')
+        except ValueError as e:
+            return self.__send_error(InvalidRequestError(f'Invalid request: {str(e)}'))
+        completion = {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'created': int(time.time()),
+            'model': self.chat.model,
+        }
+        if body.get('stream'):
+            return self.__stream(completion, messages, conversation_id)
+
+        try:
+            response = self.chat.complete(messages, conversation_id)
+        except Exception as e:
+            return self.__send_error(e)
+        self.__send_json(
+            200,
+            {
+                **completion,
+                'object': 'chat.completion',
+                'conversation_id': conversation_id or response['conversation_id'],
+                'choices': [
+                    {
+                        'index': 0,
+                        'message': {
+                            'role': 'assistant',
+                            'content': response['message'],
+                        },
+                        'finish_reason': 'stop',
+                    }
+                ],
+            },
+        )
+
+    def __stream(self, completion: dict, messages: list, conversation_id: str) -> None:
+        stream = self.chat.stream(messages, conversation_id)
+        try:
+            # Errors before the first delta still get a status code
+            first = next(stream, None)
+        except Exception as e:
+            return self.__send_error(e)
+
+        def chunk(delta: dict, finish_reason: str = None) -> dict:
+            return {
+                **completion,
+                'object': 'chat.completion.chunk',
+                'conversation_id': conversation_id or stream.result['conversation_id'],
+                'choices': [
+                    {'index': 0, 'delta': delta, 'finish_reason': finish_reason}
+                ],
+            }
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.chat.record_request(self.path.split('?', 1)[0], 200)
+        try:
+            self.__send_event(chunk({'role': 'assistant', 'content': ''}))
+            try:
+                if first is not None:
+                    self.__send_event(chunk({'content': first}))
+                for delta in stream:
+                    self.__send_event(chunk({'content': delta}))
+                self.__send_event(chunk({}, 'stop'))
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception as e:
+                self.__send_event(
+                    {'error': {'message': str(e), 'type': type(e).__name__}}
+                )
+            self.__send_event('[DONE]')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, stop the generation
+            stream.close()
+            self.close_connection = True
+
+
+def main(argv: list = None) -> None:
+    '''
+    Run `python -m pyChatGPT serve`\n
+    :param argv: The command line arguments after `serve`
+    '''
+    parser = argparse.ArgumentParser(
+        prog='python -m pyChatGPT serve',
+        description='Serve a pool of ChatGPT sessions over an OpenAI-style HTTP API',
+    )
+    parser.add_argument(
+        '--sessions',
+        nargs='+',
+        required=True,
+        help='session tokens or cookies files saved by `login_cookies_path` (globs are expanded)',
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-tabs', type=int, default=32)
+    parser.add_argument('--max-conversations', type=int, default=10000)
+    parser.add_argument('--proxy', default=None)
+    parser.add_argument('--chrome-arg', action='append', default=[])
+    parser.add_argument(
+        '--block',
+        nargs='*',
+        choices=sorted(preset_patterns),
+        help='block these resources in every browser (the safe presets if none are given)',
+    )
+    parser.add_argument('--credential-store', default='', help='path to a SQLite store')
+    parser.add_argument('--no-moderation', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    from .Pool import ChatGPTPool
+
+    sessions = []
+    for i in args.sessions:
+        sessions += sorted(glob.glob(i)) or [i]
+    kwargs = {
+        'proxy': args.proxy,
+        'chrome_args': args.chrome_arg,
+        'moderation': not args.no_moderation,
+        'verbose': args.verbose,
+    }
+    if args.block is not None:
+        kwargs['blocking_profile'] = BlockingProfile(args.block or safe_presets)
+    if args.credential_store:
+        from .Credentials import SqliteCredentialStore
+
+        kwargs['credential_store'] = SqliteCredentialStore(args.credential_store)
+
+    pool = ChatGPTPool(sessions, **kwargs)
+    server = ChatServer(
+        pool,
+        host=args.host,
+        port=args.port,
+        max_tabs=args.max_tabs,
+        max_conversations=args.max_conversations,
+    )
+    print(f'Serving {len(sessions)} sessions on {server.url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        pool.close()
@@ -0,0 +1,118 @@
+import time
+
+from .Lazy import LazyModule
+from .Metrics import metrics
+
+SeleniumExceptions = LazyModule('selenium.common.exceptions')
+
+
+class WaitPolicy:
+    '''
+    How long to wait for a condition and how often to poll it, polling fast at
+    first and backing off exponentially
+    '''
+
+    def __init__(
+        self,
+        timeout: float = 5,
+        interval: float = 0.05,
+        max_interval: float = 0.5,
+        backoff: float = 1.5,
+    ):
+        '''
+        Initialize the WaitPolicy object\n
+        :param timeout: Seconds to wait before giving up (None to wait forever)
+        :param interval: Seconds between the first polls
+        :param max_interval: Longest interval the backoff reaches
+        :param backoff: Factor the interval grows by after each poll
+        '''
+        if interval <= 0 or max_interval < interval or backoff < 1:
+            raise ValueError('Invalid wait policy')
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+    def until(self, driver, method, name: str = 'wait', message: str = ''):
+        '''
+        Poll a condition until it returns a truthy value\n
+        :param driver: The WebDriver passed to the condition
+        :param method: The condition, called with the driver (e.g. an expected condition)
+        :param name: The name the duration is recorded under (`wait.<name>`)
+        :param message: The message of the TimeoutException
+        :return: The value returned by the condition
+        '''
+        return self.__poll(driver, method, False, name, message)
+
+    def until_not(self, driver, method, name: str = 'wait', message: str = ''):
+        '''
+        Poll a condition until it returns a falsy value or finds no element\n
+        :param driver: The WebDriver passed to the condition
+        :param method: The condition, called with the driver (e.g. an expected condition)
+        :param name: The name the duration is recorded under (`wait.<name>`)
+        :param message: The message of the TimeoutException
+        :return: The value returned by the condition
+        '''
+        return self.__poll(driver, method, True, name, message)
+
+    def __poll(self, driver, method, negate: bool, name: str, message: str):
+        '''
+        Poll a condition, recording how long the wait took\n
+        :param driver: The WebDriver passed to the condition
+        :param method: The condition, called with the driver
+        :param negate: Whether to wait for the condition to become falsy
+        :param name: The name the duration is recorded under
+        :param message: The message of the TimeoutException
+        :return: The value returned by the condition
+        '''
+        started = time.perf_counter()
+        interval = self.interval
+        outcome = 'error'
+        try:
+            while True:
+                try:
+                    value = method(driver)
+                except SeleniumExceptions.NoSuchElementException:
+                    value = False
+                if bool(value) != negate:
+                    outcome = 'ok'
+                    return value if not negate else True
+
+                elapsed = time.perf_counter() - started
+                if self.timeout is not None and elapsed >= self.timeout:
+                    outcome = 'timeout'
+                    raise SeleniumExceptions.TimeoutException(
+                        message or f'Timed out waiting for {name}'
+                    )
+                if self.timeout is not None:
+                    interval = min(interval, self.timeout - elapsed)
+                time.sleep(interval)
+                interval = min(interval * self.backoff, self.max_interval)
+        finally:
+            metrics.observe(
+                f'wait.{name}', time.perf_counter() - started, outcome=outcome
+            )
+
+
+# The wait of every call site, override any of them with `ChatGPT(wait_policies=...)`
+default_policies = {
+    # Cloudflare challenge in front of /api/auth/session
+    'cf_challenge': WaitPolicy(10, 0.1, 1),
+    # "ChatGPT is at capacity" banner, ends early once the page has rendered
+    'capacity': WaitPolicy(3),
+    # Intro modal, ends early once the chat page has loaded without one
+    'intro': WaitPolicy(3),
+    'textbox': WaitPolicy(5),
+    # End of a non-streamed response, short answers are caught by the fast polls
+    'generation': WaitPolicy(120, 0.05, 0.5),
+    # Conversation request finishing in the performance log
+    'capture': WaitPolicy(120, 0.02, 0.25),
+    'chats_list': WaitPolicy(5),
+    'clear_conversations': WaitPolicy(20, 0.1, 1),
+    'login': WaitPolicy(5, 0.1, 0.5),
+    # Optional login steps (remembered account, captcha) that may never appear
+    'login_probe': WaitPolicy(3, 0.1, 0.5),
+    # Waiting on a human: Google verification code, manual reCAPTCHA
+    'verification_code': WaitPolicy(None, 0.5, 1),
+    'manual_captcha': WaitPolicy(None, 0.25, 1),
+}
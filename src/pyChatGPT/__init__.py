@@ -4,7 +4,28 @@ pyChatGPT
 An unofficial Python wrapper for OpenAI's ChatGPT API
 '''
 
+import importlib
 
-from .pyChatGPT import ChatGPT
+# Imported on first access, so `import pyChatGPT` stays cheap for processes
+# that only use part of the package
+_exports = {
+    'ChatGPT': 'pyChatGPT',
+    'Conversation': 'pyChatGPT',
+    'MessageStream': 'pyChatGPT',
+    'ChatGPTPool': 'Pool',
+    'AsyncChatGPT': 'Async',
+}
 
-__all__ = ['ChatGPT']
+__all__ = ['ChatGPT', 'ChatGPTPool', 'AsyncChatGPT', 'MessageStream', 'Conversation']
+
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{_exports[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(list(globals()) + __all__)
@@ -1,4 +1,5 @@
 from pyChatGPT import ChatGPT
+import sys
 import os
 
 
@@ -7,6 +8,11 @@ def clear_screen():
 
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['serve']:
+        from pyChatGPT.Server import main
+
+        sys.exit(main(sys.argv[2:]))
+
     while True:
         session_token = input('Please enter your session token: ')
         conversation_id = input(
@@ -1,20 +1,44 @@
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common import exceptions as SeleniumExceptions
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-
-import undetected_chromedriver as uc
-from markdownify import markdownify
-from threading import Thread
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from threading import Lock, RLock, Thread
+from urllib.parse import urlsplit
 import platform
 import logging
+import hashlib
 import weakref
+import shutil
 import json
 import time
 import re
 import os
 
+from . import KeepAlive, Display, Wait
+from .Lazy import LazyModule
+from .Credentials import is_fresh, session_token_cookie, to_cdp_cookie
+from .Markdown import IncrementalMarkdown, convert_blocks
+from .Memory import process_tree_rss
+from .Metrics import metrics
+from .Scheduler import CapacityError, backoff, http_error, response_error
+
+# Heavy imports are deferred until a browser is started or a wait fails
+EC = LazyModule('selenium.webdriver.support.expected_conditions')
+SeleniumExceptions = LazyModule('selenium.common.exceptions')
+uc = LazyModule('undetected_chromedriver')
+
+
+class By:
+    '''
+    The locator strategies of `selenium.webdriver.common.by.By`, which cannot be
+    imported without importing every selenium webdriver
+    '''
+
+    ID = 'id'
+    XPATH = 'xpath'
+    LINK_TEXT = 'link text'
+    TAG_NAME = 'tag name'
+    CLASS_NAME = 'class name'
+    CSS_SELECTOR = 'css selector'
+
 
 cf_challenge_form = (By.ID, 'challenge-form')
 
@@ -25,8 +49,10 @@ chatgpt_small_response = (
     By.XPATH,
     '//div[starts-with(@class, "markdown prose w-full break-words")]',
 )
+chatgpt_stop_generating = (By.XPATH, '//button[contains(., "Stop generating")]')
 chatgpt_alert = (By.XPATH, '//div[@role="alert"]')
 chatgpt_intro = (By.ID, 'headlessui-portal-root')
+chatgpt_capacity = (By.XPATH, '//div[text()="ChatGPT is at capacity right now"]')
 chatgpt_login_btn = (By.XPATH, '//button[text()="Log in"]')
 chatgpt_login_h1 = (By.XPATH, '//h1[text()="Welcome back"]')
 chatgpt_logged_h1 = (By.XPATH, '//h1[text()="ChatGPT"]')
@@ -39,7 +65,458 @@ chatgpt_chats_list_first_node = (
     '//div[substring(@class, string-length(@class) - string-length("text-sm") + 1)  = "text-sm"]//a',
 )
 
-chatgpt_chat_url = 'https://chat.openai.com/chat'
+chatgpt_base_url = 'https://chat.openai.com'
+
+# Installed before a message is sent: tracks the new response with a
+# MutationObserver so streaming never has to poll the DOM over WebDriver
+chatgpt_stream_observer_js = '''
+const [smallXPath, bigXPath, streamingClass, resume] = arguments;
+const count = (xpath) => document.evaluate(
+    `count(${xpath})`, document, null, XPathResult.NUMBER_TYPE, null
+).numberValue;
+const last = (xpath) => document.evaluate(
+    `(${xpath})[last()]`, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+
+if (window.__pyChatGPTStream) window.__pyChatGPTStream.observer.disconnect();
+const baseline = count(smallXPath) - (resume ? 1 : 0);
+const staleError = resume ? null : last(bigXPath);
+const state = { response: null, version: 0, done: false, error: null, waiter: null };
+
+const update = () => {
+    const error = last(bigXPath);
+    if (error && error !== staleError && error.className.includes('text-red')) {
+        state.error = error.innerText;
+        state.done = true;
+    } else if (count(smallXPath) > baseline) {
+        state.response = last(smallXPath);
+        state.done = !document.getElementsByClassName(streamingClass).length;
+    }
+    state.version += 1;
+    if (state.done) state.observer.disconnect();
+    if (state.waiter) state.waiter();
+};
+state.observer = new MutationObserver(update);
+state.observer.observe(document.body, {
+    childList: true, subtree: true, characterData: true,
+    attributes: true, attributeFilter: ['class'],
+});
+window.__pyChatGPTStream = state;
+update();
+'''
+
+# Serializes the top-level blocks of a response, skipping the blocks that
+# have already been converted
+chatgpt_response_blocks_js = '''
+const responseBlocks = (response, offset) => {
+    if (!response) return [];
+    return [...response.childNodes]
+        .filter((node) => node.nodeType === Node.ELEMENT_NODE || node.textContent.trim())
+        .slice(offset)
+        .map((node) => {
+            if (node.nodeType === Node.ELEMENT_NODE) return node.outerHTML;
+            const span = document.createElement('span');
+            span.textContent = node.textContent;
+            return span.innerHTML;
+        });
+};
+'''
+
+# Long-polls the observer state: resolves as soon as the response changes,
+# the response finishes, or the timeout expires
+chatgpt_stream_poll_js = chatgpt_response_blocks_js + '''
+const [offset, version, timeout] = arguments;
+const callback = arguments[arguments.length - 1];
+const state = window.__pyChatGPTStream;
+if (!state) return callback(null);
+
+const reply = () => callback({
+    blocks: responseBlocks(state.response, offset),
+    version: state.version,
+    done: state.done,
+    error: state.error,
+});
+if (state.version !== version || state.done) return reply();
+const timer = setTimeout(() => { state.waiter = null; reply(); }, timeout);
+state.waiter = () => {
+    if (state.version === version && !state.done) return;
+    clearTimeout(timer);
+    state.waiter = null;
+    reply();
+};
+'''
+
+# Reads the blocks of the last response in a single call
+chatgpt_last_response_js = chatgpt_response_blocks_js + '''
+const [smallXPath] = arguments;
+return responseBlocks(document.evaluate(
+    `(${smallXPath})[last()]`, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue, 0);
+'''
+
+# Counts the responses and the nodes of the page
+chatgpt_count_responses_js = '''
+const [smallXPath] = arguments;
+return [
+    document.evaluate(
+        smallXPath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+    ).snapshotLength,
+    document.getElementsByTagName('*').length,
+];
+'''
+
+# Empties every response but the most recent ones, keeping the emptied nodes so
+# the stream observer still counts them, and counts the page's nodes. React still
+# owns the emptied nodes, the page may break if it re-renders them
+chatgpt_trim_responses_js = '''
+const [smallXPath, keep] = arguments;
+const nodes = document.evaluate(
+    smallXPath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+);
+let trimmed = 0;
+for (let i = 0; i < nodes.snapshotLength - keep; i++) {
+    const node = nodes.snapshotItem(i);
+    if (node.dataset.pychatgptTrimmed) continue;
+    node.replaceChildren();
+    node.dataset.pychatgptTrimmed = '1';
+    trimmed++;
+}
+return [trimmed, document.getElementsByTagName('*').length];
+'''
+
+chatgpt_memory_js = '''
+return [
+    document.getElementsByTagName('*').length,
+    performance.memory ? performance.memory.usedJSHeapSize : null,
+];
+'''
+
+# Everything `health()` reads from the page, in one round trip
+chatgpt_health_js = '''
+const [textboxTag, capacityXPath, loginXPath] = arguments;
+const exists = (xpath) => document.evaluate(
+    xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue !== null;
+return {
+    ready_state: document.readyState,
+    url: location.href,
+    textarea: document.getElementsByTagName(textboxTag).length > 0,
+    capacity: exists(capacityXPath),
+    login: exists(loginXPath),
+};
+'''
+
+# Evaluated on every page load: records the conversation ID from the
+# conversation response and from router URL changes, so it can be read
+# back without navigating
+chatgpt_conversation_hook_js = '''
+(() => {
+    if (window.__pyChatGPTHooked) return;
+    window.__pyChatGPTHooked = true;
+    const pattern = /[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/;
+
+    for (const name of ['pushState', 'replaceState']) {
+        const original = history[name];
+        history[name] = function (state, title, url) {
+            const match = url ? String(url).match(pattern) : null;
+            window.__pyChatGPTConversationId = match ? match[0] : null;
+            return original.apply(this, arguments);
+        };
+    }
+
+    const fetch = window.fetch;
+    window.fetch = async function (input, init) {
+        const response = await fetch.apply(this, arguments);
+        const url = String(input && input.url ? input.url : input);
+        const method = (init && init.method) || (input && input.method);
+        if (
+            !url.endsWith('/backend-api/conversation')
+            || method !== 'POST'
+            || !response.body
+        ) {
+            return response;
+        }
+        const reader = response.clone().body.getReader();
+        const decoder = new TextDecoder();
+        let text = '';
+        (async () => {
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                text += decoder.decode(value, { stream: true });
+                const match = text.match(/"conversation_id":\\s*"([0-9a-f-]{36})"/);
+                if (match) {
+                    window.__pyChatGPTConversationId = match[1];
+                    return reader.cancel();
+                }
+            }
+        })().catch(() => {});
+        return response;
+    };
+})();
+'''
+
+# Evaluated on every page load with a blocking profile: counts the requests the
+# page makes to blocked URLs (elements failing to load, fetch, XHR and beacons),
+# as Chrome drops them before they show up in the resource timings
+chatgpt_blocked_counter_js = '''
+(() => {
+    if (window.__pyChatGPTBlocked) return;
+    const blocked = window.__pyChatGPTBlocked = {};
+    const patterns = __PATTERNS__.map((pattern) => [pattern, new RegExp(
+        '^' + pattern.split('*').map(
+            (part) => part.replace(/[.+?^${}()|[\\]\\\\]/g, '\\\\$&')
+        ).join('.*') + '$'
+    )]);
+    const count = (url) => {
+        try {
+            url = new URL(String(url), location.href).href;
+        } catch (e) {
+            return;
+        }
+        const match = patterns.find(([, regex]) => regex.test(url));
+        if (match) blocked[match[0]] = (blocked[match[0]] || 0) + 1;
+    };
+
+    window.addEventListener('error', (e) => {
+        const target = e.target;
+        if (target && target !== window) count(target.currentSrc || target.src || target.href);
+    }, true);
+    const fetch = window.fetch;
+    window.fetch = function (input, init) {
+        count(input && input.url ? input.url : input);
+        return fetch.apply(this, arguments);
+    };
+    const open = XMLHttpRequest.prototype.open;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        count(url);
+        return open.apply(this, arguments);
+    };
+    if (navigator.sendBeacon) {
+        const sendBeacon = navigator.sendBeacon.bind(navigator);
+        navigator.sendBeacon = (url, data) => {
+            count(url);
+            return sendBeacon(url, data);
+        };
+    }
+})();
+'''
+
+# Summarizes the requests of the current page from its resource timings
+chatgpt_resource_stats_js = '''
+const resources = performance.getEntriesByType('resource');
+const [navigation] = performance.getEntriesByType('navigation');
+const byType = {};
+let transferred = navigation ? navigation.transferSize : 0;
+for (const entry of resources) {
+    const type = byType[entry.initiatorType] = byType[entry.initiatorType] || {
+        resources: 0, transfer_bytes: 0,
+    };
+    type.resources++;
+    type.transfer_bytes += entry.transferSize;
+    transferred += entry.transferSize;
+}
+return {
+    resources: resources.length,
+    transfer_bytes: transferred,
+    by_type: byType,
+    load_time: navigation && navigation.loadEventEnd ? navigation.loadEventEnd / 1000 : null,
+    blocked_by_pattern: window.__pyChatGPTBlocked || {},
+};
+'''
+
+# Finds the intro, or reports that the chat page has loaded without one
+chatgpt_intro_js = '''
+const [introId, textboxTag] = arguments;
+const intro = document.getElementById(introId);
+if (intro) return intro;
+return document.readyState === 'complete'
+    && document.getElementsByTagName(textboxTag).length > 0;
+'''
+
+chatgpt_conversation_id = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+)
+
+chatgpt_auth_error = re.compile(
+    r'session|log ?in|unauthori[sz]ed|access token|\b40[13]\b', re.IGNORECASE
+)
+
+
+@contextmanager
+def _timed(timings: dict, name: str):
+    '''
+    Add the time spent in a block to a dictionary of timings\n
+    :param timings: Dictionary of seconds spent per phase
+    :param name: The name of the phase
+    '''
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def parse_conversation_event(line: str) -> dict:
+    '''
+    Parse a line of the `/backend-api/conversation` event stream\n
+    :param line: A line of the event stream
+    :return: The event data, or None if the line carries no message
+    '''
+    if not line.startswith('data: '):
+        return None
+    data = line[len('data: ') :].strip()
+    if data == '[DONE]':
+        return None
+    try:
+        data = json.loads(data)
+    except json.decoder.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not (data.get('message') or data.get('error')):
+        return None
+    return data
+
+
+def parse_conversation_stream(body: str) -> dict:
+    '''
+    Parse a complete `/backend-api/conversation` event stream\n
+    :param body: The raw event stream
+    :return: Dictionary with keys `message`, `conversation_id` and `message_id`
+    '''
+    event = None
+    for line in body.splitlines():
+        event = parse_conversation_event(line) or event
+    if not event:
+        raise ValueError('Empty conversation response')
+    if event.get('error'):
+        raise response_error(event['error'])
+    return {
+        'message': event['message']['content']['parts'][0],
+        'conversation_id': event['conversation_id'],
+        'message_id': event['message']['id'],
+    }
+
+
+class MessageStream:
+    '''
+    An iterator over the text of a streamed ChatGPT response
+    '''
+
+    def __init__(self, generator):
+        '''
+        Initialize the MessageStream object\n
+        :param generator: Generator yielding the new text and returning the final response
+        '''
+        self.__generator = generator
+        self.__result = {'message': None, 'conversation_id': None}
+        self.message = None
+        self.conversation_id = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self.__generator)
+        except StopIteration as e:
+            if e.value:
+                self.__result = e.value
+                self.message = e.value['message']
+                self.conversation_id = e.value['conversation_id']
+            raise e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def result(self) -> dict:
+        '''
+        The final response, available once the stream is exhausted\n
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        return self.__result
+
+    def close(self) -> None:
+        '''
+        Stop reading the stream, stopping the generation if it is unfinished
+        '''
+        self.__generator.close()
+
+
+class Conversation:
+    '''
+    A conversation in its own tab of a ChatGPT browser, opened with
+    `ChatGPT.open_conversation()`
+    '''
+
+    def __init__(self, chat: 'ChatGPT', window: str, conversation_id: str = ''):
+        '''
+        Initialize the Conversation object\n
+        :param chat: The ChatGPT session owning the browser
+        :param window: The window handle of the tab
+        :param conversation_id: The ID of the conversation open in the tab
+        '''
+        self.__chat = chat
+        self.__window = window
+        self.conversation_id = conversation_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def stream_message(self, message: str) -> MessageStream:
+        '''
+        Send a message in the tab and stream the response, other tabs can stream at the same time\n
+        Closing the stream before it finishes stops the generation\n
+        :param message: Message to send
+        :return: MessageStream yielding the new text of the response
+        '''
+        return MessageStream(self.__generate_message(message))
+
+    def __generate_message(self, message: str):
+        '''
+        Send a message in the tab and yield the response as it streams\n
+        :param message: Message to send
+        :return: Generator yielding the new text of the response, returning the final response
+        '''
+        response = yield from self.__chat._ChatGPT__generate_message(
+            message, self.__window
+        )
+        self.conversation_id = response['conversation_id']
+        return response
+
+    def send_message(self, message: str, stream: bool = False) -> dict:
+        '''
+        Send a message in the tab, other tabs can send at the same time\n
+        :param message: Message to send
+        :param stream: Whether to print the response as it streams
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        response = self.stream_message(message)
+        for i in response:
+            if stream:
+                print(i, end='', flush=True)
+        if stream:
+            print()
+        return response.result
+
+    def reset_conversation(self) -> None:
+        '''
+        Start a new conversation in the tab
+        '''
+        self.__chat._ChatGPT__reset_conversation(self.__window)
+        self.conversation_id = ''
+
+    def close(self) -> None:
+        '''
+        Close the tab
+        '''
+        self.__chat._ChatGPT__close_conversation(self.__window)
 
 
 class ChatGPT:
@@ -57,9 +534,23 @@ class ChatGPT:
         login_cookies_path: str = '',
         captcha_solver: str = 'pypasser',
         solver_apikey: str = '',
+        solver_timeout: float = 180,
+        solver_redundancy: int = 2,
         proxy: str = None,
         chrome_args: list = [],
         moderation: bool = True,
+        capture_network: bool = False,
+        transport: str = 'browser',
+        user_data_dir: str = None,
+        driver_path: str = None,
+        skip_intro: bool = False,
+        base_url: str = chatgpt_base_url,
+        wait_policies: dict = {},
+        cache=None,
+        credential_store=None,
+        credential_key: str = None,
+        memory_policy=None,
+        blocking_profile=None,
         verbose: bool = False,
     ):
         '''
@@ -72,9 +563,23 @@ class ChatGPT:
         :param login_cookies_path: The path to the cookies file to use for authentication
         :param captcha_solver: The captcha solver to use (`pypasser`, `2captcha`)
         :param solver_apikey: The apikey of the captcha solver to use (if any)
+        :param solver_timeout: Seconds a login may spend on the captcha before giving up, including a manual fallback
+        :param solver_redundancy: Number of 2captcha requests solving the same captcha in parallel, the first answer is used
         :param proxy: The proxy to use for the browser (`https://ip:port`)
         :param chrome_args: The arguments to pass to the browser
         :param moderation: Whether to enable message moderation
+        :param capture_network: Whether to read responses from the network instead of the page
+        :param transport: How messages are sent (`browser`, or `http` to only use the browser for authentication)
+        :param user_data_dir: The browser profile to reuse, keeping cookies and the validated session across restarts
+        :param driver_path: Where to keep the patched chromedriver so later starts skip patching
+        :param skip_intro: Whether to skip waiting for the intro (when the profile has already dismissed it)
+        :param base_url: The URL of the ChatGPT site (e.g. a local `MockServer`)
+        :param wait_policies: `WaitPolicy` overrides per call site (see `Wait.default_policies`)
+        :param cache: A `ResponseCache` serving repeated prompts, can be shared between sessions
+        :param credential_store: A `CredentialStore` sharing cookies and access tokens with other workers
+        :param credential_key: The key of the credentials in the store (defaults to the email, or a hash of the session token)
+        :param memory_policy: A `MemoryPolicy` trimming old responses and restarting the browser of long-running sessions
+        :param blocking_profile: A `BlockingProfile` of the images, fonts, analytics and telemetry requests the browser blocks
         :param verbose: Whether to enable verbose logging
         '''
         self.__init_logger(verbose)
@@ -87,12 +592,69 @@ class ChatGPT:
         self.__login_cookies_path = login_cookies_path
         self.__captcha_solver = captcha_solver
         self.__solver_apikey = solver_apikey
+        self.__solver_timeout = solver_timeout
+        self.__solver_redundancy = solver_redundancy
         self.__proxy = proxy
         self.__chrome_args = chrome_args
         self.__moderation = moderation
+        self.__capture_network = capture_network
+        self.last_ttft = None
+        self.__transport = transport
+        self.__http = None
+        self.__parent_message_id = None
+        self.__user_data_dir = user_data_dir
+        self.__driver_path = driver_path
+        self.__skip_intro = skip_intro
+        self.__base_url = base_url.rstrip('/')
+        self.__chat_url = f'{self.__base_url}/chat'
+        self.__wait_policies = dict(Wait.default_policies, **wait_policies)
+        self.__cache = cache
+        self.__cache_context = (conversation_id, 0)
+        self.__credential_store = credential_store
+        self.__credential_key = credential_key or email or 'default'
+        if not credential_key and not email and session_token:
+            self.__credential_key = hashlib.sha256(
+                session_token.encode('utf-8')
+            ).hexdigest()[:16]
+        self.__credentials = None
+        # Every tab shares one WebDriver connection, commands for a tab are only
+        # sent while holding the lock with that tab switched to
+        self.__window_lock = RLock()
+        # Sends, streams and resets of the main conversation run one at a time,
+        # without holding the browser while a response is generated
+        self.__send_lock = Lock()
+        # When the running health probe took the browser, None if none is running
+        self.__probe_started = None
+        self.__main_window = None
+        self.__current_window = None
+        self.__tabs = set()
+        self.__memory_policy = memory_policy
+        self.__blocking_profile = blocking_profile
+        self.__messages = 0
+        self.__recycled = 0
+        self.__trimmed = 0
+        self.__reloaded = 0
+        # Responses rendered in each tab when it was last loaded, a reload renders
+        # them all again so only the responses added since count towards it
+        self.__reload_baselines = {}
+        self.__session_cache_path = (
+            os.path.join(user_data_dir, 'pyChatGPT_session.json')
+            if user_data_dir
+            else ''
+        )
+        self.startup_timings = {}
+        self.login_timings = {}
 
-        if not self.__session_token and (
-            not self.__email or not self.__password or not self.__auth_type
+        self.__session = {}
+        self.__session_expires = 0.0
+        self.session_cache_hits = 0
+        self.session_cache_misses = 0
+
+        if (
+            not self.__session_token
+            and not self.__user_data_dir
+            and not self.__credential_store
+            and (not self.__email or not self.__password or not self.__auth_type)
         ):
             raise ValueError(
                 'Please provide either a session token or login credentials'
@@ -103,6 +665,12 @@ class ChatGPT:
             raise ValueError('Invalid captcha solver')
         if self.__captcha_solver == '2captcha' and not self.__solver_apikey:
             raise ValueError('Please provide a 2captcha apikey')
+        if self.__solver_timeout <= 0 or self.__solver_redundancy < 1:
+            raise ValueError('Invalid captcha solver settings')
+        if self.__transport not in ['browser', 'http']:
+            raise ValueError('Invalid transport')
+        if self.__blocking_profile:
+            self.__blocking_profile.check(self.__base_url)
         if self.__proxy and not re.findall(
             r'(https?|socks(4|5)?):\/\/.+:\d{1,5}', self.__proxy
         ):
@@ -123,20 +691,35 @@ class ChatGPT:
                 subprocess.run(['ffdl', 'install'])
             os.environ['PATH'] += os.pathsep + ffdl.ffmpeg_dir
 
+        if self.__transport == 'http':
+            from .Http import HttpTransport
+
+            self.__http = HttpTransport(self.__base_url)
+
+        self.__load_session()
+        started = time.perf_counter()
         self.__init_browser()
+        self.startup_timings['total'] = time.perf_counter() - started
+        self.logger.debug(
+            'Startup timings: '
+            + ', '.join(f'{k}={v:.2f}s' for k, v in self.startup_timings.items())
+        )
         weakref.finalize(self, self.__del__)
 
     def __del__(self):
         '''
         Close the browser and display
         '''
-        self.__is_active = False
+        KeepAlive.scheduler.unregister(id(self))
+        if getattr(self, '_ChatGPT__http', None):
+            self.__http.close()
         if hasattr(self, 'driver'):
             self.logger.debug('Closing browser...')
             self.driver.quit()
+            del self.driver
         if hasattr(self, 'display'):
-            self.logger.debug('Closing display...')
-            self.display.stop()
+            Display.release()
+            del self.display
 
     def __init_logger(self, verbose: bool) -> None:
         '''
@@ -151,83 +734,149 @@ class ChatGPT:
             stream_handler.setFormatter(formatter)
             self.logger.addHandler(stream_handler)
 
-    def __init_browser(self) -> None:
+    def __init_browser(self, cookies: list = None) -> None:
         '''
-        Initialize the browser
+        Initialize the browser, recording the time spent in each phase\n
+        :param cookies: The cookies of a previous browser to restore
         '''
-        if platform.system() == 'Linux' and 'DISPLAY' not in os.environ:
-            self.logger.debug('Starting virtual display...')
-            try:
-                from pyvirtualdisplay import Display
-
-                self.display = Display()
-            except ModuleNotFoundError:
-                raise ValueError(
-                    'Please install PyVirtualDisplay to start a virtual display by running `pip install PyVirtualDisplay`'
-                )
-            except FileNotFoundError as e:
-                if 'No such file or directory: \'Xvfb\'' in str(e):
-                    raise ValueError(
-                        'Please install Xvfb to start a virtual display by running `sudo apt install xvfb`'
-                    )
-                raise e
-            self.display.start()
+        headless = any(i.startswith('--headless') for i in self.__chrome_args)
+        if (
+            not hasattr(self, 'display')
+            and platform.system() == 'Linux'
+            and not headless
+            and (Display.is_active() or 'DISPLAY' not in os.environ)
+        ):
+            with _timed(self.startup_timings, 'display'):
+                self.display = Display.acquire()
 
         self.logger.debug('Initializing browser...')
         options = uc.ChromeOptions()
         options.add_argument('--window-size=1024,768')
+        # Keep conversations in background tabs rendering at full speed
+        options.add_argument('--disable-background-timer-throttling')
+        options.add_argument('--disable-renderer-backgrounding')
+        options.add_argument('--disable-backgrounding-occluded-windows')
         if self.__proxy:
             options.add_argument(f'--proxy-server={self.__proxy}')
         for arg in self.__chrome_args:
             options.add_argument(arg)
-        try:
-            self.driver = uc.Chrome(options=options)
-        except TypeError as e:
-            if str(e) == 'expected str, bytes or os.PathLike object, not NoneType':
-                raise ValueError('Chrome installation not found')
-            raise e
-
-        if self.__login_cookies_path and os.path.exists(self.__login_cookies_path):
-            self.logger.debug('Restoring cookies...')
+        if self.__capture_network:
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        driver_cached = bool(self.__driver_path) and os.path.exists(self.__driver_path)
+        with _timed(self.startup_timings, 'browser'):
             try:
-                with open(self.__login_cookies_path, 'r', encoding='utf-8') as f:
-                    cookies = json.load(f)
+                self.driver = uc.Chrome(
+                    options=options,
+                    user_data_dir=self.__user_data_dir,
+                    driver_executable_path=(
+                        self.__driver_path if driver_cached else None
+                    ),
+                )
+            except TypeError as e:
+                if str(e) == 'expected str, bytes or os.PathLike object, not NoneType':
+                    raise ValueError('Chrome installation not found')
+                raise e
+        self.__main_window = self.__current_window = self.driver.current_window_handle
+        self.__tabs = set()
+        if self.__driver_path and not driver_cached:
+            self.logger.debug('Caching patched chromedriver...')
+            shutil.copy2(self.driver.patcher.executable_path, self.__driver_path)
+
+        with _timed(self.startup_timings, 'cookies'):
+            if self.__credential_store:
+                self.__restore_credentials(
+                    self.__credential_store.get(self.__credential_key)
+                )
+
+            if cookies:
+                self.logger.debug('Restoring cookies of the previous browser...')
+                self.driver.execute_cdp_cmd(
+                    'Network.setCookies',
+                    {'cookies': [to_cdp_cookie(i) for i in cookies]},
+                )
                 for cookie in cookies:
-                    if cookie['name'] == '__Secure-next-auth.session-token':
+                    if cookie['name'] == session_token_cookie:
                         self.__session_token = cookie['value']
-            except json.decoder.JSONDecodeError:
-                self.logger.debug(f'Invalid cookies file: {self.__login_cookies_path}')
 
-        if self.__session_token:
-            self.logger.debug('Restoring session_token...')
+            if self.__login_cookies_path and os.path.exists(self.__login_cookies_path):
+                self.logger.debug('Restoring cookies...')
+                try:
+                    with open(self.__login_cookies_path, 'r', encoding='utf-8') as f:
+                        cookies = json.load(f)
+                    for cookie in cookies:
+                        if cookie['name'] == session_token_cookie:
+                            self.__session_token = cookie['value']
+                except json.decoder.JSONDecodeError:
+                    self.logger.debug(
+                        f'Invalid cookies file: {self.__login_cookies_path}'
+                    )
+
+            if self.__session_token:
+                self.logger.debug('Restoring session_token...')
+                self.driver.execute_cdp_cmd(
+                    'Network.setCookie',
+                    {
+                        'domain': urlsplit(self.__base_url).hostname,
+                        'path': '/',
+                        'name': session_token_cookie,
+                        'value': self.__session_token,
+                        'httpOnly': True,
+                        'secure': True,
+                    },
+                )
+
+            self.__install_tab_hooks()
+
+        with _timed(self.startup_timings, 'session'):
+            self.__ensure_session()
+        if self.__http:
+            # Messages go over HTTP and the session is revalidated when it expires,
+            # the chat page and its keep-alive are never used
+            return
+
+        self.logger.debug('Opening chat page...')
+        with _timed(self.startup_timings, 'chat_page'):
+            self.driver.get(f'{self.__chat_url}/{self.__conversation_id}')
+        with _timed(self.startup_timings, 'blocking_elements'):
+            self.__check_blocking_elements()
+
+        KeepAlive.scheduler.register(id(self), self.__keep_alive)
+
+    def __install_tab_hooks(self) -> None:
+        '''
+        Install the conversation hook and blocked URLs in the current tab, both
+        only apply to the tab they are installed in
+        '''
+        self.logger.debug('Installing conversation hook...')
+        self.driver.execute_cdp_cmd(
+            'Page.addScriptToEvaluateOnNewDocument',
+            {'source': chatgpt_conversation_hook_js},
+        )
+        if self.__blocking_profile:
             self.driver.execute_cdp_cmd(
-                'Network.setCookie',
+                'Page.addScriptToEvaluateOnNewDocument',
                 {
-                    'domain': 'chat.openai.com',
-                    'path': '/',
-                    'name': '__Secure-next-auth.session-token',
-                    'value': self.__session_token,
-                    'httpOnly': True,
-                    'secure': True,
+                    'source': chatgpt_blocked_counter_js.replace(
+                        '__PATTERNS__', json.dumps(self.__blocking_profile.patterns)
+                    )
                 },
             )
+        self.__block_urls()
 
+    def __block_urls(self) -> None:
+        '''
+        Block the moderation requests and the requests of the blocking profile in
+        the current tab, one call as each replaces the previous list
+        '''
+        urls = []
         if not self.__moderation:
             self.logger.debug('Blocking moderation...')
-            self.driver.execute_cdp_cmd(
-                'Network.setBlockedURLs',
-                {'urls': ['https://chat.openai.com/backend-api/moderations']},
-            )
-
-        self.logger.debug('Ensuring Cloudflare cookies...')
-        self.__ensure_cf()
-
-        self.logger.debug('Opening chat page...')
-        self.driver.get(f'{chatgpt_chat_url}/{self.__conversation_id}')
-        self.__check_blocking_elements()
-
-        self.__is_active = True
-        Thread(target=self.__keep_alive, daemon=True).start()
+            urls.append(f'{self.__base_url}/backend-api/moderations')
+        if self.__blocking_profile:
+            self.logger.debug('Blocking resources...')
+            urls += self.__blocking_profile.patterns
+        if urls:
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
 
     def __ensure_cf(self, retry: int = 3) -> None:
         '''
@@ -237,12 +886,15 @@ class ChatGPT:
         self.logger.debug('Opening new tab...')
         original_window = self.driver.current_window_handle
         self.driver.switch_to.new_window('tab')
+        self.__block_urls()
 
         self.logger.debug('Getting Cloudflare challenge...')
-        self.driver.get('https://chat.openai.com/api/auth/session')
+        self.driver.get(f'{self.__base_url}/api/auth/session')
         try:
-            WebDriverWait(self.driver, 10).until_not(
-                EC.presence_of_element_located(cf_challenge_form)
+            self.__wait(
+                'cf_challenge',
+                EC.presence_of_element_located(cf_challenge_form),
+                until_not=True,
             )
         except SeleniumExceptions.TimeoutException:
             self.logger.debug(f'Cloudflare challenge failed, retrying {retry}...')
@@ -264,54 +916,356 @@ class ChatGPT:
             'error' in response and response['error'] == 'RefreshAccessTokenError'
         ):
             self.logger.debug('Authorization is invalid')
-            if not self.__auth_type:
-                raise ValueError('Invalid session token')
-            self.__login()
+            self.__invalidate_session()
+            if self.__refresh_credentials():
+                self.logger.debug('Closing tab...')
+                self.driver.close()
+                self.driver.switch_to.window(original_window)
+                return self.__ensure_cf(retry)
+        else:
+            self.__cache_session(response)
+            cookies = self.driver.get_cookies()
+            user_agent = self.driver.execute_script('return navigator.userAgent')
+            if self.__http:
+                self.__http.set_credentials(
+                    response.get('accessToken'), cookies, user_agent
+                )
+            if self.__credential_store and self.__session:
+                self.__credentials = self.__collect_credentials(cookies, user_agent)
+                self.__credential_store.set(self.__credential_key, self.__credentials)
         self.logger.debug('Authorization is valid')
 
         self.logger.debug('Closing tab...')
         self.driver.close()
         self.driver.switch_to.window(original_window)
 
-    def __check_capacity(self, target_url: str):
+    def __is_session_cached(self) -> bool:
+        '''
+        Check if the cached session can be used without revalidating it, without
+        touching the browser\n
+        :return: Boolean indicating if the cached session is unexpired
+        '''
+        return bool(
+            self.__session
+            and time.time() < self.__session_expires
+            and (not self.__http or self.__http.headers)
+        )
+
+    def __ensure_session(self) -> None:
+        '''
+        Ensure the session is valid, reusing the cached session until it expires
+        '''
+        if self.__is_session_cached():
+            self.session_cache_hits += 1
+            return self.logger.debug('Session cache hit')
+
+        self.session_cache_misses += 1
+        self.logger.debug('Ensuring Cloudflare cookies...')
+        self.__ensure_cf()
+
+    def __cache_session(self, response: dict) -> None:
+        '''
+        Cache the session returned by the auth endpoint until it expires\n
+        :param response: The parsed `/api/auth/session` response
+        '''
+        try:
+            expires = (
+                datetime.strptime(response['expires'], '%Y-%m-%dT%H:%M:%S.%fZ')
+                .replace(tzinfo=timezone.utc)
+                .timestamp()
+            )
+        except (KeyError, TypeError, ValueError):
+            self.logger.debug('Session expiry not found, skipping cache')
+            return self.__invalidate_session()
+
+        self.__session = {
+            'access_token': response.get('accessToken'),
+            'expires': expires,
+        }
+        # Revalidate a minute early so a send never races the expiry
+        self.__session_expires = expires - 60
+        self.logger.debug(f'Session cached for {int(expires - time.time())}s')
+
+        if self.__session_cache_path:
+            with open(self.__session_cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self.__session, f)
+
+    def __load_session(self) -> None:
+        '''
+        Load the session cached in the browser profile by a previous run
+        '''
+        if not self.__session_cache_path or not os.path.exists(
+            self.__session_cache_path
+        ):
+            return
+        try:
+            with open(self.__session_cache_path, 'r', encoding='utf-8') as f:
+                session = json.load(f)
+            self.__session = session
+            self.__session_expires = session['expires'] - 60
+            self.logger.debug('Restored cached session from profile')
+        except (json.decoder.JSONDecodeError, KeyError, TypeError):
+            self.logger.debug(f'Invalid session cache: {self.__session_cache_path}')
+            self.__invalidate_session()
+
+    def __invalidate_session(self) -> None:
+        '''
+        Drop the cached session so the next call revalidates it
+        '''
+        self.__session = {}
+        self.__session_expires = 0.0
+        if self.__session_cache_path and os.path.exists(self.__session_cache_path):
+            os.remove(self.__session_cache_path)
+
+    def __collect_credentials(self, cookies: list, user_agent: str) -> dict:
+        '''
+        Build the credentials kept in the credential store\n
+        :param cookies: The cookie jar of the ChatGPT site
+        :param user_agent: The user agent the Cloudflare clearance was issued to
+        :return: The credentials
+        '''
+        return {
+            'cookies': cookies,
+            'access_token': self.__session.get('access_token'),
+            'expires': self.__session.get('expires', 0),
+            'cf_clearance_expires': next(
+                (i.get('expiry') for i in cookies if i['name'] == 'cf_clearance'),
+                None,
+            ),
+            'user_agent': user_agent,
+            'updated': time.time(),
+        }
+
+    def __restore_credentials(self, credentials: dict) -> None:
+        '''
+        Load credentials from the credential store into the browser, reusing the
+        access token until it expires\n
+        :param credentials: The stored credentials
+        '''
+        if not credentials:
+            return self.logger.debug('No stored credentials')
+
+        self.logger.debug('Restoring stored credentials...')
+        self.__credentials = credentials
+        now = time.time()
+        cookies = [i for i in credentials['cookies'] if i.get('expiry', now) >= now]
+        self.driver.execute_cdp_cmd(
+            'Network.setCookies', {'cookies': [to_cdp_cookie(i) for i in cookies]}
+        )
+        for cookie in cookies:
+            if cookie['name'] == session_token_cookie:
+                self.__session_token = cookie['value']
+
+        if is_fresh(credentials):
+            self.__session = {
+                'access_token': credentials['access_token'],
+                'expires': credentials['expires'],
+            }
+            self.__session_expires = credentials['expires'] - 60
+            if self.__http:
+                self.__http.set_credentials(
+                    credentials['access_token'],
+                    cookies,
+                    credentials.get('user_agent', ''),
+                )
+
+    def __refresh_credentials(self) -> bool:
+        '''
+        Login again, or wait for the worker already logging in with the same
+        credential key and reuse its cookies\n
+        :return: Boolean indicating if another worker refreshed the credentials
+        '''
+        if not self.__credential_store:
+            if not self.__auth_type:
+                raise ValueError('Invalid session token')
+            self.__login()
+            return False
+
+        def login() -> dict:
+            if not self.__auth_type:
+                raise ValueError('Invalid session token')
+            self.__login()
+            return self.__collect_credentials(
+                self.driver.get_cookies(),
+                self.driver.execute_script('return navigator.userAgent'),
+            )
+
+        self.logger.debug('Refreshing credentials...')
+        credentials, refreshed = self.__credential_store.refresh(
+            self.__credential_key, login, self.__credentials
+        )
+        if refreshed:
+            self.__credentials = credentials
+            return False
+        self.logger.debug('Credentials were refreshed by another worker')
+        self.__restore_credentials(credentials)
+        return True
+
+    def __is_auth_failure(self, error: Exception) -> bool:
+        '''
+        Check if a failed send was caused by an expired session or Cloudflare\n
+        :param error: The exception raised while sending
+        :return: Boolean indicating if the session should be revalidated
+        '''
+        if isinstance(error, ValueError) and chatgpt_auth_error.search(str(error)):
+            return True
+        try:
+            if self.driver.find_elements(*cf_challenge_form):
+                return True
+            return not self.driver.current_url.startswith(self.__chat_url)
+        except SeleniumExceptions.WebDriverException:
+            return False
+
+    @contextmanager
+    def __in_window(self, window: str = None):
+        '''
+        Hold the browser with a tab switched to\n
+        :param window: The window handle of the tab (the main window if None)
+        '''
+        with self.__window_lock:
+            window = window or self.__main_window
+            if window != self.__current_window:
+                self.driver.switch_to.window(window)
+                self.__current_window = window
+            yield
+
+    def __poll_in_window(self, method, window: str = None):
+        '''
+        Wrap a wait condition so each poll holds the browser, releasing it in between\n
+        :param method: The condition, called with the driver
+        :param window: The window handle of the tab to poll (the main window if None)
+        :return: The wrapped condition
+        '''
+
+        def poll(driver):
+            with self.__in_window(window):
+                return method(driver)
+
+        return poll
+
+    def open_conversation(self, conversation_id: str = '') -> Conversation:
         '''
-        Check if ChatGPT is at capacity\n
+        Open a conversation in a new tab of the browser, tabs can send and stream
+        at the same time for a fraction of the memory of another session\n
+        :param conversation_id: The ID of the conversation to open (a new conversation if empty)
+        :return: Conversation sending messages in the tab
+        '''
+        if self.__http or self.__capture_network:
+            raise ValueError('Conversations in tabs need the browser transport')
+
+        with self.__window_lock:
+            self.logger.debug('Opening conversation tab...')
+            self.driver.switch_to.new_window('tab')
+            window = self.__current_window = self.driver.current_window_handle
+            self.__tabs.add(window)
+            try:
+                self.__install_tab_hooks()
+                self.__ensure_session()
+                chat_url = f'{self.__chat_url}/{conversation_id}'
+                self.driver.get(chat_url)
+                self.__check_capacity(chat_url)
+                self.__check_blocking_elements()
+            except Exception as e:
+                self.__close_conversation(window)
+                raise e
+        return Conversation(self, window, conversation_id)
+
+    @property
+    def open_conversations(self) -> int:
+        '''
+        The number of conversations open in tabs
+        '''
+        return len(self.__tabs)
+
+    def __close_conversation(self, window: str) -> None:
+        '''
+        Close the tab of a conversation\n
+        :param window: The window handle of the tab
+        '''
+        with self.__window_lock:
+            if window not in self.__tabs:
+                return
+            self.logger.debug('Closing conversation tab...')
+            self.__tabs.discard(window)
+            self.__reload_baselines.pop(window, None)
+            try:
+                with self.__in_window(window):
+                    self.driver.close()
+            except SeleniumExceptions.WebDriverException as e:
+                self.logger.debug(f'Closing tab failed: {str(e)}')
+            self.driver.switch_to.window(self.__main_window)
+            self.__current_window = self.__main_window
+
+    def __wait(self, name: str, method, until_not: bool = False):
+        '''
+        Wait for a condition using the wait policy of a call site\n
+        :param name: The call site (a key of `Wait.default_policies`)
+        :param method: The condition, called with the driver
+        :param until_not: Whether to wait for the condition to become falsy
+        :return: The value returned by the condition
+        '''
+        policy = self.__wait_policies[name]
+        if until_not:
+            return policy.until_not(self.driver, method, name)
+        return policy.until(self.driver, method, name)
+
+    def __check_capacity(self, target_url: str, retries: int = 4):
+        '''
+        Check if ChatGPT is at capacity, reloading with a jittered backoff while it is\n
         :param target_url: URL to retry if ChatGPT is at capacity
+        :param retries: Number of reloads before giving up
         '''
-        while True:
+        # Stop waiting as soon as the page renders either the banner or its content
+        page_rendered = (
+            By.XPATH,
+            f'{chatgpt_capacity[1]} | //textarea | {chatgpt_login_btn[1]}',
+        )
+        for attempt in range(retries + 1):
             try:
                 self.logger.debug('Checking if ChatGPT is at capacity...')
-                WebDriverWait(self.driver, 3).until(
-                    EC.presence_of_element_located(
-                        (By.XPATH, '//div[text()="ChatGPT is at capacity right now"]')
-                    )
+                element = self.__wait(
+                    'capacity', EC.presence_of_element_located(page_rendered)
                 )
-                self.logger.debug('ChatGPT is at capacity, retrying...')
-                self.driver.get(target_url)
             except SeleniumExceptions.TimeoutException:
-                self.logger.debug('ChatGPT is not at capacity')
+                element = None
+            if not element or element.tag_name != 'div':
+                return self.logger.debug('ChatGPT is not at capacity')
+            if attempt == retries:
                 break
+            delay = backoff(attempt, 2)
+            self.logger.debug(f'ChatGPT is at capacity, retrying in {delay:.1f}s...')
+            time.sleep(delay)
+            self.driver.get(target_url)
+        raise CapacityError('ChatGPT is at capacity right now')
 
     def __login(self) -> None:
         '''
-        Login to ChatGPT
+        Login to ChatGPT, recording the time spent in each phase in `login_timings`
+        '''
+        self.login_timings = {}
+        try:
+            self.__login_phases()
+        finally:
+            for name, seconds in self.login_timings.items():
+                metrics.observe(f'login.{name}', seconds)
+
+    def __login_phases(self) -> None:
+        '''
+        Open the login page, login with the provider and save the cookies
         '''
         self.logger.debug('Opening new tab...')
         original_window = self.driver.current_window_handle
         self.driver.switch_to.new_window('tab')
 
-        self.logger.debug('Opening login page...')
-        self.driver.get('https://chat.openai.com/auth/login')
-        self.__check_capacity('https://chat.openai.com/auth/login')
+        with _timed(self.login_timings, 'login_page'):
+            self.logger.debug('Opening login page...')
+            self.driver.get(f'{self.__base_url}/auth/login')
+            self.__check_capacity(f'{self.__base_url}/auth/login')
 
-        self.logger.debug('Clicking login button...')
-        WebDriverWait(self.driver, 5).until(
-            EC.element_to_be_clickable(chatgpt_login_btn)
-        ).click()
+            self.logger.debug('Clicking login button...')
+            self.__wait('login', EC.element_to_be_clickable(chatgpt_login_btn)).click()
 
-        WebDriverWait(self.driver, 5).until(
-            EC.presence_of_element_located(chatgpt_login_h1)
-        )
+            self.__wait('login', EC.presence_of_element_located(chatgpt_login_h1))
 
         from . import Auth0
 
@@ -319,9 +1273,8 @@ class ChatGPT:
 
         self.logger.debug('Checking if login was successful')
         try:
-            WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located(chatgpt_logged_h1)
-            )
+            with _timed(self.login_timings, 'confirm'):
+                self.__wait('login', EC.presence_of_element_located(chatgpt_logged_h1))
             if self.__login_cookies_path:
                 self.logger.debug('Saving cookies...')
                 with open(self.__login_cookies_path, 'w', encoding='utf-8') as f:
@@ -329,7 +1282,7 @@ class ChatGPT:
                         [
                             i
                             for i in self.driver.get_cookies()
-                            if i['name'] == '__Secure-next-auth.session-token'
+                            if i['name'] == session_token_cookie
                         ],
                         f,
                     )
@@ -341,25 +1294,135 @@ class ChatGPT:
         self.driver.close()
         self.driver.switch_to.window(original_window)
 
-    def __keep_alive(self) -> None:
+    def __keep_alive(self) -> bool:
         '''
         Keep the session alive by updating the local storage\n
-        Credit to Rawa#8132 in the ChatGPT Hacking Discord server
+        Credit to Rawa#8132 in the ChatGPT Hacking Discord server\n
+        :return: Whether the session was updated, False if the browser was busy
         '''
-        while self.__is_active:
+        # A busy browser is being kept alive by the message it is sending
+        if not self.__window_lock.acquire(blocking=False):
+            self.logger.debug('Browser is busy, skipping keep-alive')
+            return False
+        try:
             self.logger.debug('Updating session...')
             payload = (
                 '{"event":"session","data":{"trigger":"getSession"},"timestamp":%d}'
                 % int(time.time())
             )
-            try:
+            with self.__in_window():
                 self.driver.execute_script(
                     'window.localStorage.setItem("nextauth.message", arguments[0])',
                     payload,
                 )
-            except Exception as e:
-                self.logger.debug(f'Failed to update session: {str(e)}')
-            time.sleep(60)
+            return True
+        finally:
+            self.__window_lock.release()
+
+    @property
+    def keep_alive_last_success(self) -> float:
+        '''
+        The timestamp of the last successful keep-alive, or None if none succeeded yet
+        '''
+        return KeepAlive.scheduler.last_success(id(self))
+
+    def health(self, timeout: float = 5) -> dict:
+        '''
+        Check the session without loading anything: the cached session expiry,
+        and whether the browser answers and shows the chat textarea, with at most
+        one script in the main tab. A browser busy sending is not waited for, a
+        browser still running the script of an earlier probe has hung\n
+        :param timeout: Seconds to wait for the browser to answer
+        :return: Dictionary with keys `live` (the browser answers or is busy), `ready` (a message can be sent right away), `checks` (`driver`, `session` and `page` statuses), `expires_in` (seconds until the session expires, None if unknown), `url`, `keep_alive_age` (seconds since the last keep-alive, None if none succeeded yet) and `timings` (seconds)
+        '''
+        start_time = time.time()
+        checks = {'driver': 'closed', 'session': 'unknown', 'page': 'unknown'}
+        timings = {}
+
+        expires_in = None
+        if self.__session:
+            expires_in = self.__session['expires'] - start_time
+            if expires_in <= 0:
+                checks['session'] = 'expired'
+            elif expires_in < 60:
+                # The next send revalidates it first
+                checks['session'] = 'expiring'
+            else:
+                checks['session'] = 'ok'
+
+        page = {}
+        probe_started = self.__probe_started
+        if probe_started and start_time - probe_started >= timeout:
+            # The browser never answered an earlier probe and still holds it
+            checks['driver'] = 'timeout'
+            timings['driver'] = start_time - probe_started
+        elif hasattr(self, 'driver'):
+            probe = Thread(target=self.__probe_page, args=(page,), daemon=True)
+            probe.start()
+            probe.join(timeout)
+            timings['driver'] = time.time() - start_time
+            metrics.observe('health.driver', timings['driver'])
+            if probe.is_alive():
+                checks['driver'] = 'timeout'
+            elif 'error' in page:
+                checks['driver'] = 'error'
+                self.logger.debug(f'Health check failed: {page["error"]}')
+            else:
+                checks['driver'] = 'busy' if page.get('busy') else 'ok'
+
+        if checks['driver'] == 'ok':
+            if page['ready_state'] == 'loading':
+                checks['page'] = 'loading'
+            elif page['login']:
+                checks['page'] = 'logged_out'
+            elif page['capacity']:
+                checks['page'] = 'capacity'
+            elif not page['textarea'] and not self.__http:
+                checks['page'] = 'no_textarea'
+            else:
+                checks['page'] = 'ok'
+
+        ready = (
+            checks['driver'] == 'ok'
+            and checks['page'] == 'ok'
+            and checks['session'] != 'expired'
+        )
+        keep_alive = self.keep_alive_last_success
+        timings['total'] = time.time() - start_time
+        return {
+            'live': checks['driver'] in ['ok', 'busy'],
+            'ready': ready,
+            'checks': checks,
+            'expires_in': expires_in,
+            'url': page.get('url'),
+            'keep_alive_age': start_time - keep_alive if keep_alive else None,
+            'timings': timings,
+        }
+
+    def __probe_page(self, page: dict) -> None:
+        '''
+        Read the state of the main tab for `health()`, unless the browser is busy\n
+        :param page: Dictionary the state is written to, `busy` or `error` if it was not read
+        '''
+        if not self.__window_lock.acquire(blocking=False):
+            page['busy'] = True
+            return
+        self.__probe_started = time.time()
+        try:
+            with self.__in_window():
+                page.update(
+                    self.driver.execute_script(
+                        chatgpt_health_js,
+                        chatgpt_textbox[1],
+                        chatgpt_capacity[1],
+                        chatgpt_login_btn[1],
+                    )
+                )
+        except Exception as e:
+            page['error'] = str(e)
+        finally:
+            self.__probe_started = None
+            self.__window_lock.release()
 
     def __check_blocking_elements(self) -> None:
         '''
@@ -367,12 +1430,22 @@ class ChatGPT:
         '''
         self.logger.debug('Looking for blocking elements...')
         try:
-            intro = WebDriverWait(self.driver, 3).until(
-                EC.presence_of_element_located(chatgpt_intro)
-            )
-            self.logger.debug('Dismissing intro...')
-            self.driver.execute_script('arguments[0].remove()', intro)
-        except SeleniumExceptions.TimeoutException:
+            if self.__skip_intro:
+                intro = self.driver.find_element(*chatgpt_intro)
+            else:
+                intro = self.__wait(
+                    'intro',
+                    lambda driver: driver.execute_script(
+                        chatgpt_intro_js, chatgpt_intro[1], chatgpt_textbox[1]
+                    ),
+                )
+            if intro is not True:
+                self.logger.debug('Dismissing intro...')
+                self.driver.execute_script('arguments[0].remove()', intro)
+        except (
+            SeleniumExceptions.TimeoutException,
+            SeleniumExceptions.NoSuchElementException,
+        ):
             pass
 
         alerts = self.driver.find_elements(*chatgpt_alert)
@@ -380,37 +1453,192 @@ class ChatGPT:
             self.logger.debug('Dismissing alert...')
             self.driver.execute_script('arguments[0].remove()', alerts[0])
 
-    def __stream_message(self):
-        prev_content = ''
+    def __install_stream_observer(self, resume: bool = False) -> None:
+        '''
+        Install the MutationObserver tracking the next response\n
+        :param resume: Whether to track the last response instead of waiting for a new one
+        '''
+        self.logger.debug('Installing stream observer...')
+        self.driver.execute_script(
+            chatgpt_stream_observer_js,
+            chatgpt_small_response[1],
+            chatgpt_big_response[1],
+            chatgpt_streaming[1],
+            resume,
+        )
+
+    def __stream_message(
+        self,
+        poll_timeout: int = 10,
+        timeout: int = 120,
+        window: str = None,
+        tab_interval: float = 0.05,
+    ):
+        '''
+        Stream the response pushed by the stream observer, converting it to markdown\n
+        :param poll_timeout: Seconds a single long-poll waits for new text
+        :param timeout: Seconds to wait without any new text before giving up
+        :param window: The window handle of the tab to stream from (the main window if None)
+        :param tab_interval: Seconds between polls while tabs are open, the browser is released in between
+        :return: Generator yielding the new markdown of the response, returning the whole markdown
+        '''
+        converter = IncrementalMarkdown()
+        version = -1
+        deadline = time.time() + timeout
         while True:
-            result_streaming = self.driver.find_elements(*chatgpt_streaming)
-            responses = self.driver.find_elements(*chatgpt_big_response)
-            if responses:
-                response = responses[-1]
-                if 'text-red' in response.get_attribute('class'):
-                    self.logger.debug('Response is an error')
-                    raise ValueError(response.text)
-            response = self.driver.find_elements(*chatgpt_small_response)[-1]
-            content = response.text
-            if content != prev_content:
-                yield content[len(prev_content) :]
-                prev_content = content
-            if not result_streaming:
-                break
+            # A long-poll would hold the browser, so poll every tab in turn instead
+            shared = bool(self.__tabs)
+            with self.__in_window(window):
+                state = self.driver.execute_async_script(
+                    chatgpt_stream_poll_js,
+                    converter.finalized,
+                    version,
+                    0 if shared else poll_timeout * 1000,
+                )
+                if state is None:
+                    self.logger.debug('Stream observer lost, reinstalling...')
+                    self.__install_stream_observer(resume=True)
+                    version = -1
+                    continue
+            if state['error']:
+                self.logger.debug('Response is an error')
+                raise response_error(state['error'])
+            with metrics.span('send_message.convert'):
+                delta = converter.update(state['blocks'], state['done'])
+            if delta:
+                yield delta
+                deadline = time.time() + timeout
+            elif shared and state['version'] == version:
+                time.sleep(tab_interval)
+            version = state['version']
+            if state['done']:
+                return converter.text
+            if time.time() > deadline:
+                raise SeleniumExceptions.TimeoutException('Response timed out')
+
+    def stream_message(self, message: str) -> 'MessageStream':
+        '''
+        Send a message to ChatGPT and stream the response\n
+        Closing the stream before it finishes stops the generation\n
+        :param message: Message to send
+        :return: MessageStream yielding the new text of the response
+        '''
+        with self.__in_window():
+            self.__ensure_session()
+        return MessageStream(self.__hold_send_lock(self.__generate_message(message)))
+
+    def __hold_send_lock(self, generator):
+        '''
+        Hold the main conversation from the first read of a stream until it is
+        exhausted or closed\n
+        :param generator: Generator yielding the new text of the response
+        :return: Generator yielding the same text, returning what the generator returns
+        '''
+        with self.__send_lock:
+            return (yield from generator)
 
     def send_message(self, message: str, stream: bool = False) -> dict:
         '''
-        Send a message to ChatGPT\n
+        Send a message to ChatGPT, answering from the cache if one is set\n
+        A cached answer does not advance the conversation in the browser\n
         :param message: Message to send
+        :param stream: Whether to print the response as it streams
         :return: Dictionary with keys `message` and `conversation_id`
         '''
-        self.logger.debug('Ensuring Cloudflare cookies...')
-        self.__ensure_cf()
+        if self.__cache is None:
+            return self.__send_revalidating(message, stream)
 
-        self.logger.debug('Sending message...')
-        textbox = WebDriverWait(self.driver, 5).until(
-            EC.element_to_be_clickable(chatgpt_textbox)
+        from .Cache import cache_key
+
+        response, source = self.__cache.fetch(
+            cache_key(message, *self.__cache_context),
+            lambda: self.__send_revalidating(message, stream),
         )
+        if source != 'miss':
+            self.logger.debug(f'Response cache {source}')
+            metrics.observe(f'send_message.cache_{source}', 1)
+            if stream:
+                print(response['message'])
+        return response
+
+    def __send_revalidating(self, message: str, stream: bool) -> dict:
+        '''
+        Send a message, revalidating the session and retrying once on an auth failure\n
+        :param message: Message to send
+        :param stream: Whether to print the response as it streams
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        with metrics.span('send_message.total', stream=stream), self.__send_lock:
+            with self.__in_window():
+                with metrics.span('send_message.ensure_session'):
+                    self.__ensure_session()
+                chat_url = self.driver.current_url
+            try:
+                return self.__send_message(message, stream)
+            except (ValueError, SeleniumExceptions.TimeoutException) as e:
+                with self.__in_window():
+                    if not self.__is_auth_failure(e):
+                        raise e
+                    self.logger.debug(
+                        'Send failed with an auth symptom, revalidating...'
+                    )
+                    self.__invalidate_session()
+                    with metrics.span('send_message.ensure_session'):
+                        self.__ensure_session()
+                    if not self.__http:
+                        if not chat_url.startswith(self.__chat_url):
+                            chat_url = self.__chat_url
+                        self.driver.get(chat_url)
+                        self.__check_capacity(chat_url)
+                        self.__check_blocking_elements()
+                return self.__send_message(message, stream)
+
+    def __send_message(self, message: str, stream: bool) -> dict:
+        '''
+        Type a message into the chat page and wait for the response\n
+        :param message: Message to send
+        :param stream: Whether to print the response as it streams
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        if stream:
+            response = MessageStream(self.__generate_message(message))
+            for i in response:
+                print(i, end='', flush=True)
+            print()
+            return response.result
+        if self.__http:
+            response = MessageStream(self.__generate_message(message))
+            for _ in response:
+                pass
+            return response.result
+
+        with self.__in_window():
+            self.__type_message(message)
+
+        if not self.__capture_network:
+            # Other tabs keep streaming while this one generates
+            self.logger.debug('Waiting for completion...')
+            with metrics.span('send_message.generation'):
+                self.__wait(
+                    'generation',
+                    self.__poll_in_window(
+                        EC.presence_of_element_located(chatgpt_streaming)
+                    ),
+                    until_not=True,
+                )
+        return self.__get_response()
+
+    def __type_message(self, message: str, stream: bool = False) -> None:
+        '''
+        Type a message into the chat page and submit it\n
+        :param message: Message to send
+        :param stream: Whether to install the stream observer before submitting
+        '''
+        self.logger.debug('Sending message...')
+        with metrics.span('send_message.wait_textbox'):
+            textbox = self.__wait(
+                'textbox', EC.element_to_be_clickable(chatgpt_textbox)
+            )
         textbox.click()
         self.driver.execute_script(
             '''
@@ -421,50 +1649,402 @@ class ChatGPT:
             textbox,
             message,
         )
+        if stream:
+            self.__install_stream_observer()
+        if self.__capture_network:
+            self.driver.get_log('performance')
+        from selenium.webdriver.common.keys import Keys
+
         textbox.send_keys(Keys.ENTER)
 
-        if stream:
-            for i in self.__stream_message():
-                print(i, end='')
-                time.sleep(0.1)
-            return print()
-
-        self.logger.debug('Waiting for completion...')
-        WebDriverWait(self.driver, 120).until_not(
-            EC.presence_of_element_located(chatgpt_streaming)
+    def __generate_message(self, message: str, window: str = None):
+        '''
+        Send a message and yield the response as it streams\n
+        :param message: Message to send
+        :param window: The window handle of the tab to send in (the main window if None)
+        :return: Generator yielding the new text of the response, returning the final response
+        '''
+        if self.__http:
+            return (yield from self.__generate_http_message(message))
+
+        with self.__in_window(window):
+            if window:
+                self.__ensure_session()
+            self.__type_message(message, stream=True)
+        try:
+            content = yield from self.__measure_stream(
+                self.__stream_message(window=window)
+            )
+        except GeneratorExit:
+            with self.__in_window(window):
+                self.__stop_generating()
+            raise
+        with self.__in_window(window):
+            if not window:
+                return self.__get_response(content)
+            response = {
+                'message': content,
+                'conversation_id': self.__get_conversation_id(),
+            }
+            self.__manage_memory()
+            return response
+
+    def __measure_stream(self, generator):
+        '''
+        Record the time to first token and tokens per second of a stream\n
+        :param generator: Generator yielding the new text of the response
+        :return: Generator yielding the same text, returning what the generator returns
+        '''
+        if not metrics.enabled:
+            return (yield from generator)
+
+        started = time.perf_counter()
+        first = None
+        length = 0
+        try:
+            while True:
+                try:
+                    delta = next(generator)
+                except StopIteration as e:
+                    result = e.value
+                    break
+                if first is None:
+                    first = time.perf_counter()
+                    metrics.observe('send_message.ttft', first - started)
+                length += len(delta)
+                yield delta
+        finally:
+            generator.close()
+
+        elapsed = time.perf_counter() - first if first else 0.0
+        if elapsed:
+            # Roughly four characters per token for English text
+            metrics.observe('send_message.tokens_per_sec', length / 4 / elapsed)
+        return result
+
+    def __generate_http_message(self, message: str):
+        '''
+        Send a message over HTTP and yield the response as it streams\n
+        :param message: Message to send
+        :return: Generator yielding the new text of the response, returning the final response
+        '''
+        if self.__conversation_id and not self.__parent_message_id:
+            self.logger.debug('Getting current node of conversation...')
+            self.__parent_message_id = self.__http.get_conversation(
+                self.__conversation_id
+            )['current_node']
+
+        response = yield from self.__measure_stream(
+            self.__http.stream_conversation(
+                message, self.__conversation_id, self.__parent_message_id
+            )
         )
+        self.__conversation_id = response['conversation_id']
+        self.__parent_message_id = response['message_id']
+        self.__advance_cache_context(self.__conversation_id)
+        return response
 
-        self.logger.debug('Getting response...')
-        responses = self.driver.find_elements(*chatgpt_big_response)
-        if responses:
-            response = responses[-1]
-            if 'text-red' in response.get_attribute('class'):
-                self.logger.debug('Response is an error')
-                raise ValueError(response.text)
-        response = self.driver.find_elements(*chatgpt_small_response)[-1]
+    def __stop_generating(self) -> None:
+        '''
+        Stop the response that is being generated
+        '''
+        self.logger.debug('Stopping generation...')
+        try:
+            self.driver.find_element(*chatgpt_stop_generating).click()
+        except SeleniumExceptions.WebDriverException:
+            self.logger.debug('Stop generating button not found')
+
+    def __get_response(self, content: str = None) -> dict:
+        '''
+        Get the last response once it has finished\n
+        :param content: The markdown already converted while streaming, if any
+        :return: Dictionary with keys `message` and `conversation_id`
+        '''
+        if self.__capture_network:
+            with metrics.span('send_message.generation'):
+                response = self.__capture_response()
+            self.__conversation_id = response['conversation_id']
+            self.__advance_cache_context(self.__conversation_id)
+            with self.__in_window():
+                self.__manage_memory()
+            return response
+
+        with self.__in_window():
+            if content is None:
+                self.logger.debug('Getting response...')
+                responses = self.driver.find_elements(*chatgpt_big_response)
+                if responses:
+                    response = responses[-1]
+                    if 'text-red' in response.get_attribute('class'):
+                        self.logger.debug('Response is an error')
+                        raise response_error(response.text)
+                blocks = self.driver.execute_script(
+                    chatgpt_last_response_js, chatgpt_small_response[1]
+                )
+                with metrics.span('send_message.convert'):
+                    content = convert_blocks(blocks)
+
+            with metrics.span('send_message.conversation_id'):
+                self.__conversation_id = self.__get_conversation_id()
+            self.__advance_cache_context(self.__conversation_id)
+            self.__manage_memory()
+        return {'message': content, 'conversation_id': self.__conversation_id}
+
+    def __manage_memory(self) -> None:
+        '''
+        Count a message answered in the browser, reloading or trimming the current
+        tab and restarting the browser as the memory policy says
+        '''
+        policy = self.__memory_policy
+        if not policy:
+            return
+        self.__messages += 1
+        recycle = bool(policy.max_messages) and self.__messages >= policy.max_messages
+        if self.__messages % policy.check_interval == 0:
+            if policy.max_responses and policy.trim:
+                trimmed, dom_nodes = self.driver.execute_script(
+                    chatgpt_trim_responses_js,
+                    chatgpt_small_response[1],
+                    policy.max_responses,
+                )
+                self.__trimmed += trimmed
+                metrics.observe('memory.dom_nodes', dom_nodes)
+                self.logger.debug(
+                    f'Trimmed {trimmed} responses, {dom_nodes} nodes left'
+                )
+            elif policy.max_responses:
+                responses, dom_nodes = self.driver.execute_script(
+                    chatgpt_count_responses_js, chatgpt_small_response[1]
+                )
+                metrics.observe('memory.dom_nodes', dom_nodes)
+                window = self.__current_window
+                baseline = self.__reload_baselines.setdefault(window, responses)
+                if responses < baseline:
+                    # The conversation was reset since
+                    self.__reload_baselines[window] = responses
+                elif responses - baseline > policy.max_responses:
+                    self.__reload_conversation()
+                    self.__reload_baselines[window] = responses
+            if policy.max_rss:
+                rss = process_tree_rss(self.driver.browser_pid)
+                metrics.observe('memory.rss', rss)
+                recycle = recycle or rss > policy.max_rss
+        if not recycle:
+            return
+        if self.__tabs:
+            return self.logger.debug('Conversation tabs are open, postponing recycle')
+        self.__recycle_browser()
+
+    def __reload_conversation(self) -> None:
+        '''
+        Reload the conversation in the current tab, dropping what the page
+        accumulated while streaming
+        '''
+        self.logger.debug('Reloading conversation...')
+        started = time.perf_counter()
+        chat_url = self.driver.current_url
+        if not chat_url.startswith(self.__chat_url):
+            chat_url = self.__chat_url
+        self.driver.get(chat_url)
+        self.__check_capacity(chat_url)
+        self.__check_blocking_elements()
+        self.__reloaded += 1
+        metrics.observe('memory.reload', time.perf_counter() - started)
+
+    def __recycle_browser(self) -> None:
+        '''
+        Restart the browser to release its memory, reopening the current conversation
+        '''
+        self.logger.debug(f'Recycling browser after {self.__messages} messages...')
+        started = time.perf_counter()
+        cookies = self.driver.get_cookies()
+        self.driver.quit()
+        self.__reload_baselines.clear()
+        self.__init_browser(cookies)
+        self.__messages = 0
+        self.__recycled += 1
+        metrics.observe('memory.recycle', time.perf_counter() - started)
+
+    def memory_stats(self) -> dict:
+        '''
+        Get the memory used by the browser of the session\n
+        :return: Dictionary with keys `rss` (bytes, of the browser and its child processes), `dom_nodes` and `js_heap` (bytes, of the main tab), `tabs`, `messages` (since the browser started), `recycled`, `reloaded` and `trimmed`
+        '''
+        with self.__in_window():
+            dom_nodes, js_heap = self.driver.execute_script(chatgpt_memory_js)
+        rss = process_tree_rss(self.driver.browser_pid)
+        metrics.observe('memory.rss', rss)
+        metrics.observe('memory.dom_nodes', dom_nodes)
+        return {
+            'rss': rss,
+            'dom_nodes': dom_nodes,
+            'js_heap': js_heap,
+            'tabs': len(self.__tabs),
+            'messages': self.__messages,
+            'recycled': self.__recycled,
+            'reloaded': self.__reloaded,
+            'trimmed': self.__trimmed,
+        }
+
+    def resource_stats(self) -> dict:
+        '''
+        Get the requests made by the chat page since it was last loaded\n
+        :return: Dictionary with keys `resources` (loaded), `transfer_bytes` (including the page), `by_type` (loaded per initiator type), `load_time` (seconds), `blocked` and `blocked_by_pattern` (requests to URLs blocked by the `BlockingProfile`, fonts loaded by stylesheets are blocked without being counted)
+        '''
+        with self.__in_window():
+            stats = self.driver.execute_script(chatgpt_resource_stats_js)
+        stats['blocked'] = sum(stats['blocked_by_pattern'].values())
+        metrics.observe('page.transfer_bytes', stats['transfer_bytes'])
+        if stats['load_time'] is not None:
+            metrics.observe('page.load_time', stats['load_time'])
+        return stats
+
+    def __advance_cache_context(self, conversation_id: str) -> None:
+        '''
+        Count a message answered in a conversation, a prompt is only served from
+        the cache at the same turn of the same conversation\n
+        :param conversation_id: The conversation the message was answered in
+        '''
+        previous, turn = self.__cache_context
+        self.__cache_context = (
+            conversation_id,
+            turn + 1 if conversation_id == previous else 1,
+        )
+
+    def __get_conversation_id(self) -> str:
+        '''
+        Get the ID of the current conversation\n
+        :return: The conversation ID
+        '''
+        matches = chatgpt_conversation_id.search(
+            self.driver.execute_script(
+                'return window.__pyChatGPTConversationId || location.href'
+            )
+            or ''
+        )
+        if matches:
+            return matches.group()
 
-        content = markdownify(response.get_attribute('innerHTML')).replace(
-            'Copy code`', '`'
+        self.logger.debug('Conversation ID not found, looking in the chats list...')
+        self.__click_new_chat()
+        self.__wait(
+            'chats_list', EC.element_to_be_clickable(chatgpt_chats_list_first_node)
+        ).click()
+        return self.__wait(
+            'chats_list',
+            lambda driver: chatgpt_conversation_id.search(driver.current_url),
+        ).group()
+
+    def __capture_response(self) -> dict:
+        '''
+        Read the response from the conversation request in the performance log\n
+        :return: Dictionary with keys `message`, `conversation_id` and `message_id`
+        '''
+        self.logger.debug('Capturing response...')
+        state = {'request_id': None, 'started': None, 'first_data': None, 'status': 0}
+
+        def read_log(driver):
+            for entry in driver.get_log('performance'):
+                event = json.loads(entry['message'])['message']
+                method, params = event['method'], event.get('params', {})
+                if method == 'Network.requestWillBeSent':
+                    request = params['request']
+                    if (
+                        request['url'] == f'{self.__base_url}/backend-api/conversation'
+                        and request['method'] == 'POST'
+                    ):
+                        state['request_id'] = params['requestId']
+                        state['started'] = params['timestamp']
+                elif (
+                    not state['request_id']
+                    or params.get('requestId') != state['request_id']
+                ):
+                    continue
+                elif method == 'Network.responseReceived':
+                    state['status'] = params['response']['status']
+                elif method == 'Network.dataReceived' and not state['first_data']:
+                    state['first_data'] = params['timestamp']
+                    self.last_ttft = state['first_data'] - state['started']
+                    metrics.observe('send_message.ttft', self.last_ttft)
+                    self.logger.debug(f'Time to first token: {self.last_ttft:.3f}s')
+                elif method == 'Network.loadingFailed':
+                    raise ValueError(params.get('errorText', 'Conversation failed'))
+                elif method == 'Network.loadingFinished':
+                    body = driver.execute_cdp_cmd(
+                        'Network.getResponseBody', {'requestId': state['request_id']}
+                    )['body']
+                    if state['status'] != 200:
+                        self.logger.debug('Response is an error')
+                        try:
+                            body = json.loads(body)['detail']
+                        except (json.decoder.JSONDecodeError, KeyError, TypeError):
+                            pass
+                        raise http_error(state['status'], body)
+                    return parse_conversation_stream(body)
+            return None
+
+        return self.__wait_policies['capture'].until(
+            self.driver,
+            self.__poll_in_window(read_log),
+            'capture',
+            'Response timed out',
         )
-        pattern = re.compile(
-            r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+
+    def send_batch(
+        self,
+        prompts,
+        new_conversation_per_prompt: bool = True,
+        ordered: bool = True,
+        checkpoint_path: str = '',
+        retries: int = 2,
+    ):
+        '''
+        Send a batch of prompts one after another (use `ChatGPTPool` for concurrency)\n
+        :param prompts: Iterable of prompts, each being a string or a dict with a `prompt` key
+        :param new_conversation_per_prompt: Whether to reset the conversation before each prompt
+        :param ordered: Whether to yield results in input order instead of as they complete
+        :param checkpoint_path: The path to a JSONL file recording finished prompts, skipped when resuming
+        :param retries: Number of times to retry a failed prompt
+        :return: Batch yielding the result of each prompt
+        '''
+        from .Batch import Batch, submit_now
+
+        return Batch(
+            lambda message, reset: submit_now(self, message, reset),
+            prompts,
+            1,
+            new_conversation_per_prompt,
+            ordered,
+            checkpoint_path,
+            retries,
         )
-        matches = pattern.search(self.driver.current_url)
-        if not matches:
-            self.reset_conversation()
-            WebDriverWait(self.driver, 5).until(
-                EC.element_to_be_clickable(chatgpt_chats_list_first_node)
-            ).click()
-            time.sleep(0.5)
-            matches = pattern.search(self.driver.current_url)
-        conversation_id = matches.group()
-        return {'message': content, 'conversation_id': conversation_id}
 
     def reset_conversation(self) -> None:
         '''
         Reset the conversation
         '''
-        if not self.driver.current_url.startswith(chatgpt_chat_url):
+        with self.__send_lock:
+            self.__cache_context = ('', 0)
+            self.__conversation_id = ''
+            if self.__http:
+                self.logger.debug('Resetting conversation...')
+                self.__parent_message_id = None
+                return
+            self.__reset_conversation()
+
+    def __reset_conversation(self, window: str = None) -> None:
+        '''
+        Start a new conversation in the chat page of a tab\n
+        :param window: The window handle of the tab (the main window if None)
+        '''
+        with self.__in_window(window):
+            self.__click_new_chat()
+
+    def __click_new_chat(self) -> None:
+        '''
+        Click the New chat button of the current chat page
+        '''
+        if not self.driver.current_url.startswith(self.__chat_url):
             return self.logger.debug('Current URL is not chat page, skipping reset')
 
         self.logger.debug('Resetting conversation...')
@@ -478,7 +2058,15 @@ class ChatGPT:
         '''
         Clear all conversations
         '''
-        if not self.driver.current_url.startswith(chatgpt_chat_url):
+        with self.__send_lock, self.__in_window():
+            self.__conversation_id = ''
+            self.__clear_conversations()
+
+    def __clear_conversations(self) -> None:
+        '''
+        Clear all conversations from the chat page
+        '''
+        if not self.driver.current_url.startswith(self.__chat_url):
             return self.logger.debug('Current URL is not chat page, skipping clear')
 
         self.logger.debug('Clearing conversations...')
@@ -492,8 +2080,10 @@ class ChatGPT:
         except SeleniumExceptions.NoSuchElementException:
             return self.logger.debug('Confirm clear conversations button not found')
         try:
-            WebDriverWait(self.driver, 20).until_not(
-                EC.presence_of_element_located(chatgpt_chats_list_first_node)
+            self.__wait(
+                'clear_conversations',
+                EC.presence_of_element_located(chatgpt_chats_list_first_node),
+                until_not=True,
             )
             self.logger.debug('Cleared conversations')
         except SeleniumExceptions.TimeoutException:
@@ -503,9 +2093,16 @@ class ChatGPT:
         '''
         Refresh the chat page
         '''
-        if not self.driver.current_url.startswith(chatgpt_chat_url):
+        with self.__send_lock, self.__in_window():
+            self.__refresh_chat_page()
+
+    def __refresh_chat_page(self) -> None:
+        '''
+        Reload the chat page and dismiss what blocks it
+        '''
+        if not self.driver.current_url.startswith(self.__chat_url):
             return self.logger.debug('Current URL is not chat page, skipping refresh')
 
-        self.driver.get(chatgpt_chat_url)
-        self.__check_capacity(chatgpt_chat_url)
+        self.driver.get(self.__chat_url)
+        self.__check_capacity(self.__chat_url)
         self.__check_blocking_elements()
@@ -0,0 +1,53 @@
+from concurrent.futures import Future
+import time
+
+from pyChatGPT.Batch import Batch, submit_now
+from pyChatGPT.Scheduler import RateLimitError
+
+
+class Session:
+    def __init__(self, failures: dict = {}):
+        self.failures = dict(failures)
+        self.sent = []
+
+    def send_message(self, message: str) -> dict:
+        self.sent.append((message, time.time()))
+        if self.failures.get(message):
+            self.failures[message] -= 1
+            raise RateLimitError('Too many requests', retry_after=0.3)
+        return {'message': message.upper(), 'conversation_id': 'conversation'}
+
+    def reset_conversation(self) -> None:
+        pass
+
+
+def test_retry_does_not_hold_up_the_batch():
+    session = Session({'first': 1})
+    batch = Batch(
+        lambda message, reset: submit_now(session, message, reset),
+        ['first', 'second', 'third'],
+        concurrency=2,
+        ordered=False,
+    )
+    started = time.time()
+    results = list(batch)
+    # The prompts after the failed one are answered while its retry waits
+    assert [i['prompt'] for i in results] == ['second', 'third', 'first']
+    assert results[0]['error'] is None and results[2]['attempts'] == 2
+    assert session.sent[2][1] - started < 0.3
+    assert session.sent[3][1] - session.sent[0][1] >= 0.3
+    assert batch.stats()['retries'] == 1
+
+
+def test_no_retries_when_submit_retries():
+    futures = []
+
+    def submit(message: str, reset: bool) -> Future:
+        future = Future()
+        future.set_exception(ValueError('Too many requests'))
+        futures.append(future)
+        return future
+
+    results = list(Batch(submit, ['first'], retries=0))
+    assert len(futures) == 1
+    assert results[0]['error'] == 'Too many requests'
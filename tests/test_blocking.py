@@ -0,0 +1,60 @@
+import pytest
+
+from pyChatGPT.Blocking import (
+    BlockingProfile,
+    pattern_regex,
+    preset_patterns,
+    safe_presets,
+)
+
+base_url = 'https://chat.openai.com/'
+
+
+def test_pattern_regex():
+    regex = pattern_regex('*.png?*')
+    assert regex.fullmatch('https://cdn.example.com/logo.png?v=2')
+    assert not regex.fullmatch('https://cdn.example.com/logo.png')
+    # Everything but `*` is literal
+    assert not pattern_regex('*.png').fullmatch('https://example.com/xpng')
+    assert pattern_regex('*/ces/v1/*').fullmatch('https://chat.openai.com/ces/v1/t')
+    assert not pattern_regex('*/ces/v1/*').fullmatch('https://chat.openai.com/ces')
+
+
+def test_every_preset_is_valid():
+    for name in preset_patterns:
+        BlockingProfile([name]).check(base_url)
+    with pytest.raises(ValueError, match='Invalid blocking preset: videos'):
+        BlockingProfile(['fonts', 'videos'])
+
+
+def test_safe_presets():
+    profile = BlockingProfile()
+    assert profile.patterns == [j for i in safe_presets for j in preset_patterns[i]]
+    profile.check(base_url)
+    profile.check('https://chatgpt.example.com/proxy')
+
+
+def test_patterns_and_allow():
+    profile = BlockingProfile(
+        ['fonts'], patterns=['*ads.example.com/*', '*.woff'], allow=['*.woff2']
+    )
+    assert '*ads.example.com/*' in profile.patterns
+    assert profile.patterns.count('*.woff') == 1
+    assert '*.woff2' not in profile.patterns
+
+
+@pytest.mark.parametrize(
+    'pattern',
+    [
+        '*/chat',
+        '*/api/auth/*',
+        '*/backend-api/*',
+        '*.js',
+        '*challenges.cloudflare.com/*',
+        '*auth0.openai.com/*',
+    ],
+)
+def test_check_rejects_required_requests(pattern):
+    profile = BlockingProfile([], patterns=[pattern])
+    with pytest.raises(ValueError, match='would block'):
+        profile.check(base_url)
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+import time
+
+import pytest
+
+from pyChatGPT.Cache import ResponseCache, cache_key
+
+
+def test_cache_key_normalizes_prompt():
+    assert cache_key('  Hello\n  world ') == cache_key('Hello world')
+    assert cache_key('Hello', 'conversation') != cache_key('Hello')
+    assert cache_key('Hello', 'conversation', 1) != cache_key('Hello', 'conversation')
+
+
+def test_fetch_coalesces_identical_requests():
+    cache = ResponseCache()
+    started, release = Event(), Event()
+    calls = []
+
+    def send():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'message': 'Hi'}
+
+    with ThreadPoolExecutor(4) as executor:
+        owner = executor.submit(cache.fetch, 'key', send)
+        started.wait(5)
+        waiters = [executor.submit(cache.fetch, 'key', send) for _ in range(3)]
+        # Let the waiters reach the in-flight future before the response arrives
+        time.sleep(0.1)
+        release.set()
+        results = [owner.result()] + [i.result() for i in waiters]
+
+    assert len(calls) == 1
+    assert results[0] == ({'message': 'Hi'}, 'miss')
+    assert [i[1] for i in results[1:]] == ['coalesced'] * 3
+    assert cache.fetch('key', send) == ({'message': 'Hi'}, 'hit')
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'coalesced': 3, 'size': 1}
+
+
+def test_fetch_failure_is_shared_and_not_cached():
+    cache = ResponseCache()
+
+    def fail():
+        raise ValueError('Too many requests')
+
+    with pytest.raises(ValueError):
+        cache.fetch('key', fail)
+    assert cache.get('key') is None
+    assert cache.fetch('key', lambda: {'message': 'Hi'}) == ({'message': 'Hi'}, 'miss')
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_size=2)
+    cache.set('a', {'message': 'a'})
+    cache.set('b', {'message': 'b'})
+    # Reading `a` makes `b` the least recently used
+    assert cache.get('a') == {'message': 'a'}
+    cache.set('c', {'message': 'c'})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'message': 'a'}
+    assert cache.get('c') == {'message': 'c'}
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttl=0.05)
+    cache.set('key', {'message': 'Hi'})
+    assert cache.get('key') == {'message': 'Hi'}
+    time.sleep(0.1)
+    assert cache.get('key') is None
+
+
+def test_cached_response_is_a_copy():
+    cache = ResponseCache()
+    cache.set('key', {'message': 'Hi'})
+    cache.get('key')['message'] = 'Changed'
+    assert cache.get('key') == {'message': 'Hi'}
+
+
+def test_sqlite_backend(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache(max_size=2, path=path)
+    cache.set('a', {'message': 'a'})
+
+    # Another process opening the same database sees the response
+    other = ResponseCache(path=path)
+    assert other.fetch('a', lambda: {'message': 'miss'}) == ({'message': 'a'}, 'hit')
+
+    time.sleep(0.01)
+    cache.set('b', {'message': 'b'})
+    time.sleep(0.01)
+    cache.set('c', {'message': 'c'})
+    assert other.stats()['size'] == 2
+    assert ResponseCache(path=path).get('a') is None
+    assert ResponseCache(path=path).get('c') == {'message': 'c'}
+
+    cache.clear()
+    assert other.stats()['size'] == 0
+
+
+def test_sqlite_backend_ttl(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache(ttl=0.05, path=path).set('key', {'message': 'Hi'})
+    assert ResponseCache(path=path).get('key') == {'message': 'Hi'}
+    time.sleep(0.1)
+    assert ResponseCache(path=path).get('key') is None
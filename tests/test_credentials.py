@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Lock
+import time
+
+import pytest
+
+from pyChatGPT.Credentials import (
+    CredentialStore,
+    FileCredentialStore,
+    SqliteCredentialStore,
+)
+
+
+@pytest.fixture(params=['file', 'sqlite'])
+def store(request, tmp_path) -> CredentialStore:
+    if request.param == 'file':
+        return FileCredentialStore(str(tmp_path / 'credentials.json'))
+    return SqliteCredentialStore(str(tmp_path / 'credentials.db'))
+
+
+def refresh_concurrently(store: CredentialStore, stale: dict = None) -> tuple:
+    barrier = Barrier(2)
+    lock = Lock()
+    logins = []
+
+    def login() -> dict:
+        with lock:
+            logins.append(1)
+            count = len(logins)
+        # Hold the refresh lock long enough for the other thread to wait on it
+        time.sleep(0.3)
+        return {'access_token': f'token-{count}', 'expires': time.time() + 3600}
+
+    def refresh():
+        barrier.wait()
+        return store.refresh('mock@example.com', login, stale, timeout=10)
+
+    with ThreadPoolExecutor(2) as executor:
+        results = [i.result() for i in [executor.submit(refresh) for _ in range(2)]]
+    return logins, results
+
+
+def test_credential_store_is_abstract():
+    with pytest.raises(TypeError):
+        CredentialStore()
+
+
+def test_refresh_is_single_flight(store):
+    logins, results = refresh_concurrently(store)
+    assert len(logins) == 1
+    assert sorted(refreshed for _, refreshed in results) == [False, True]
+    assert results[0][0] == results[1][0]
+    assert results[0][0]['access_token'] == 'token-1'
+    assert store.get('mock@example.com') == results[0][0]
+
+
+def test_refresh_of_stale_credentials_is_single_flight(store):
+    store.set('mock@example.com', {'access_token': 'expired', 'updated': 1})
+    stale = store.get('mock@example.com')
+    logins, results = refresh_concurrently(store, stale)
+    assert len(logins) == 1
+    assert results[0][0] == results[1][0]
+    assert results[0][0]['access_token'] == 'token-1'
+
+    # Credentials refreshed by another worker are reused, not refreshed again
+    credentials, refreshed = store.refresh('mock@example.com', None, stale)
+    assert not refreshed
+    assert credentials == results[0][0]
@@ -0,0 +1,251 @@
+from contextlib import contextmanager
+from threading import RLock
+import http.client
+import asyncio
+
+import pytest
+
+from pyChatGPT.Async import AsyncChatGPT, AsyncHttpTransport
+from pyChatGPT.Http import HttpTransport
+from pyChatGPT.Mock import MockServer
+from pyChatGPT.Scheduler import RateLimitError
+
+
+@pytest.fixture
+def server():
+    with MockServer(reply='Hello from the mock server', token_rate=0) as server:
+        yield server
+
+
+def http_transport(server: MockServer, access_token: str = None) -> HttpTransport:
+    transport = HttpTransport(server.url, timeout=10)
+    transport.set_credentials(access_token or server.access_token)
+    return transport
+
+
+def async_transport(server: MockServer, access_token: str = None):
+    transport = AsyncHttpTransport(server.url)
+    transport.headers = http_transport(server, access_token).headers
+    return transport
+
+
+def stream(transport: HttpTransport, message: str, *args) -> tuple:
+    generator = transport.stream_conversation(message, *args)
+    deltas = []
+    while True:
+        try:
+            deltas.append(next(generator))
+        except StopIteration as e:
+            return deltas, e.value
+
+
+async def async_stream(transport: AsyncHttpTransport, message: str, *args) -> tuple:
+    items = [i async for i in transport.stream_conversation(message, *args)]
+    return items[:-1], items[-1]
+
+
+def test_http_stream_conversation(server):
+    transport = http_transport(server)
+    deltas, response = stream(transport, 'Hi')
+    assert deltas == ['Hello ', 'from ', 'the ', 'mock ', 'server']
+    assert response['message'] == 'Hello from the mock server'
+    assert server.conversations[response['conversation_id']] == response['message_id']
+
+    # The connection is reused for the next message in the conversation
+    _, follow_up = stream(
+        transport, 'Again', response['conversation_id'], response['message_id']
+    )
+    assert follow_up['conversation_id'] == response['conversation_id']
+    assert follow_up['message_id'] != response['message_id']
+    transport.close()
+
+
+def test_http_get_conversation(server):
+    transport = http_transport(server)
+    _, response = stream(transport, 'Hi')
+    conversation = transport.get_conversation(response['conversation_id'])
+    assert conversation['current_node'] == response['message_id']
+    transport.close()
+
+
+def test_http_unauthorized(server):
+    transport = http_transport(server, 'expired-token')
+    with pytest.raises(ValueError, match='^Unauthorized'):
+        stream(transport, 'Hi')
+    transport.close()
+
+
+def test_http_rate_limited(server):
+    server.error_rate = 1
+    transport = http_transport(server)
+    with pytest.raises(RateLimitError):
+        stream(transport, 'Hi')
+    transport.close()
+
+
+def test_http_early_close(server):
+    transport = http_transport(server)
+    generator = transport.stream_conversation('Hi')
+    assert next(generator) == 'Hello '
+    generator.close()
+    # The aborted connection is dropped instead of going back to the pool
+    assert transport._HttpTransport__pool.empty()
+    _, response = stream(transport, 'Hi')
+    assert response['message'] == 'Hello from the mock server'
+    transport.close()
+
+
+class DroppedConnection(http.client.HTTPConnection):
+    # Fails like a keep-alive connection the server closed while it was idle
+    drops = 0
+
+    def request(self, *args, **kwargs):
+        if DroppedConnection.drops:
+            DroppedConnection.drops -= 1
+            raise BrokenPipeError('Broken pipe')
+        return super().request(*args, **kwargs)
+
+
+def test_http_stale_connection_retry(server, monkeypatch):
+    transport = http_transport(server)
+    monkeypatch.setattr(
+        transport, '_HttpTransport__connection_class', DroppedConnection
+    )
+    monkeypatch.setattr(DroppedConnection, 'drops', 0)
+    _, response = stream(transport, 'Hi')
+
+    # A pooled connection closed by the server is retried once
+    DroppedConnection.drops = 1
+    _, follow_up = stream(transport, 'Hi')
+    assert follow_up['message'] == 'Hello from the mock server'
+    assert DroppedConnection.drops == 0
+
+    # A fresh connection failing may have reached the server, it is not retried
+    transport.close()
+    DroppedConnection.drops = 1
+    with pytest.raises(BrokenPipeError):
+        stream(transport, 'Hi')
+    assert len(server.conversations) == 2
+    transport.close()
+
+
+def test_async_stream_conversation(server):
+    async def run():
+        transport = async_transport(server)
+        deltas, response = await async_stream(transport, 'Hi')
+        _, follow_up = await async_stream(
+            transport, 'Again', response['conversation_id'], response['message_id']
+        )
+        await transport.close()
+        return deltas, response, follow_up
+
+    deltas, response, follow_up = asyncio.run(run())
+    assert deltas == ['Hello ', 'from ', 'the ', 'mock ', 'server']
+    assert response['message'] == 'Hello from the mock server'
+    assert server.conversations[response['conversation_id']] == follow_up['message_id']
+    assert follow_up['conversation_id'] == response['conversation_id']
+
+
+def test_async_get_conversation(server):
+    async def run():
+        transport = async_transport(server)
+        _, response = await async_stream(transport, 'Hi')
+        conversation = await transport.get_conversation(response['conversation_id'])
+        await transport.close()
+        return response, conversation
+
+    response, conversation = asyncio.run(run())
+    assert conversation['current_node'] == response['message_id']
+
+
+def test_async_unauthorized(server):
+    async def run():
+        transport = async_transport(server, 'expired-token')
+        try:
+            await async_stream(transport, 'Hi')
+        finally:
+            await transport.close()
+
+    with pytest.raises(ValueError, match='^Unauthorized'):
+        asyncio.run(run())
+
+
+def test_async_rate_limited(server):
+    server.error_rate = 1
+
+    async def run():
+        transport = async_transport(server)
+        try:
+            await async_stream(transport, 'Hi')
+        finally:
+            await transport.close()
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(run())
+
+
+def test_async_early_close(server):
+    async def run():
+        transport = async_transport(server)
+        generator = transport.stream_conversation('Hi')
+        first = await generator.__anext__()
+        await generator.aclose()
+        pool = list(transport._AsyncHttpTransport__pool)
+        _, response = await async_stream(transport, 'Hi')
+        await transport.close()
+        return first, pool, response
+
+    first, pool, response = asyncio.run(run())
+    assert first == 'Hello '
+    assert pool == []
+    assert response['message'] == 'Hello from the mock server'
+
+
+class FakeChat:
+    '''
+    The parts of a ChatGPT session AsyncChatGPT uses, without a browser
+    '''
+
+    def __init__(self, server: MockServer):
+        self._ChatGPT__http = http_transport(server)
+        self.window_lock = RLock()
+        self.cached = True
+        self.session_cache_hits = 0
+        self.revalidations = []
+
+    def _ChatGPT__is_session_cached(self) -> bool:
+        return self.cached
+
+    @contextmanager
+    def _ChatGPT__in_window(self):
+        with self.window_lock:
+            yield
+
+    def _ChatGPT__invalidate_session(self) -> None:
+        self.cached = False
+
+    def _ChatGPT__ensure_session(self) -> None:
+        self.revalidations.append(self.window_lock._is_owned())
+        self.cached = True
+
+
+def test_async_chat_cached_session_skips_browser(server):
+    chat = FakeChat(server)
+
+    async def run():
+        client = AsyncChatGPT(base_url=server.url)
+        client.chat = chat
+        client._AsyncChatGPT__http.headers = chat._ChatGPT__http.headers
+        first = await client.send_message('Hi')
+        second = await client.send_message('Again')
+        chat.cached = False
+        third = await client.send_message('Expired')
+        await client._AsyncChatGPT__http.close()
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert second['conversation_id'] == first['conversation_id']
+    assert third['conversation_id'] == first['conversation_id']
+    assert chat.session_cache_hits == 2
+    # Only the expired session was revalidated, holding the browser
+    assert chat.revalidations == [True]
@@ -0,0 +1,42 @@
+from threading import Event
+import time
+
+from pyChatGPT.KeepAlive import KeepAliveScheduler
+
+
+class Session:
+    def __init__(self, result=None):
+        self.result = result
+        self.calls = 0
+        self.release = Event()
+
+    def keep_alive(self):
+        self.calls += 1
+        return self.result
+
+    def hang(self):
+        self.calls += 1
+        self.release.wait(10)
+
+
+def test_hung_session_delays_no_other():
+    scheduler = KeepAliveScheduler()
+    hung, healthy = Session(), Session()
+    scheduler.register('hung', hung.hang, 0.05)
+    scheduler.register('healthy', healthy.keep_alive, 0.05)
+    time.sleep(0.5)
+    hung.release.set()
+    # The hung call is never started twice, the other session keeps going
+    assert hung.calls == 1
+    assert healthy.calls > 3
+    assert scheduler.last_success('hung') is None
+    assert scheduler.last_success('healthy') is not None
+
+
+def test_skipped_turn_is_not_a_success():
+    scheduler = KeepAliveScheduler()
+    busy = Session(result=False)
+    scheduler.register('busy', busy.keep_alive, 0.05)
+    time.sleep(0.2)
+    assert busy.calls > 0
+    assert scheduler.last_success('busy') is None
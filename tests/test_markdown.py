@@ -0,0 +1,117 @@
+from markdownify import markdownify
+import pytest
+
+from pyChatGPT.Markdown import IncrementalMarkdown, convert_block, convert_blocks
+
+
+def stream(snapshots: list) -> tuple:
+    '''
+    Feed the blocks of every snapshot of a response the way the page is polled,
+    the last snapshot finishing the response
+    '''
+    converter = IncrementalMarkdown()
+    deltas = []
+    for i, blocks in enumerate(snapshots):
+        done = i == len(snapshots) - 1
+        deltas.append(converter.update(blocks[converter.finalized :], done))
+    return converter, deltas
+
+
+def test_growing_trailing_block():
+    converter, deltas = stream(
+        [
+            ['<p>Hello</p>'],
+            ['<p>Hello wor</p>'],
+            ['<p>Hello world, how</p>'],
+            ['<p>Hello world, how are you?</p>'],
+        ]
+    )
+    # Only what two renders agree on is emitted while the block is written
+    assert deltas[:3] == ['', 'Hello', ' wor']
+    assert ''.join(deltas) == converter.text
+    assert converter.text == convert_block('<p>Hello world, how are you?</p>')
+
+
+def test_finished_block_is_finalized():
+    converter = IncrementalMarkdown()
+    converter.update(['<p>First</p>'])
+    converter.update(['<p>First</p>'])
+    delta = converter.update(['<p>First</p>', '<p>Sec</p>'])
+    assert delta == ''
+    assert converter.finalized == 1
+    assert converter.text == convert_block('<p>First</p>')
+
+
+def test_re_rendered_block():
+    converter, deltas = stream(
+        [
+            ['<p>Hello world</p>'],
+            ['<p>Hello world</p>'],
+            ['<p>Hello, world</p>'],
+        ]
+    )
+    assert deltas == ['', 'Hello world', ', world']
+    # The final text follows the last render even though the deltas diverged
+    assert converter.text == convert_block('<p>Hello, world</p>')
+
+
+def test_code_fence_closing_late():
+    snapshots = [
+        ['<p>Code:</p>', '<pre><code>x = 1'],
+        ['<p>Code:</p>', '<pre><code>x = 1\ny = 2'],
+        ['<p>Code:</p>', '<pre><code>x = 1\ny = 2\nz = 3'],
+        ['<p>Code:</p>', '<pre><code>x = 1\ny = 2\nz = 3\n</code></pre>'],
+    ]
+    converter, deltas = stream(snapshots)
+    streamed = ''.join(deltas[:-1])
+    # The closing fence every render adds is only emitted once the block is done
+    assert '```' in streamed
+    assert not streamed.rstrip().endswith('```')
+    assert ''.join(deltas) == converter.text
+    assert converter.text.rstrip().endswith('```')
+
+
+def test_convert_blocks_matches_text():
+    snapshots = [
+        ['<p>Intro</p>'],
+        ['<p>Intro text</p>', '<ul><li>one</li></ul>'],
+        ['<p>Intro text</p>', '<ul><li>one</li><li>tw</li></ul>'],
+        ['<p>Intro text</p>', '<ul><li>one</li><li>two</li></ul>', '<p>Bye</p>'],
+    ]
+    converter, deltas = stream(snapshots)
+    assert converter.text == convert_blocks(snapshots[-1])
+    assert ''.join(deltas) == converter.text
+    assert converter.finalized == len(snapshots[-1])
+
+
+@pytest.mark.parametrize(
+    'blocks',
+    [
+        ['<p>Hello</p>'],
+        [
+            '<p>Hello <b>world</b></p>',
+            '<ul><li>a</li><li>b</li></ul>',
+            '<p>Bye</p>',
+            '<pre><code>x=1\n</code></pre>',
+        ],
+        [
+            '<h2>Title</h2>',
+            '<ol><li>one</li></ol>',
+            '<blockquote><p>Quote</p></blockquote>',
+        ],
+    ],
+)
+def test_convert_blocks_matches_whole_response(blocks):
+    assert convert_blocks(blocks) == markdownify(''.join(blocks)).strip()
+
+
+def test_streamed_blocks_are_separated():
+    snapshots = [
+        ['<p>Hello</p>'],
+        ['<p>Hello</p>', '<ul><li>a</li></ul>'],
+        ['<p>Hello</p>', '<ul><li>a</li><li>b</li></ul>'],
+        ['<p>Hello</p>', '<ul><li>a</li><li>b</li></ul>', '<p>Bye</p>'],
+    ]
+    converter, deltas = stream(snapshots)
+    assert ''.join(deltas) == converter.text
+    assert converter.text == markdownify(''.join(snapshots[-1])).strip()
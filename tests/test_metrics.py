@@ -0,0 +1,67 @@
+import pytest
+
+from pyChatGPT.Metrics import Histogram, Metrics
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    assert histogram.percentile(50) == 0
+    for value in range(1, 101):
+        histogram.observe(value)
+    assert histogram.percentile(0) == 1
+    assert histogram.percentile(50) == 51
+    assert histogram.percentile(95) == 95
+    assert histogram.percentile(100) == 100
+    assert histogram.summary() == {
+        'count': 100,
+        'sum': 5050,
+        'p50': 51,
+        'p95': 95,
+        'p99': 99,
+    }
+
+
+def test_histogram_keeps_recent_samples():
+    histogram = Histogram(max_samples=10)
+    for value in range(100):
+        histogram.observe(value)
+    # Percentiles follow the recent samples, the count and sum every observation
+    assert histogram.percentile(0) == 90
+    assert histogram.percentile(100) == 99
+    assert histogram.count == 100
+    assert histogram.sum == sum(range(100))
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+    span = metrics.span('send')
+    with span:
+        pass
+    metrics.observe('send', 1)
+    assert metrics.histograms() == {}
+    # The same no-op span is reused, nothing is timed while disabled
+    assert metrics.span('other') is span
+
+
+def test_span_records_and_calls_hooks():
+    metrics = Metrics()
+    calls = []
+
+    def failing_hook(name, value, attributes):
+        raise ValueError('Exporter is down')
+
+    metrics.add_hook(failing_hook)
+    metrics.add_hook(lambda *args: calls.append(args))
+    assert metrics.enabled
+    with pytest.raises(KeyError):
+        with metrics.span('send', session=0):
+            raise KeyError('message')
+    # A failing block is still timed, a failing hook does not stop the others
+    assert metrics.histograms()['send']['count'] == 1
+    assert calls[0][0] == 'send' and calls[0][2] == {'session': 0}
+
+    metrics.reset()
+    assert metrics.histograms() == {}
+    metrics.disable()
+    metrics.observe('send', 1)
+    assert metrics.histograms() == {}
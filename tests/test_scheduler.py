@@ -0,0 +1,177 @@
+from types import SimpleNamespace
+import http.client
+
+import pytest
+
+from pyChatGPT import Scheduler
+from pyChatGPT.Scheduler import (
+    CapacityError,
+    RateLimitError,
+    RetryBudget,
+    SessionLimiter,
+    TokenBucket,
+    backoff,
+    classify_error,
+    http_error,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class WebDriverException(Exception):
+    pass
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(Scheduler, 'time', clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def selenium(monkeypatch):
+    # selenium is only needed for its exception types
+    monkeypatch.setattr(
+        Scheduler,
+        'SeleniumExceptions',
+        SimpleNamespace(WebDriverException=WebDriverException),
+    )
+
+
+def test_http_error():
+    error = http_error(429, 'Slow down', '12')
+    assert isinstance(error, RateLimitError)
+    assert error.retry_after == 12
+    assert str(error) == 'Slow down'
+    # A malformed or missing Retry-After is ignored
+    assert http_error(429, '', 'soon').retry_after is None
+    assert http_error(429, '').retry_after is None
+    assert str(http_error(429, '')) == 'Too many requests'
+
+    assert str(http_error(401, 'Expired')) == 'Unauthorized (401): Expired'
+    assert isinstance(http_error(503, 'ChatGPT is at capacity'), CapacityError)
+    error = http_error(500, '')
+    assert type(error) is ValueError and str(error) == 'HTTP 500'
+
+
+def test_classify_error():
+    assert classify_error(CapacityError('At capacity')) == 'capacity'
+    assert classify_error(RateLimitError('Too many requests')) == 'rate_limit'
+    assert classify_error(WebDriverException('Chrome crashed')) == 'network'
+    assert classify_error(http.client.RemoteDisconnected('Closed')) == 'network'
+    assert classify_error(ConnectionResetError()) == 'network'
+    assert classify_error(http_error(403, 'Forbidden')) == 'auth'
+    assert classify_error(ValueError('net::ERR_CONNECTION_RESET')) == 'network'
+    assert classify_error(ValueError('Something went wrong')) == 'other'
+    assert classify_error(KeyError('message')) == 'other'
+
+
+def test_backoff_is_capped_and_jittered():
+    delays = [backoff(attempt) for attempt in range(4) for _ in range(100)]
+    for attempt in range(4):
+        samples = delays[attempt * 100 : (attempt + 1) * 100]
+        assert all(0.5 * 2**attempt <= i <= 1.5 * 2**attempt for i in samples)
+        assert len(set(samples)) > 1
+    # The cap applies to the average, the jitter still spreads the retries
+    capped = [backoff(20, base=1, cap=60) for _ in range(100)]
+    assert all(30 <= i <= 90 for i in capped)
+
+
+def test_token_bucket(clock):
+    bucket = TokenBucket(2, 0.5)
+    assert bucket.time_until_available() == 0
+    bucket.consume()
+    bucket.consume()
+    assert bucket.time_until_available() == 2
+    clock.advance(1)
+    assert bucket.time_until_available() == 1
+    clock.advance(10)
+    # The bucket never holds more than its capacity
+    assert bucket.time_until_available(2) == 0
+    assert bucket.time_until_available(3) == 2
+
+    empty = TokenBucket(5, 1, tokens=0)
+    assert empty.time_until_available() == 1
+    empty.consume()
+    assert empty.time_until_available() == 1
+
+
+def test_session_limiter_learns_the_limit(clock):
+    limiter = SessionLimiter(window=100)
+    assert limiter.limit is None
+    for _ in range(3):
+        limiter.record_send()
+        clock.advance(10)
+    assert limiter.delay() == 0
+
+    # Without Retry-After the session waits for the oldest message to expire
+    assert limiter.record_failure('rate_limit', RateLimitError('Limit')) == 70
+    assert limiter.limit == 3
+    assert limiter.delay() == 70
+    clock.advance(70)
+    assert limiter.delay() == 0
+    # The learned limit then paces the session
+    for _ in range(3):
+        limiter.record_send()
+    assert limiter.delay() == pytest.approx(100 / 3)
+    clock.advance(100)
+    assert limiter.delay() == 0
+
+
+def test_session_limiter_honors_retry_after(clock):
+    limiter = SessionLimiter(window=3600)
+    limiter.record_send()
+    assert limiter.record_failure('rate_limit', RateLimitError('Limit', 30)) == 30
+    assert limiter.delay() == 30
+    clock.advance(30)
+    assert limiter.delay() == 0
+    limiter.record_send()
+    assert limiter.delay() == pytest.approx(3600)
+
+
+def test_session_limiter_backs_off_capacity_errors(clock, monkeypatch):
+    monkeypatch.setattr(Scheduler.random, 'uniform', lambda low, high: 1)
+    limiter = SessionLimiter(window=400, capacity_backoff=10)
+    assert [limiter.record_failure('capacity') for _ in range(6)] == [
+        10,
+        20,
+        40,
+        80,
+        100,
+        100,
+    ]
+    # A send resets the backoff, other failures do not hold the session back
+    limiter.record_send()
+    clock.advance(100)
+    assert limiter.record_failure('network') == 10
+    clock.advance(10)
+    assert limiter.record_failure('other') == 0
+    assert limiter.limit is None
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, minimum=2)
+    assert budget.try_retry()
+    assert budget.try_retry()
+    # Exhausted until successes earn retries back
+    assert not budget.try_retry()
+    budget.record_success()
+    assert not budget.try_retry()
+    budget.record_success()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    # No more than the minimum is saved up
+    for _ in range(10):
+        budget.record_success()
+    assert [budget.try_retry() for _ in range(3)] == [True, True, False]
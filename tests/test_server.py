@@ -0,0 +1,207 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import json
+
+import pytest
+
+from pyChatGPT.Metrics import metrics
+from pyChatGPT.Server import ChatServer, last_user_message, render_prompt
+from pyChatGPT.pyChatGPT import MessageStream
+
+
+class Conversation:
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id or 'tab-conversation'
+        self.sent = []
+        self.closed = False
+
+    def stream_message(self, message: str) -> MessageStream:
+        self.sent.append(message)
+
+        def generate():
+            yield 'Hi '
+            yield 'there'
+            return {'message': 'Hi there', 'conversation_id': self.conversation_id}
+
+        return MessageStream(generate())
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class Pool:
+    def __init__(self, live: bool = True):
+        self.live = live
+        self.submitted = []
+        self.conversations = []
+
+    def submit(self, message: str, reset_conversation=False, on_delta=None) -> Future:
+        self.submitted.append((message, reset_conversation))
+        future = Future()
+        future.set_running_or_notify_cancel()
+        if on_delta:
+            for delta in ['Hello', ', world']:
+                on_delta(delta)
+        future.set_result({'message': 'Hello, world', 'conversation_id': 'pooled'})
+        return future
+
+    def open_conversation(self, conversation_id: str = '', index: int = None) -> tuple:
+        self.conversations.append(Conversation(conversation_id))
+        return 0, self.conversations[-1]
+
+    def stats(self) -> dict:
+        return {
+            'sessions': 1,
+            'busy': 0,
+            'queue_depth': 0,
+            'completed': 3,
+            'failures': {'network': 1},
+        }
+
+    def health(self) -> list:
+        return [{'live': self.live, 'ready': self.live, 'checks': {}}]
+
+
+@contextmanager
+def serve(pool: Pool):
+    with ChatServer(pool, port=0) as server:
+        yield server
+
+
+def request(server: ChatServer, path: str, body=None) -> tuple:
+    data = body if isinstance(body, bytes) or body is None else json.dumps(body)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    try:
+        with urlopen(Request(server.url + path, data=data), timeout=5) as response:
+            return response.status, response.read().decode('utf-8')
+    except HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+
+
+def test_render_prompt():
+    assert render_prompt([{'role': 'user', 'content': 'Hello'}]) == 'Hello'
+    messages = [
+        {'role': 'system', 'content': 'Be brief'},
+        {'role': 'user', 'content': [{'type': 'text', 'text': 'Hi'}]},
+        {'role': 'assistant', 'content': 'Hello'},
+        {'role': 'user', 'content': 'Bye'},
+    ]
+    # The system messages come first, the turns keep their order
+    assert render_prompt(messages) == (
+        'Be brief\n\nUser: Hi\n\nAssistant: Hello\n\nUser: Bye'
+    )
+
+
+def test_last_user_message():
+    messages = [
+        {'role': 'user', 'content': 'First'},
+        {'role': 'assistant', 'content': 'Reply'},
+        {'role': 'user', 'content': 'Second'},
+        {'role': 'assistant', 'content': 'Reply'},
+    ]
+    assert last_user_message(messages) == 'Second'
+    with pytest.raises(ValueError):
+        last_user_message([{'role': 'system', 'content': 'Be brief'}])
+
+
+def test_get_routes():
+    with serve(Pool()) as server:
+        status, body = request(server, '/healthz')
+        assert status == 200
+        assert json.loads(body)['live'] == 1
+        status, body = request(server, '/v1/models')
+        assert json.loads(body)['data'][0]['id'] == 'chatgpt'
+        assert request(server, '/missing')[0] == 404
+    with serve(Pool(live=False)) as server:
+        assert request(server, '/healthz')[0] == 503
+
+
+def test_prometheus():
+    metrics.reset()
+    with serve(Pool()) as server:
+        request(server, '/healthz')
+        metrics.observe('pool.send', 1.5)
+        status, body = request(server, '/metrics')
+    assert status == 200
+    lines = body.splitlines()
+    assert 'pychatgpt_pool_completed_total 3' in lines
+    assert 'pychatgpt_pool_failures_total{kind="network"} 1' in lines
+    assert 'pychatgpt_pool_queue_depth 0' in lines
+    assert 'pychatgpt_server_requests_total{path="/healthz",status="200"} 1' in lines
+    assert 'pychatgpt_pool_send{quantile="0.5"} 1.5' in lines
+    assert 'pychatgpt_pool_send_count 1' in lines
+    metrics.reset()
+
+
+@pytest.mark.parametrize(
+    'body',
+    [
+        b'not json',
+        [],
+        {},
+        {'messages': []},
+        {'messages': ['oops']},
+        {'messages': [{'content': 'Hello'}]},
+        {'messages': [{'role': 'user', 'content': 1}]},
+        {'messages': [{'role': 'user', 'content': ['oops']}]},
+        {'messages': [{'role': 'user', 'content': 'Hi'}], 'conversation_id': 1},
+    ],
+)
+def test_malformed_request(body):
+    pool = Pool()
+    with serve(pool) as server:
+        status, response = request(server, '/v1/chat/completions', body)
+    assert status == 400
+    assert json.loads(response)['error']['type'] == 'invalid_request_error'
+    assert not pool.submitted
+
+
+def test_one_off_completion():
+    pool = Pool()
+    with serve(pool) as server:
+        status, body = request(
+            server,
+            '/v1/chat/completions',
+            {'messages': [{'role': 'user', 'content': 'Hello'}]},
+        )
+        assert status == 200
+        body = json.loads(body)
+        assert body['choices'][0]['message']['content'] == 'Hello, world'
+        assert body['conversation_id'] == 'pooled'
+
+        status, body = request(
+            server,
+            '/v1/chat/completions',
+            {'messages': [{'role': 'user', 'content': 'Hello'}], 'stream': True},
+        )
+    events = [i[len('data: ') :] for i in body.split('\n\n') if i]
+    assert events[-1] == '[DONE]'
+    deltas = [json.loads(i)['choices'][0]['delta'] for i in events[:-1]]
+    assert ''.join(i.get('content', '') for i in deltas) == 'Hello, world'
+    # One-off requests, streaming or not, go through the warm pooled sessions
+    assert pool.submitted == [('Hello', True)] * 2
+    assert not pool.conversations
+
+
+def test_conversation_completion():
+    pool = Pool()
+    with serve(pool) as server:
+        for content in ['First', 'Second']:
+            status, body = request(
+                server,
+                '/v1/chat/completions',
+                {
+                    'messages': [{'role': 'user', 'content': content}],
+                    'conversation_id': 'chat',
+                },
+            )
+            assert status == 200
+            assert json.loads(body)['conversation_id'] == 'chat'
+    # The conversation keeps its tab between requests
+    assert len(pool.conversations) == 1
+    assert pool.conversations[0].sent == ['First', 'Second']
+    assert pool.conversations[0].closed
+    assert not pool.submitted
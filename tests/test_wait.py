@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pyChatGPT import Wait
+from pyChatGPT.Wait import WaitPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+class NoSuchElementException(Exception):
+    pass
+
+
+class TimeoutException(Exception):
+    pass
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(Wait, 'time', clock)
+    # selenium is only needed for its exception types
+    monkeypatch.setattr(
+        Wait,
+        'SeleniumExceptions',
+        SimpleNamespace(
+            NoSuchElementException=NoSuchElementException,
+            TimeoutException=TimeoutException,
+        ),
+    )
+    return clock
+
+
+def condition(values: list):
+    values = list(values)
+
+    def method(driver):
+        value = values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    return method
+
+
+@pytest.mark.parametrize(
+    'args',
+    [
+        {'interval': 0},
+        {'interval': 1, 'max_interval': 0.5},
+        {'backoff': 0.5},
+    ],
+)
+def test_invalid_policy(args):
+    with pytest.raises(ValueError):
+        WaitPolicy(**args)
+
+
+def test_poll_interval_backs_off(clock):
+    policy = WaitPolicy(timeout=10, interval=0.1, max_interval=0.5, backoff=2)
+    values = [False] * 5 + ['element']
+    assert policy.until(None, condition(values)) == 'element'
+    # Fast polls first, then capped at the longest interval
+    assert clock.sleeps == [0.1, 0.2, 0.4, 0.5, 0.5]
+
+
+def test_timeout(clock):
+    policy = WaitPolicy(timeout=1, interval=0.1, max_interval=0.5, backoff=2)
+    with pytest.raises(TimeoutException, match='Timed out waiting for textbox'):
+        policy.until(None, lambda driver: False, 'textbox')
+    # The last sleep is cut short to end on the timeout
+    assert clock.sleeps == [0.1, 0.2, 0.4, 0.3]
+    assert clock.now == pytest.approx(1)
+
+    with pytest.raises(TimeoutException, match='No textbox'):
+        policy.until(None, lambda driver: False, message='No textbox')
+
+
+def test_missing_element_is_falsy(clock):
+    policy = WaitPolicy(timeout=1)
+    missing = NoSuchElementException()
+    assert policy.until(None, condition([missing, missing, 'element'])) == 'element'
+    assert len(clock.sleeps) == 2
+    # Other errors are not swallowed
+    with pytest.raises(KeyError):
+        policy.until(None, condition([KeyError('oops')]))
+
+
+def test_until_not(clock):
+    policy = WaitPolicy(timeout=1, interval=0.1, max_interval=0.1)
+    assert policy.until_not(None, condition(['banner', 'banner', None])) is True
+    assert clock.sleeps == [0.1, 0.1]
+    assert policy.until_not(None, condition([NoSuchElementException()])) is True
+    with pytest.raises(TimeoutException):
+        policy.until_not(None, lambda driver: 'banner')